@@ -4,13 +4,19 @@ import base64
 from google import genai
 from google.genai import types
 from schema.product import ProductSchema # 사용자가 정의한 스키마
+from ai.resilience import REQUEST_TIMEOUT_SECONDS, is_transient
+from util import metrics
 
 # --- [내부 함수 1] Google Gemini 호출 로직 ---
-def _call_gemini_api(system_prompt, user_text, image_list, model_name, api_key):
+# usage: dict 를 주면 입력/출력/캐시 토큰과 전송한 이미지 수를 채움 (util.ledger 기록용)
+def _call_gemini_api(system_prompt, user_text, image_list, model_name, api_key, response_schema=ProductSchema, timeout=REQUEST_TIMEOUT_SECONDS, base_url=None,
+                     usage=None):
     
     # API 키 설정 (환경변수나 별도 설정 파일에서 가져오는 것을 권장)
     # st.secrets["GOOGLE_API_KEY"] 등을 사용할 수 있습니다.        
-    client = genai.Client(api_key=api_key)
+    # 시도 1회당 타임아웃 (ms 단위), 재시도는 ai.resilience 계층에서 처리
+    # base_url 지정 시 해당 주소로 전송 (로컬 스텁 서버 등)
+    client = genai.Client(api_key=api_key, http_options=types.HttpOptions(timeout=int(timeout * 1000), base_url=base_url))
 
     # 1. 안전 설정 (Safety Settings) - 리스트 형태로 변경 및 열거형 타입 적용
     # 패션 이커머스 이미지는 성인용 콘텐츠로 오인받기 쉬우므로 BLOCK_NONE 설정을 정확히 주입해야 합니다.
@@ -25,7 +31,7 @@ def _call_gemini_api(system_prompt, user_text, image_list, model_name, api_key):
     generation_config = types.GenerateContentConfig(
         temperature=0.1,
         response_mime_type="application/json",
-        response_schema=ProductSchema,
+        response_schema=response_schema,
         system_instruction=system_prompt,
         safety_settings=safety_settings
     )
@@ -39,6 +45,8 @@ def _call_gemini_api(system_prompt, user_text, image_list, model_name, api_key):
             img_bytes = base64.b64decode(encoded)
             # types.Part.from_bytes 사용 권장
             content_parts.append(types.Part.from_bytes(data=img_bytes, mime_type=mime_type))
+    if usage is not None:
+        usage["images"] = len(content_parts) - 1
 
     # 4. 첫 번째 시도 (이미지 포함)
     try:
@@ -48,6 +56,9 @@ def _call_gemini_api(system_prompt, user_text, image_list, model_name, api_key):
             config=generation_config
         )
     except Exception as e:
+        # 타임아웃/429/5xx 등 일시적 오류는 상위(재시도 계층)로 전달
+        if is_transient(e):
+            raise
         print(f"API 호출 에러: {e}")
         response = None
 
@@ -70,6 +81,8 @@ def _call_gemini_api(system_prompt, user_text, image_list, model_name, api_key):
             st.toast("⚠️ 이미지 보안 정책으로 인해 텍스트만 분석합니다.")
             
             # 텍스트 모드 재시도 시에도 config를 동일하게 전달하여 JSON 형식을 유지합니다.
+            if usage is not None:
+                usage["images"] = 0
             response = client.models.generate_content(
                 model=model_name,
                 contents=[user_text],
@@ -79,8 +92,22 @@ def _call_gemini_api(system_prompt, user_text, image_list, model_name, api_key):
             st.error(f"❌ Gemini가 응답을 거부했습니다. (사유: {reason})")
             return None
 
+    usage_metadata = getattr(response, "usage_metadata", None)
+    if usage_metadata is not None and usage_metadata.candidates_token_count is not None:
+        # 입력/출력 토큰 (스키마별 비교용: ProductSchema / ProductPartialSchema / ProductCompactSchema)
+        metrics.observe("ai_output_tokens", usage_metadata.candidates_token_count, model=model_name, schema=response_schema.__name__)
+    if usage_metadata is not None and usage_metadata.prompt_token_count is not None:
+        metrics.observe("ai_input_tokens", usage_metadata.prompt_token_count, model=model_name, schema=response_schema.__name__)
+        metrics.observe("ai_cached_tokens", usage_metadata.cached_content_token_count or 0, model=model_name, schema=response_schema.__name__)
+    if usage_metadata is not None and usage is not None:
+        usage.update(
+            input_tokens=usage_metadata.prompt_token_count,
+            output_tokens=usage_metadata.candidates_token_count,
+            cached_tokens=usage_metadata.cached_content_token_count or 0,
+        )
+
     # 6. 최종 응답 반환 (parsed 기능 활용)
     try:
         return response.parsed
     except Exception:
-        return ProductSchema(**json.loads(response.text))
\ No newline at end of file
+        return response_schema(**json.loads(response.text))
\ No newline at end of file
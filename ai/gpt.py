@@ -1,33 +1,42 @@
 from schema.product import ProductSchema # 사용자가 정의한 스키마
+from util import metrics
 
 # --- [내부 함수 2] OpenAI Native 호출 로직 (Structured Output 사용) ---
-def _call_openai_native(system_prompt, user_text, image_list, model_name, client):
-    try:
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": []}
-        ]
-        messages[1]["content"].append({"type": "text", "text": user_text})
+# 예외는 그대로 전달 → ai.resilience 계층에서 재시도/서킷 브레이커 처리
+# usage: dict 를 주면 입력/출력/캐시 토큰과 전송한 이미지 수를 채움 (util.ledger 기록용)
+def _call_openai_native(system_prompt, user_text, image_list, model_name, client, response_schema=ProductSchema, usage=None):
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": []}
+    ]
+    messages[1]["content"].append({"type": "text", "text": user_text})
 
-        for img_data in image_list:
-            if isinstance(img_data, str):
-                messages[1]["content"].append({
-                    "type": "image_url",
-                    "image_url": {"url": img_data, "detail": "low"}
-                })
+    for img_data in image_list:
+        if isinstance(img_data, str):
+            messages[1]["content"].append({
+                "type": "image_url",
+                "image_url": {"url": img_data, "detail": "low"}
+            })
 
-        response = client.beta.chat.completions.parse(
-            model=model_name, 
-            messages=messages,
-            response_format=ProductSchema, # 사용자가 정의한 Pydantic 모델
-            temperature=0.2
-        )
-        
-        product_data = response.choices[0].message.parsed
+    response = client.beta.chat.completions.parse(
+        model=model_name, 
+        messages=messages,
+        response_format=response_schema, # 사용자가 정의한 Pydantic 모델 (기본: ProductSchema)
+        temperature=0.2
+    )
+    
+    product_data = response.choices[0].message.parsed
+    if response.usage is not None:
+        # 입력/출력 토큰 (스키마별 비교용: ProductSchema / ProductPartialSchema / ProductCompactSchema)
+        metrics.observe("ai_output_tokens", response.usage.completion_tokens, model=model_name, schema=response_schema.__name__)
+        metrics.observe("ai_input_tokens", response.usage.prompt_tokens, model=model_name, schema=response_schema.__name__)
+        details = getattr(response.usage, "prompt_tokens_details", None)
+        cached_tokens = getattr(details, "cached_tokens", None) or 0
+        metrics.observe("ai_cached_tokens", cached_tokens, model=model_name, schema=response_schema.__name__)
+        if usage is not None:
+            usage.update(input_tokens=response.usage.prompt_tokens, output_tokens=response.usage.completion_tokens,
+                         cached_tokens=cached_tokens)
+    if usage is not None:
+        usage["images"] = sum(1 for img_data in image_list if isinstance(img_data, str))
 
-        return product_data
-            
-    except Exception as e:
-        # ★ [수정] 화면에 에러 출력
-        st.error(f"❌ OpenAI(GPT) 호출 오류 상세: {str(e)}")
-        return None
\ No newline at end of file
+    return product_data
@@ -0,0 +1,94 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from ai.validate import validate_response
+from util import ledger, metrics, scheduler
+
+# ==========================================
+# 지연 꼬리(tail latency) 완화용 헤징(hedged request)
+# - 1차 호출이 해당 모델 최근 지연시간의 p{percentile} 안에 끝나지 않으면
+#   동일/대체 모델로 중복 요청을 보내고, 먼저 도착한 '유효한' 응답을 사용
+# - 추가 호출 비율은 budget_ratio 로 제한 (비용 상한)
+# ==========================================
+LATENCY_METRIC = "ai_call_latency"
+
+# 헤징 전용 스레드 풀 (호출 스레드가 기다리는 동안 실제 요청을 수행)
+_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="ai-hedge")
+_budget_lock = threading.Lock()
+
+
+class HedgePolicy:
+    """
+    percentile      : 헤지 발동 기준이 되는 최근 지연시간 백분위 (예: 90 → p90)
+    min_samples     : 백분위 계산에 필요한 최소 표본 수 (부족하면 default_delay 사용)
+    default_delay   : 표본이 부족할 때 사용할 대기 시간(초)
+    fallback_model  : 중복 요청을 보낼 모델 (None이면 같은 모델)
+    budget_ratio    : 전체 1차 호출 대비 헤지 발동 비율 상한 (0.1 → 최대 10%)
+    """
+    def __init__(self, percentile=90, min_samples=20, default_delay=15.0, fallback_model=None, budget_ratio=0.1):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.default_delay = default_delay
+        self.fallback_model = fallback_model
+        self.budget_ratio = budget_ratio
+
+    def hedge_delay(self, model_name):
+        """해당 모델의 최근 지연시간 기준 헤지 발동 시점(초)"""
+        samples = metrics.get_samples(LATENCY_METRIC, model=model_name)
+        if len(samples) < self.min_samples:
+            return self.default_delay
+        return metrics.percentile(samples, self.percentile)
+
+
+def _try_acquire_budget(policy, model_name):
+    """헤지 예산이 남아 있으면 사용량을 1 증가시키고 True 반환"""
+    with _budget_lock:
+        primaries = metrics.get_counter("hedge_primary_calls", model=model_name)
+        fired = metrics.get_counter("hedge_fired", model=model_name)
+        if fired + 1 > primaries * policy.budget_ratio:
+            return False
+        metrics.incr("hedge_fired", model=model_name)
+        return True
+
+def _is_valid(future):
+    if future.cancelled() or future.exception() is not None:
+        return False
+    response = future.result()
+    return response is not None and not any(issues for _, issues in validate_response(response))
+
+def call_with_hedge(call_fn, model_name, policy):
+    """
+    call_fn(model_name) -> 응답 을 헤징 정책에 따라 실행합니다.
+    - 먼저 끝난 유효한 응답을 반환, 나머지 요청은 취소 (이미 전송된 요청은 결과만 버림)
+    - 둘 다 유효하지 않으면 먼저 도착한 None 이 아닌 응답을 반환
+    """
+    metrics.incr("hedge_primary_calls", model=model_name)
+    delay = policy.hedge_delay(model_name)
+
+    call_fn = ledger.bind(scheduler.bind(call_fn)) # 헤지 스레드에서도 호출한 쪽 우선순위/장부 태그 유지
+    primary = _executor.submit(call_fn, model_name)
+    done, _ = wait([primary], timeout=delay)
+    if done or not _try_acquire_budget(policy, model_name):
+        return primary.result()
+
+    hedge_model = policy.fallback_model or model_name
+    print(f"⏱️ {model_name} 응답 지연({delay:.1f}s 초과) → {hedge_model} 헤지 요청 발송")
+    hedge = _executor.submit(call_fn, hedge_model)
+    pending = {primary, hedge}
+    fallback_response = None
+
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if _is_valid(future):
+                for other in pending:
+                    other.cancel()
+                    metrics.incr("hedge_abandoned", model=model_name)
+                metrics.incr("hedge_won" if future is hedge else "hedge_primary_won", model=model_name)
+                return future.result()
+            if fallback_response is None and not future.cancelled() and future.exception() is None:
+                fallback_response = future.result()
+
+    if fallback_response is None:
+        # 둘 다 예외로 끝난 경우 1차 호출의 예외를 그대로 전달
+        return primary.result()
+    return fallback_response
@@ -1,33 +1,257 @@
+import os
 import streamlit as st
 from openai import OpenAI
 from ai import gpt, gemini, qwen
+import time
+from ai.hedge import LATENCY_METRIC, call_with_hedge
+from ai.resilience import REQUEST_TIMEOUT_SECONDS, CircuitOpenError, call_with_resilience, get_breaker, is_transient
+from ai.validate import validate_response
+from schema.product import ProductSchema
+from util import cassette, ledger, metrics, scheduler
+
+# ==========================================
+# [0] 모델 캐스케이드 설정
+# - 앞 단계(저비용/고속) 결과가 규칙 검증에 실패한 경우에만 다음 단계(고성능) 모델로 승격
+# ==========================================
+CASCADE_MODEL_NAME = "cascade"
+MODEL_CASCADE = ["gemini-2.5-flash-lite", "gpt-4o"]
+
+# 제공사 장애(서킷 오픈/재시도 소진) 시 대신 호출할 다른 제공사 모델
+FALLBACK_MODELS = {
+    "gemini-2.5-flash-lite": "gpt-4o-mini",
+    "gemini-2.5-flash": "gpt-4o-mini",
+    "gpt-4o-mini": "gemini-2.5-flash-lite",
+    "gpt-4o": "gemini-2.5-flash",
+}
 
 # ==========================================
 # [1] AI 통신 전담 함수 (핵심 변경 부분)
 # ==========================================
-def call_ai_service(system_prompt, user_text, image_list, model_name):
+def call_ai_service(system_prompt, user_text, image_list, model_name, response_schema=ProductSchema, hedge=None, repack=None):
     """
-    모델 이름에 따라 적절한 AI 서비스를 호출하고, 결과를 ProductSchema 형태로 반환합니다.
+    모델 이름에 따라 적절한 AI 서비스를 호출하고, 결과를 response_schema(기본: ProductSchema) 형태로 반환합니다.
+    model_name이 "cascade"이면 저비용 모델부터 순서대로 호출하며 검증 실패 시에만 승격합니다.
+    hedge(ai.hedge.HedgePolicy)를 주면 응답이 늦을 때 중복 요청으로 꼬리 지연을 줄입니다. (opt-in)
+    repack: 묶음 요청용, prdNo 목록 → 그 상품만 묶은 유저 메시지 (캐스케이드에서 실패한 상품만 승격할 때 사용)
+    """
+    if model_name == CASCADE_MODEL_NAME:
+        return _call_cascade(system_prompt, user_text, image_list, response_schema, hedge=hedge, repack=repack)
+    return _call_model(system_prompt, user_text, image_list, model_name, response_schema, hedge)
+
+def _call_model(system_prompt, user_text, image_list, model_name, response_schema, hedge=None):
+    """
+    단일 모델 호출 (+ 선택적 헤징)
+    """
+    if hedge is None:
+        return _call_provider(system_prompt, user_text, image_list, model_name, response_schema)
+    return call_with_hedge(
+        lambda target_model: _call_provider(system_prompt, user_text, image_list, target_model, response_schema),
+        model_name,
+        hedge
+    )
+
+def _is_batch(response):
+    return response is not None and isinstance(getattr(response, "items", None), list)
+
+def _category_of(item):
+    return getattr(item, "ai_category_L", None) or "미분류"
+
+def _call_cascade(system_prompt, user_text, image_list, response_schema, tiers=None, hedge=None, repack=None):
+    """
+    2단계 모델 캐스케이드
+    - 각 단계 결과를 ai.validate 규칙으로 검증하고, 통과하면 즉시 반환
+    - 실패하면 다음 단계로 승격 (마지막 단계 결과는 검증 결과와 무관하게 반환)
+    - 묶음(items) 응답은 통과한 상품 결과는 그대로 두고 실패한 상품만 승격해서 병합
+      repack(prdNo 목록) -> 해당 상품만 묶은 유저 메시지 (없으면 같은 메시지를 보내고 실패한 상품 결과만 교체)
+    - 카테고리(ai_category_L)별 요청/승격 횟수를 util.metrics 에 기록 (승격은 실패한 상품마다 그 상품의 카테고리로 1회)
+    """
+    tiers = tiers or MODEL_CASCADE
+    response = None
+    request_text = user_text
+    kept, pending = None, None # 묶음 부분 승격: prdNo -> 결과 (응답 순서 유지), 승격 대상 prdNo
+    counted = False
+
+    for tier_idx, tier_model in enumerate(tiers):
+        try:
+            response = _call_model(system_prompt, request_text, image_list, tier_model, response_schema, hedge)
+        except Exception as e:
+            print(f"캐스케이드 {tier_model} 호출 오류: {e}")
+            response = None
+
+        if kept is not None:
+            # 승격한 상품 결과만 이전 단계 결과에 덮어씀 (응답이 없거나 빠진 상품은 이전 결과 유지)
+            for item in (response.items if _is_batch(response) else []):
+                if str(item.prdNo) in pending:
+                    kept[str(item.prdNo)] = item
+            response = batch_type(items=list(kept.values()))
+
+        checked = validate_response(response)
+        # 요청 수는 첫 단계 결과의 카테고리 기준으로 집계
+        if not counted:
+            for item, _ in checked:
+                metrics.incr("cascade_requests", category=_category_of(item))
+            counted = True
+
+        failed = [(item, issues) for item, issues in checked if issues]
+        is_last = tier_idx == len(tiers) - 1
+        if not failed or is_last:
+            return response
+
+        next_model = tiers[tier_idx + 1]
+        reasons = sorted({issue for _, issues in failed for issue in issues})
+        print(f"⬆️ 검증 실패로 {tier_model} → {next_model} 승격 ({len(failed)}/{len(checked)}건): {', '.join(reasons)}")
+        for item, _ in failed:
+            metrics.incr("cascade_escalations", category=_category_of(item), tier=next_model)
+
+        prd_nos = [str(item.prdNo) for item in response.items] if _is_batch(response) else []
+        if prd_nos and len(set(prd_nos)) == len(prd_nos) and len(failed) < len(checked):
+            # 통과한 상품은 유지, 실패한 상품만 다음 단계로
+            batch_type = type(response)
+            kept = dict(zip(prd_nos, response.items))
+            pending_list = [str(item.prdNo) for item, _ in failed]
+            pending = set(pending_list)
+            request_text = repack(pending_list) if repack is not None else user_text
+        else:
+            # 응답이 없거나 prdNo 가 중복/누락된 묶음 → 전체를 다시 요청
+            kept, pending, request_text = None, None, user_text
+
+    return response
+
+def get_escalation_rates():
+    """
+    카테고리별 캐스케이드 승격률
+    Return: {category: {"requests": n, "escalated": m, "rate": m/n}}
+    """
+    rates = {}
+    for labels, value in metrics.get_counters_by_name("cascade_requests"):
+        entry = rates.setdefault(labels.get("category", "미분류"), {"requests": 0, "escalated": 0})
+        entry["requests"] += value
+    for labels, value in metrics.get_counters_by_name("cascade_escalations"):
+        entry = rates.setdefault(labels.get("category", "미분류"), {"requests": 0, "escalated": 0})
+        entry["escalated"] += value
+
+    for entry in rates.values():
+        entry["rate"] = entry["escalated"] / entry["requests"] if entry["requests"] else 0.0
+    return rates
+
+def first_tier_model(model_name):
+    """캐스케이드면 첫 단계 모델 (이미지 렌디션/변환은 대부분의 요청을 처리하는 첫 단계 기준), 아니면 그대로"""
+    return MODEL_CASCADE[0] if model_name == CASCADE_MODEL_NAME else model_name
+
+def provider_of(model_name):
+    """모델 이름 → 제공사 (gemini / qwen / openai)"""
+    name = model_name.lower()
+    if "gemini" in name:
+        return "gemini"
+    if "qwen" in name:
+        return "qwen"
+    return "openai"
+
+def _call_provider(system_prompt, user_text, image_list, model_name, response_schema=ProductSchema, allow_fallback=True):
+    """
+    단일 모델 호출 + 복원력 계층(재시도/서킷 브레이커) + 지연시간 기록 (헤징 기준값으로 사용)
+    제공사가 불안정하면(서킷 오픈 또는 일시적 오류 재시도 소진) FALLBACK_MODELS 의 대체 모델로 1회 전환합니다.
+    """
+    start = time.perf_counter()
+    try:
+        response = call_with_resilience(
+            lambda: _dispatch_scheduled(system_prompt, user_text, image_list, model_name, response_schema),
+            provider_of(model_name),
+            model_name
+        )
+    except Exception as e:
+        fallback_model = FALLBACK_MODELS.get(model_name)
+        unhealthy = (isinstance(e, CircuitOpenError) or is_transient(e)
+                     or get_breaker(provider_of(model_name), model_name).is_open())
+        if not (allow_fallback and fallback_model and unhealthy):
+            raise
+        print(f"↪️ {model_name} 제공사 장애로 {fallback_model} 모델로 전환합니다: {e}")
+        metrics.incr("provider_fallbacks", model=model_name, fallback=fallback_model)
+        return _call_provider(system_prompt, user_text, image_list, fallback_model, response_schema, allow_fallback=False)
+
+    if response is not None:
+        metrics.observe(LATENCY_METRIC, time.perf_counter() - start, model=model_name)
+    return response
+
+def get_secret(name, default=None):
+    """
+    st.secrets 우선, 없으면 환경변수 (CLI/부하 테스트처럼 secrets.toml 없이 실행할 때)
+    """
+    try:
+        return st.secrets[name]
+    except Exception:
+        return os.environ.get(name, default)
+
+def _dispatch_scheduled(system_prompt, user_text, image_list, model_name, response_schema=ProductSchema):
+    """
+    제공사별 동시 호출 한도(util.scheduler)에서 현재 우선순위로 슬롯을 받아 호출
+    (시도 단위로 점유 → 재시도 백오프 대기 중에는 다른 작업이 사용)
+    시도 1회마다 토큰/지연시간/결과를 호출 장부(util.ledger)에 기록 (슬롯 대기 시간은 제외)
+    """
+    provider = provider_of(model_name)
+    with scheduler.slot(f"llm:{provider}"):
+        usage = {}
+        response, outcome = None, "error"
+        start = time.perf_counter()
+        try:
+            response = _dispatch_recorded(system_prompt, user_text, image_list, model_name, response_schema, usage)
+            outcome = "ok" if response is not None else "empty"
+            return response
+        except Exception as e:
+            outcome = f"error:{type(e).__name__}"
+            raise
+        finally:
+            ledger.record_call(
+                model_name, provider, system_prompt, response_schema.__name__, usage, time.perf_counter() - start, outcome,
+                response=response, images=len(image_list), priority=scheduler.current_priority()
+            )
+
+def _dispatch_recorded(system_prompt, user_text, image_list, model_name, response_schema, usage):
+    """
+    제공사 호출 (CASSETTE_MODE=record|replay 이면 응답과 토큰 사용량을 기록/재생, util.cassette)
+    요청 키: 모델 + 프롬프트 + 이미지 + 스키마 필드 구성 (부분 스키마는 클래스 이름이 같아도 필드로 구분)
+    """
+    request = (model_name, system_prompt, user_text, image_list, response_schema.__name__, sorted(response_schema.model_fields))
+
+    def _encode(response):
+        meta = {"usage": usage, "empty": response is None}
+        return meta, response.model_dump_json().encode("utf-8") if response is not None else b""
+
+    def _decode(meta, body):
+        usage.update(meta["usage"])
+        return None if meta["empty"] else response_schema.model_validate_json(body)
+
+    return cassette.through(
+        "llm", request,
+        lambda: _dispatch_provider(system_prompt, user_text, image_list, model_name, response_schema, usage=usage),
+        _encode, _decode
+    )
+
+def _dispatch_provider(system_prompt, user_text, image_list, model_name, response_schema=ProductSchema, usage=None):
+    """
+    모델 이름으로 제공사 분기
     """
-    
     # 1. Google Gemini (Flash, Pro 등)
     if "gemini" in model_name.lower():
-        api_key = st.secrets["GOOGLE_API_KEY_LSS"]
-        return gemini._call_gemini_api(system_prompt, user_text, image_list, model_name, api_key)
+        api_key = get_secret("GOOGLE_API_KEY_LSS")
+        return gemini._call_gemini_api(system_prompt, user_text, image_list, model_name, api_key, response_schema,
+                                       timeout=REQUEST_TIMEOUT_SECONDS, base_url=get_secret("GEMINI_BASE_URL"), usage=usage)
     
     # 2. Qwen (OpenAI 호환 API 사용 권장) 또는 기타 OpenAI 호환 모델
     elif "qwen" in model_name.lower():
         # Qwen용 클라이언트가 별도로 없으면 기존 client 사용하거나 새로 생성
-        api_key = st.secrets["DASHSCOPE_API_KEY"]
-        client = OpenAI(base_url=st.secrets["DASHSCOPE_API_URL"], api_key=api_key)
-        return qwen._call_openai_compatible(system_prompt, user_text, image_list, model_name, client)
+        api_key = get_secret("DASHSCOPE_API_KEY")
+        client = OpenAI(base_url=get_secret("DASHSCOPE_API_URL"), api_key=api_key, timeout=REQUEST_TIMEOUT_SECONDS, max_retries=0)
+        return qwen._call_openai_compatible(system_prompt, user_text, image_list, model_name, client, response_schema, usage=usage)
 
     # 3. 기본 OpenAI (GPT-4o 등)
     else:
         # ★ [수정] Client가 없으면 api_key로 생성하는 로직 추가
-        api_key = st.secrets["OPENAI_API_KEY"]
-        client = OpenAI(api_key=api_key)
-        return gpt._call_openai_native(system_prompt, user_text, image_list, model_name, client)
+        api_key = get_secret("OPENAI_API_KEY")
+        # SDK 자체 재시도는 끄고(max_retries=0) ai.resilience 계층에서 일괄 처리
+        # OPENAI_BASE_URL 지정 시 해당 주소로 전송 (로컬 스텁 서버 등)
+        client = OpenAI(api_key=api_key, base_url=get_secret("OPENAI_BASE_URL"), timeout=REQUEST_TIMEOUT_SECONDS, max_retries=0)
+        return gpt._call_openai_native(system_prompt, user_text, image_list, model_name, client, response_schema, usage=usage)
 
 
 
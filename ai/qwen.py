@@ -1,32 +1,38 @@
 from schema.product import ProductSchema # 사용자가 정의한 스키마
+from util import metrics
 
 # --- [내부 함수 3] Qwen 등 호환 API 호출 로직 ---
-def _call_openai_compatible(system_prompt, user_text, image_list, model_name, client):
+def _call_openai_compatible(system_prompt, user_text, image_list, model_name, client, response_schema=ProductSchema, usage=None):
     """
+    usage: dict 를 주면 입력/출력/캐시 토큰을 채움 (util.ledger 기록용, 이미지는 보내지 않으므로 0장)
     Qwen 등은 OpenAI 호환 API를 제공하지만, 'beta.parse' (Structured Output)를 
     지원하지 않는 경우가 많으므로 일반적인 JSON Mode로 처리합니다.
+    예외는 그대로 전달 → ai.resilience 계층에서 재시도/서킷 브레이커 처리
     """
-    try:
-        response = client.beta.chat.completions.parse(
-            model=model_name, 
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_text}
-            ],
-            response_format=ProductSchema, # 사용자가 정의한 Pydantic 모델
-            temperature=0.2
-        )
-        
-        product_data = response.choices[0].message.parsed
+    if len(image_list) > 0:
+        print(f"Qwen 호출: 이미지 {len(image_list)}개는 전송하지 않고 텍스트만 분석합니다.")
 
-        return product_data
-        
-    except Exception as e:
-        # [핵심] Qwen 에러 상세 출력
-        st.error(f"❌ Qwen(DashScope) API 에러 상세: {str(e)}")
-        
-        # 이미지가 너무 커서 나는 에러인지 확인하기 위해 payload 길이 출력해보기
-        if len(image_list) > 0:
-            st.warning(f"전송 시도한 이미지 개수: {len(image_list)}")
-        
-        return None
\ No newline at end of file
+    response = client.beta.chat.completions.parse(
+        model=model_name, 
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_text}
+        ],
+        response_format=response_schema, # 사용자가 정의한 Pydantic 모델 (기본: ProductSchema)
+        temperature=0.2
+    )
+    
+    product_data = response.choices[0].message.parsed
+    if response.usage is not None:
+        metrics.observe("ai_output_tokens", response.usage.completion_tokens, model=model_name, schema=response_schema.__name__)
+        metrics.observe("ai_input_tokens", response.usage.prompt_tokens, model=model_name, schema=response_schema.__name__)
+        details = getattr(response.usage, "prompt_tokens_details", None)
+        cached_tokens = getattr(details, "cached_tokens", None) or 0
+        metrics.observe("ai_cached_tokens", cached_tokens, model=model_name, schema=response_schema.__name__)
+        if usage is not None:
+            usage.update(input_tokens=response.usage.prompt_tokens, output_tokens=response.usage.completion_tokens,
+                         cached_tokens=cached_tokens)
+    if usage is not None:
+        usage["images"] = 0
+
+    return product_data
@@ -0,0 +1,143 @@
+import random
+import threading
+import time
+from util import metrics
+
+# ==========================================
+# 모든 AI 제공사 호출에 공통 적용하는 복원력(resilience) 계층
+# - 시도(attempt)별 타임아웃: 각 제공사 클라이언트에 REQUEST_TIMEOUT_SECONDS 전달
+# - 일시적 오류(타임아웃, 연결 끊김, 429, 5xx)만 지수 백오프 + 지터로 재시도
+# - 제공사/모델별 서킷 브레이커: 일시적 오류가 연속되면 일정 시간 즉시 실패(fail fast)
+#   (400/스키마 오류처럼 요청 자체가 잘못된 경우는 제공사 장애가 아니므로 실패로 세지 않음)
+# ==========================================
+REQUEST_TIMEOUT_SECONDS = 60   # 시도 1회당 최대 대기 시간
+MAX_ATTEMPTS = 3               # 일시적 오류 시 최대 시도 횟수 (최초 1회 포함)
+BASE_BACKOFF_SECONDS = 0.5
+MAX_BACKOFF_SECONDS = 8.0
+
+FAILURE_THRESHOLD = 5          # 일시적 오류 연속 N회 → 서킷 오픈
+RECOVERY_TIMEOUT_SECONDS = 30  # 오픈 후 N초 지나면 시험 호출 1건 허용 (half-open)
+
+TRANSIENT_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+TRANSIENT_NAME_HINTS = ("Timeout", "Connection", "RateLimit", "ServerError", "InternalServer", "Unavailable")
+
+
+class CircuitOpenError(Exception):
+    """서킷 브레이커가 열려 있어 호출하지 않고 즉시 실패"""
+    pass
+
+
+def is_transient(exc):
+    """
+    재시도하면 성공할 가능성이 있는 오류인지 판별합니다.
+    (openai / google-genai / requests 예외를 모두 import 없이 속성과 이름으로 판별)
+    """
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    status = getattr(exc, "status_code", None) or getattr(exc, "code", None)
+    if isinstance(status, int) and status in TRANSIENT_STATUS_CODES:
+        return True
+    name = type(exc).__name__
+    return any(hint in name for hint in TRANSIENT_NAME_HINTS)
+
+
+class CircuitBreaker:
+    """
+    closed(정상) → 일시적 오류 연속 failure_threshold 회 → open(즉시 실패)
+    → recovery_timeout 경과 → half_open(시험 호출 1건) → 성공 시 closed / 실패 시 다시 open
+    """
+    def __init__(self, name, failure_threshold=FAILURE_THRESHOLD, recovery_timeout=RECOVERY_TIMEOUT_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.recovery_timeout:
+                self.state = "half_open"
+                self._trial_in_flight = False
+            if self.state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    print(f"🔌 서킷 오픈: {self.name} (연속 실패 {self.failures}회)")
+                    metrics.incr("circuit_opened", breaker=self.name)
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    def is_open(self):
+        with self._lock:
+            return self.state == "open" and time.monotonic() - self.opened_at < self.recovery_timeout
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+def get_breaker(provider, model_name):
+    key = f"{provider}:{model_name}"
+    with _breakers_lock:
+        if key not in _breakers:
+            _breakers[key] = CircuitBreaker(key)
+        return _breakers[key]
+
+def get_breaker_states():
+    """대시보드용: {"provider:model": "closed" | "open" | "half_open"}"""
+    with _breakers_lock:
+        return {key: breaker.state for key, breaker in _breakers.items()}
+
+def _backoff_delay(attempt):
+    # full jitter: 0 ~ min(max, base * 2^attempt)
+    return random.uniform(0, min(MAX_BACKOFF_SECONDS, BASE_BACKOFF_SECONDS * (2 ** attempt)))
+
+def call_with_resilience(call_fn, provider, model_name, max_attempts=MAX_ATTEMPTS):
+    """
+    call_fn() 을 서킷 브레이커 + 재시도 정책으로 감싸서 실행합니다.
+    - 서킷이 열려 있으면 CircuitOpenError
+    - 일시적 오류는 max_attempts 까지 재시도, 그 외 오류는 즉시 전달
+    - 서킷 브레이커에는 일시적 오류만 실패로 기록 (그 외 오류는 제공사가 응답한 것이므로 정상 처리)
+    """
+    breaker = get_breaker(provider, model_name)
+
+    for attempt in range(max_attempts):
+        if not breaker.allow():
+            metrics.incr("circuit_rejected", breaker=breaker.name)
+            raise CircuitOpenError(f"{breaker.name} 서킷이 열려 있어 호출을 건너뜁니다.")
+
+        try:
+            result = call_fn()
+        except Exception as e:
+            transient = is_transient(e)
+            if transient:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            metrics.incr("provider_errors", provider=provider, model=model_name, transient=transient)
+            if not transient or attempt == max_attempts - 1:
+                raise
+            delay = _backoff_delay(attempt)
+            print(f"🔁 {breaker.name} 일시적 오류, {delay:.1f}s 후 재시도 ({attempt + 1}/{max_attempts}): {e}")
+            time.sleep(delay)
+            continue
+
+        breaker.record_success()
+        return result
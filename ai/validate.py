@@ -0,0 +1,71 @@
+from schema.product import decode_compact_result
+
+# ==========================================
+# AI 분석 결과 규칙 기반 검증
+# - prompts/product.py 의 분류 기준과 동일한 허용값을 사용
+# - 결과 객체에 존재하는 필드만 검사 (부분 스키마에도 재사용 가능)
+# ==========================================
+ALLOWED_GENDERS = {"남성", "여성", "남녀공용", "키즈"}
+ALLOWED_SEASONS = {"봄", "여름", "가을", "겨울", "사계절"}
+ALLOWED_STYLES = {"미니멀", "클래식", "캐주얼", "페미닌", "로맨틱", "스포티", "스트리트", "휴양지"}
+
+# 프롬프트 규칙은 400자 이상이지만, 약간 모자란 정도는 허용하고 크게 미달한 경우만 실패 처리
+MIN_DESCRIPTION_LENGTH = 300
+
+# 비어 있으면 안 되는 필드
+REQUIRED_TEXT_FIELDS = ["ai_category_L", "ai_category_M", "ai_category_S", "ai_gender", "ai_pattern", "ai_fit"]
+
+
+def _is_blank(value):
+    return value is None or (isinstance(value, str) and not value.strip())
+
+def validate_product_result(result, min_description_length=MIN_DESCRIPTION_LENGTH):
+    """
+    단일 상품 분석 결과(ProductSchema 등)를 검증합니다.
+    Return: 위반 사항 목록 (빈 리스트면 통과)
+    """
+    if result is None:
+        return ["no_response"]
+    result = decode_compact_result(result) # 압축 코드 응답은 라벨로 복원 후 검사
+
+    fields = type(result).model_fields
+    issues = []
+
+    for field in REQUIRED_TEXT_FIELDS:
+        if field in fields and _is_blank(getattr(result, field)):
+            issues.append(f"blank:{field}")
+
+    if "description" in fields:
+        desc = getattr(result, "description") or ""
+        if len(desc.strip()) < min_description_length:
+            issues.append("short:description")
+
+    if "ai_gender" in fields and not _is_blank(result.ai_gender) and result.ai_gender not in ALLOWED_GENDERS:
+        issues.append("invalid:ai_gender")
+
+    if "ai_season" in fields:
+        seasons = result.ai_season or []
+        if not seasons:
+            issues.append("blank:ai_season")
+        elif any(s not in ALLOWED_SEASONS for s in seasons):
+            issues.append("invalid:ai_season")
+
+    if "ai_style" in fields:
+        styles = result.ai_style or []
+        if not styles:
+            issues.append("blank:ai_style")
+        elif any(s not in ALLOWED_STYLES for s in styles):
+            issues.append("invalid:ai_style")
+
+    return issues
+
+def validate_response(response, min_description_length=MIN_DESCRIPTION_LENGTH):
+    """
+    단일 결과 / 묶음 결과(items) 모두 검증합니다.
+    Return: [(상품 결과, 위반 사항 목록), ...]
+    """
+    if response is not None and hasattr(response, "items") and isinstance(response.items, list):
+        if not response.items:
+            return [(None, ["no_response"])]
+        return [(item, validate_product_result(item, min_description_length)) for item in response.items]
+    return [(response, validate_product_result(response, min_description_length))]
@@ -1,8 +1,19 @@
 import streamlit as st
+import html
 import json
+import uuid
 from prompts.product import DEFAULT_SYSTEM_PROMPT
-from util.product import getProductInfo, analyze_product_with_full_context
+from util.product import getProductInfo, getProductInfoFromEs, get_es_fast_path_stats, analyze_product_with_full_context
 from util.search import getPrdListByKeyword, process_es_hit_to_display
+from ai.model import CASCADE_MODEL_NAME, MODEL_CASCADE, get_escalation_rates
+from ai.hedge import HedgePolicy
+from util.dedup import get_default_index
+from util.blob_store import get_blob_store
+from util.transport import get_host_stats
+from util.profiler import profile_call
+from util.description_queue import description_key, get_description_queue
+from util.prefetch import Prefetcher, get_prefetch_stats
+from util import scheduler
 
 
 
@@ -38,7 +49,7 @@ def main():
         line-height: 1.2;
         margin-bottom: 0px;
     }
-    div[data-testid="stText"] {
+    div[data-testid="stText"], .card-name {
         font-size: 12px;
         font-weight: bold;
         line-height: 1.3;
@@ -46,6 +57,12 @@ def main():
         overflow: hidden;         /* 넘치면 숨김 */
         text-overflow: ellipsis;  /* ... 처리 */
     }
+    /* 검색 결과 카드 (이미지 + 브랜드 + 상품명을 HTML 한 덩어리로 렌더링) */
+    .card-brand {
+        font-size: 11px;
+        line-height: 1.2;
+        color: rgba(49, 51, 63, 0.6);
+    }
     </style>
     """, unsafe_allow_html=True)
 
@@ -65,7 +82,8 @@ def main():
                     # "qwen-vl-plus",
                     # "qwen3-vl-plus",
                     "gpt-4o-mini", 
-                    "gpt-4o"
+                    "gpt-4o",
+                    CASCADE_MODEL_NAME
                 ],
             index=0,
             captions=[
@@ -74,11 +92,59 @@ def main():
                     # "Qwen 경량/저비용", 
                     # "Qwen3 고성능/저비용", 
                     "OpenAI 경량/저비용", 
-                    "OpenAI 고성능/고비용"
+                    "OpenAI 고성능/고비용",
+                    f"{' → '.join(MODEL_CASCADE)} (검증 실패 시에만 승격)"
                 ]
         )
         st.info(f"선택된 모델: **{selected_sidebar_model}**")
 
+        # 호스트별 HTTP 요청/바이트 (304 재검증으로 절약한 바이트 포함)
+        host_stats = get_host_stats()
+        if host_stats:
+            with st.expander("🌐 HTTP 전송 통계"):
+                for host, entry in sorted(host_stats.items()):
+                    st.caption(
+                        f"{host}: 요청 {int(entry.get('http_requests', 0))}건 / "
+                        f"수신 {entry.get('http_bytes', 0) / 1024:.0f}KB / "
+                        f"304 {int(entry.get('http_not_modified', 0))}건 (절약 {entry.get('http_bytes_saved', 0) / 1024:.0f}KB)"
+                    )
+
+        # 캐스케이드 승격 현황 (카테고리별)
+        escalation_rates = get_escalation_rates()
+        if escalation_rates:
+            with st.expander("⬆️ 캐스케이드 승격률"):
+                for category, entry in sorted(escalation_rates.items()):
+                    st.caption(f"{category}: {int(entry['escalated'])}/{int(entry['requests'])}건 ({entry['rate']:.0%})")
+
+        # 검색 결과 fast path 현황 (상세 API 생략 비율)
+        es_stats = get_es_fast_path_stats()
+        if sum(es_stats[k] for k in ("hit", "partial", "miss", "off")):
+            with st.expander("⚡ 검색 결과 fast path"):
+                st.caption(
+                    f"상세 API 생략 {es_stats['hit']}건 / 상세 API 호출 {es_stats['detail_calls']}건 "
+                    f"(상세설명 보충 {es_stats['partial']}건 포함, 생략률 {es_stats['hit_rate']:.0%})"
+                )
+                for field, count in sorted(es_stats["missing"].items()):
+                    st.caption(f"누락 필드 {field}: {count}건")
+
+        # 검색 결과 선행 준비 현황
+        prefetch_stats = get_prefetch_stats()
+        if prefetch_stats["scheduled"]:
+            with st.expander("🚀 검색 결과 미리 준비"):
+                st.caption(
+                    f"예약 {prefetch_stats['scheduled']}건 / 취소 {prefetch_stats['cancelled']}건 / "
+                    f"클릭 시 사용 {prefetch_stats['hit'] + prefetch_stats['running']}건 (적중률 {prefetch_stats['hit_rate']:.0%})"
+                )
+
+        # 우선순위 스케줄러 (자원별 실행/대기 수)
+        scheduler_stats = scheduler.get_scheduler_stats()
+        if scheduler_stats:
+            with st.expander("🚦 우선순위 스케줄러"):
+                for resource, entry in sorted(scheduler_stats.items()):
+                    running = sum(entry["running"].values())
+                    waiting = ", ".join(f"{p} {n}" for p, n in entry["waiting"].items() if n) or "없음"
+                    st.caption(f"{resource}: 실행 {running}/{entry['limit']} / 대기 {waiting}")
+
         st.markdown("---")
         # ★ [추가] 이미지 분석 포함 여부 토글
         use_image_analysis = st.toggle("📸 이미지 포함하여 분석", value=True)
@@ -88,6 +154,74 @@ def main():
         else:
             st.caption("⚡ 텍스트만 빠르게 분석합니다. (이미지 제외)")
 
+        # ★ [추가] 검색 결과 선행 준비 토글 (LLM 호출 없이 상세정보/이미지 조각만 미리 준비)
+        use_prefetch = st.toggle("🚀 검색 결과 미리 준비", value=False)
+        if use_prefetch:
+            st.caption("화면에 보이는 상품의 상세정보와 이미지를 미리 받아 두어, 분석 클릭 시 바로 AI를 호출합니다.")
+
+        # ★ [추가] 상세설명 이미지 포함 토글 (헤더만 받아 작은/초대형/배너 이미지는 다운로드 전에 제외)
+        detail_images = False
+        if use_image_analysis:
+            detail_images = st.toggle("🖼️ 상세설명 이미지도 포함", value=False)
+            if detail_images:
+                st.caption("상세페이지 이미지 중 정보가 많은 것만 골라 상품 이미지와 함께 보냅니다. (아이콘/배너 등은 다운로드 전 제외)")
+
+        # ★ [추가] 규칙 기반 사전 추출 토글
+        use_rules = st.toggle("📐 규칙 기반 사전 추출", value=False)
+        if use_rules:
+            st.caption("카테고리/성별/계절/스타일/기장/사이즈 등 확정 가능한 값은 규칙으로 채우고 나머지만 AI에게 요청합니다.")
+
+        # ★ [추가] 2단계 분석: 속성 먼저, 설명(description)은 백그라운드에서 나중에 생성
+        defer_description = st.toggle("✍️ 속성 먼저 받고 설명은 나중에 생성", value=False)
+        if defer_description:
+            st.caption("속성만 빠르게 분석해 먼저 보여주고, 설명은 백그라운드에서 생성합니다. (설명 탭에서 바로 생성 가능)")
+
+        # ★ [추가] 분류형 필드 코드 응답(출력 토큰 절감) 토글
+        compact_output = st.toggle("🔤 분류 항목 코드로 응답받기", value=False)
+        if compact_output:
+            st.caption("성별/계절/스타일/패턴/핏/기장을 짧은 코드로 받아 한글 라벨로 복원합니다. (응답 토큰·지연 감소, 스타일은 정해진 목록 안에서만 선택)")
+
+        # ★ [추가] 카테고리별 프롬프트/스키마 라우팅 토글
+        route_category = st.toggle("🧭 카테고리별 프롬프트 사용", value=False)
+        if route_category:
+            st.caption("신발/가방/잡화 등 해당 없는 기장 항목은 요청하지 않고 비워 둡니다. (입력·출력 토큰 감소)")
+
+        # ★ [추가] 유사(중복) 상품 결과 재사용 토글
+        use_dedup = st.toggle("♻️ 유사 상품 분석 결과 재사용", value=False)
+        regenerate_description = False
+        if use_dedup:
+            regenerate_description = st.checkbox("설명(description)은 새로 생성", value=False)
+            st.caption("이미 분석된 상품과 거의 같은 상품이면 속성을 복사합니다. (출처는 필드별 출처에 표시)")
+
+        # ★ [추가] 다음 분석 1건 프로파일링 예약
+        if st.button("🔬 다음 분석 프로파일링", help="다음 분석 1건을 cProfile + tracemalloc 으로 실행해 병목을 확인합니다."):
+            st.session_state.profile_next_analysis = True
+        if st.session_state.get("profile_next_analysis"):
+            st.caption("🔬 다음 분석에 프로파일링이 적용됩니다.")
+
+        # ★ [추가] 응답 지연 시 중복 요청(헤징) 토글
+        use_hedge = st.toggle("⏱️ 지연 시 중복 요청 (Hedging)", value=False)
+        hedge_policy = None
+        if use_hedge:
+            hedge_percentile = st.slider("헤지 발동 기준 (최근 지연시간 백분위)", 50, 99, 90)
+            hedge_policy = HedgePolicy(percentile=hedge_percentile)
+            st.caption(f"응답이 최근 p{hedge_percentile}보다 늦으면 같은 모델로 한 번 더 요청합니다. (추가 호출 최대 10%)")
+
+    # 분석 옵션 (사이드바 변경 시에는 전체가 다시 실행되므로 fragment 에는 인자로 전달)
+    settings = dict(
+        model_name=selected_sidebar_model,
+        use_images=use_image_analysis,
+        hedge=hedge_policy,
+        use_rules=use_rules,
+        use_dedup=use_dedup,
+        regenerate_description=regenerate_description,
+        compact_output=compact_output,
+        route_category=route_category,
+        defer_description=defer_description,
+        prefetch=use_prefetch,
+        detail_images=detail_images,
+    )
+
     # 메인 타이틀
     st.title("🛍️ 이커머스 상품 정보 AI 분석기")
     
@@ -97,7 +231,6 @@ def main():
     if "ai_result" not in st.session_state: st.session_state.ai_result = None
 
     # [설정] 세션 상태 초기화
-    if "is_analyzing" not in st.session_state: st.session_state.is_analyzing = False
     if "analyzing_product_name" not in st.session_state: st.session_state.analyzing_product_name = ""
     # 초기 모델값을 사이드바 선택값으로 설정
     if "current_model" not in st.session_state: st.session_state.current_model = selected_sidebar_model
@@ -122,8 +255,40 @@ def main():
         st.session_state.search_results = [process_es_hit_to_display(hit) for hit in hits]
         st.session_state.selected_product = None
         st.session_state.ai_result = None
-        st.session_state.is_analyzing = False
+        st.session_state.pending_analysis = None
+        st.session_state.grid_page = 1
+        _get_prefetcher().cancel()
+
+    render_prompt_editor()
+    render_search_grid(settings)
 
+
+# ==========================================
+# 화면 영역별 fragment (해당 영역의 위젯을 조작하면 그 영역만 다시 실행)
+# - 프롬프트 편집 / 검색 결과 그리드 / 분석 패널
+# - 분석 패널은 그리드 fragment 안에 중첩: Streamlit 은 다른 fragment 를 직접 다시 실행할 수 없으므로
+#   "✨ 분석" 클릭 시 그리드 fragment 가 다시 실행되고, 그리드 카드는 캐시된 HTML 로 바로 그려짐
+# ==========================================
+GRID_COLS_PER_ROW = 10
+GRID_PAGE_SIZE = 50 # 한 페이지에 그리는 카드 수 (검색 결과가 많아도 버튼 위젯 수가 일정)
+
+@st.cache_data(show_spinner=False, max_entries=5000)
+def render_card_html(prd_no, img_url, brand, name):
+    """검색 결과 카드 1개(이미지 링크 + 브랜드 + 상품명) HTML, 같은 상품은 캐시 재사용"""
+    short_name = (name[:20] + '..') if len(name) > 20 else name
+    if img_url:
+        link_url = f"https://www.halfclub.com/product/{prd_no}"
+        image_html = f"""<a href="{html.escape(link_url)}" target="_blank"><img src="{html.escape(img_url)}" style="width:100%; border-radius:8px; cursor:pointer;"></a>"""
+    else:
+        image_html = "<p>No Image</p>"
+    return (
+        f"{image_html}"
+        f"<div class='card-brand'>{html.escape(str(brand))}</div>"
+        f"<div class='card-name'>{html.escape(short_name)}</div>"
+    )
+
+@st.fragment
+def render_prompt_editor():
     # =========================================================
     # ★ [위치 이동] 프롬프트 설정 영역 (검색 결과 바로 아래)
     # =========================================================
@@ -142,120 +307,166 @@ def main():
         # st.text_area의 key가 중요합니다.
         st.text_area(
             label="시스템 프롬프트 내용",
-            value=DEFAULT_SYSTEM_PROMPT,
             height=300,
             key="system_prompt_input", # 이 key가 세션 저장소의 이름이 됩니다.
             help="AI의 페르소나와 분석 규칙을 정의합니다."
         )    
 
+def _session_uid():
+    """세션 식별자 (프로세스 공용 큐에서 세션별 항목을 구분)"""
+    if "session_uid" not in st.session_state:
+        st.session_state.session_uid = uuid.uuid4().hex
+    return st.session_state.session_uid
+
+def _get_prefetcher():
+    """세션별 선행 준비 상태 (워커 풀은 프로세스 공용)"""
+    if "prefetcher" not in st.session_state:
+        st.session_state.prefetcher = Prefetcher()
+    return st.session_state.prefetcher
+
+def _request_analysis(item, model_name):
+    """✨ 분석 버튼 콜백: 분석 패널이 이번 실행에서 분석하도록 예약"""
+    st.session_state.pending_analysis = item
+    # [핵심] 사이드바에서 선택한 모델명을 세션에 저장
+    st.session_state.current_model = model_name
+    st.session_state.analyzing_product_name = item['name']
+
+@st.fragment
+def render_search_grid(settings):
     # ----------------------------------------------
-    # Step 2: 리스트 출력 (5개씩 그리드 + 선택 버튼)
+    # Step 2: 리스트 출력 (10개씩 그리드 + 선택 버튼)
     # ----------------------------------------------
     search_results = st.session_state.search_results
-
-    if search_results:
-        st.divider()
-        st.subheader(f"2. 검색 결과 ({len(search_results)}건)")
-        
-        # 5개씩 끊어서 행 만들기
-        cols_per_row = 10
-        for i in range(0, len(search_results), cols_per_row):
-            cols = st.columns(cols_per_row)
-            
-            # 각 Row 안에서 Column 채우기
-            for j in range(cols_per_row):
-                if i + j < len(search_results):
-                    item = search_results[i + j]
-                    with cols[j]:
-                        # 이미지 링크 처리
-                        if item['img_url']:
-                            link_url = f"https://www.halfclub.com/product/{item['prdNo']}"
-                            st.markdown(
-                                f"""<a href="{link_url}" target="_blank"><img src="{item['img_url']}" style="width:100%; border-radius:8px; cursor:pointer;"></a>""",
-                                unsafe_allow_html=True
-                            )
-                        else:
-                            st.write("No Image")
-                        
-                        # 상품 정보 (브랜드/상품명)
-                        st.caption(item['brand'])
-                        short_name = (item['name'][:20] + '..') if len(item['name']) > 20 else item['name']
-                        st.text(short_name)
-                        
-                        # ==========================================
-                        # [수정 2] 버튼 통합
-                        # ==========================================
-                        analyze_btn = st.button("✨ 분석", key=f"btn_analyze_{item['prdNo']}", type="secondary", width="stretch")
-
-                        if analyze_btn:
-                            # 1. 데이터 준비
-                            processed_df = getProductInfo(item['prdNo'])
-                            row = processed_df
-
-                            st.session_state.selected_product = row
-
-                            # [핵심] 사이드바에서 선택한 모델명을 세션에 저장
-                            # (gpt-4o, gpt-4o-mini, gemini-1.5-flash 중 하나)
-                            st.session_state.current_model = selected_sidebar_model
-                            st.session_state.analyzing_product_name = item['name']
-                            st.session_state.is_analyzing = True
-                            
-                            # 3. 화면 갱신
-                            st.rerun()
-                    
-        # ----------------------------------------------
-        # [중간] 분석 로딩 및 실행 영역
-        # ----------------------------------------------
-        if st.session_state.is_analyzing and st.session_state.selected_product is not None:
-            st.divider()
-            target_name = st.session_state.analyzing_product_name
-            model_name = st.session_state.current_model # 저장된 모델명 사용
-            
-            error_placeholder = st.empty()
-            
-            # 스피너 문구에도 모델명 표시
-            with st.spinner(f"🤖 AI({model_name})가 '{target_name}' 상품을 정밀 분석 중입니다..."):
-                try:
-                    row = st.session_state.selected_product
-
-                    # [핵심] UI에서 입력된 최신 값을 세션 상태에서 직접 가져옵니다.
-                    # 만약 입력창이 비어있을 경우를 대비해 get()과 기본값을 사용합니다.
-                    current_final_prompt = st.session_state.get("system_prompt_input", DEFAULT_SYSTEM_PROMPT)
-                    
-                    # 선택된 모델로 분석 실행
-                    # 주의: analyze_product_with_full_context 함수 내부에서
-                    # gemini-2.5-flash 모델명을 처리할 수 있어야 합니다.
-                    result, used_images, ai_chunks, clean_desc = analyze_product_with_full_context(
-                        row, 
-                        model_name=model_name,
-                        use_images = use_image_analysis,
-                        system_prompt=current_final_prompt
-                    )
-                    # 결과 출력 및 확인을 위해 UI에 표시 (선택 사항)
-                    st.write("사용된 프롬프트 확인용:", current_final_prompt[:50] + "...")
-                    st.session_state.ai_result = result
-
-                    # ★ [추가] 사용된 이미지 리스트도 세션에 저장
-                    st.session_state.analyzed_images = used_images
-
-                    # ★ 크롭된 이미지 조각들 저장
-                    st.session_state.ai_chunks = ai_chunks  
-
-                    # ★ 상세설명 html에서 추출해낸 텍스트
-                    st.session_state.clean_desc = clean_desc  
-                    
-                except Exception as e:
-                    st.session_state.ai_result = None
-                    error_placeholder.error(f"❌ 분석 중 오류가 발생했습니다: {e}")
-                finally:
-                    # 분석 상태 종료
-                    st.session_state.is_analyzing = False
-                    
-                    # ★ [핵심 수정] 
-                    # 결과가 있을 때만(성공 시) 재실행하여 결과를 보여줌.
-                    # 실패 시에는 재실행하지 않아서 에러 메시지가 화면에 유지됨.
-                    if st.session_state.ai_result is not None:
-                        st.rerun()
+    if not search_results:
+        return
+
+    st.divider()
+    st.subheader(f"2. 검색 결과 ({len(search_results)}건)")
+
+    # 결과가 많으면 페이지 단위로만 그림
+    page_count = (len(search_results) + GRID_PAGE_SIZE - 1) // GRID_PAGE_SIZE
+    page = 1
+    if page_count > 1:
+        page = st.number_input("페이지", min_value=1, max_value=page_count, step=1, key="grid_page")
+    page_items = search_results[(page - 1) * GRID_PAGE_SIZE:page * GRID_PAGE_SIZE]
+
+    # 보이는 상품을 클릭 전에 미리 준비 (페이지가 바뀌면 이전 페이지의 대기 작업은 취소)
+    if settings["prefetch"]:
+        _get_prefetcher().prefetch(page_items, settings["model_name"], use_images=settings["use_images"],
+                                   detail_images=settings["detail_images"])
+    else:
+        _get_prefetcher().cancel()
+
+    for i in range(0, len(page_items), GRID_COLS_PER_ROW):
+        cols = st.columns(GRID_COLS_PER_ROW)
+        for col, item in zip(cols, page_items[i:i + GRID_COLS_PER_ROW]):
+            with col:
+                st.markdown(
+                    render_card_html(item['prdNo'], item['img_url'], item['brand'], item['name']),
+                    unsafe_allow_html=True
+                )
+                st.button(
+                    "✨ 분석", key=f"btn_analyze_{item['prdNo']}", type="secondary", width="stretch",
+                    on_click=_request_analysis, args=(item, settings["model_name"])
+                )
+
+    render_analysis_panel(settings)
+
+def _run_analysis(item, settings):
+    """예약된 상품 1건 조회 + 분석 (결과는 세션에 저장)"""
+    st.divider()
+    model_name = st.session_state.current_model # 저장된 모델명 사용
+
+    # 스피너 문구에도 모델명 표시
+    with st.spinner(f"🤖 AI({model_name})가 '{item['name']}' 상품을 정밀 분석 중입니다..."):
+        try:
+            # 1. 데이터 준비 (미리 준비된 결과 → 검색 결과 fast path → 상세 API 순)
+            prefetched = _get_prefetcher().take(item['prdNo'], model_name, use_images=settings["use_images"],
+                                                detail_images=settings["detail_images"])
+            if prefetched is not None:
+                row = prefetched.product_df
+            elif item.get('raw_data'):
+                row = getProductInfoFromEs(item['raw_data'])
+            else:
+                row = getProductInfo(item['prdNo'])
+            st.session_state.ai_result = None
+            if row is None or isinstance(row, str) or row.empty:
+                st.error(f"❌ 상품정보를 가져오지 못했습니다: {item['prdNo']}")
+                return
+            st.session_state.selected_product = row
+
+            # [핵심] UI에서 입력된 최신 값을 세션 상태에서 직접 가져옵니다.
+            current_final_prompt = st.session_state.get("system_prompt_input", DEFAULT_SYSTEM_PROMPT)
+
+            # 선택된 모델로 분석 실행
+            analyze_kwargs = dict(
+                model_name=model_name,
+                use_images=settings["use_images"],
+                system_prompt=current_final_prompt,
+                hedge=settings["hedge"],
+                use_rules=settings["use_rules"],
+                dedup_index=get_default_index() if settings["use_dedup"] else None,
+                regenerate_description=settings["regenerate_description"],
+                compact_output=settings["compact_output"],
+                route_category=settings["route_category"],
+                require_description=not settings["defer_description"],
+                prefetched=prefetched,
+                detail_images=settings["detail_images"]
+            )
+
+            # ★ [추가] 프로파일링이 예약된 경우 이번 분석 1건만 cProfile + tracemalloc 으로 실행
+            # (이전 분석의 프로파일 결과는 새 분석마다 지움, 결과에는 분석한 상품번호를 함께 보관)
+            st.session_state.profile_report = None
+            if st.session_state.get("profile_next_analysis"):
+                st.session_state.profile_next_analysis = False
+                (result, used_images, ai_chunks, clean_desc), profile_report = profile_call(
+                    analyze_product_with_full_context, row, **analyze_kwargs
+                )
+                st.session_state.profile_report = {**profile_report, "prdNo": row.iloc[0]['prdNo']}
+            else:
+                result, used_images, ai_chunks, clean_desc = analyze_product_with_full_context(row, **analyze_kwargs)
+            st.session_state.ai_result = result
+
+            # ★ [수정] 이미지/상세설명 원본은 공용 Blob 저장소에 두고 세션에는 참조 키만 보관
+            # (used_images 는 ai_chunks 와 같은 조각의 중복이므로 저장하지 않음)
+            blob_store = get_blob_store()
+
+            # ★ 크롭된 이미지 조각들 저장
+            st.session_state.ai_chunk_refs = [blob_store.put_data_uri(chunk) for chunk in ai_chunks if isinstance(chunk, str)]
+
+            # ★ 상세설명 html에서 추출해낸 텍스트
+            st.session_state.clean_desc_ref = blob_store.put_text(clean_desc) if clean_desc else None
+
+            # ★ [추가] 2단계 분석: 속성 결과를 근거로 설명 생성을 백그라운드 큐에 예약
+            # (key = 세션 + 상품 + 모델/프롬프트/속성 → 다른 세션/조건의 분석과 섞이지 않음)
+            if st.session_state.get("description_key"):
+                get_description_queue().forget(st.session_state.description_key) # 이전 분석의 설명은 더 이상 필요 없음
+            st.session_state.description_key = None
+            if settings["defer_description"] and result is not None and not result.description:
+                st.session_state.description_key = description_key(
+                    str(row.iloc[0]['prdNo']), result, model_name, current_final_prompt, scope=_session_uid()
+                )
+                get_description_queue().submit(
+                    st.session_state.description_key, row, result,
+                    model_name=model_name, image_list=ai_chunks, system_prompt=current_final_prompt
+                )
+
+        except Exception as e:
+            # 결과 대신 오류 메시지를 그대로 남겨 둠 (별도 재실행 없음)
+            st.session_state.ai_result = None
+            st.error(f"❌ 분석 중 오류가 발생했습니다: {e}")
+
+@st.fragment
+def render_analysis_panel(settings):
+    # ----------------------------------------------
+    # [중간] 분석 실행 영역 (✨ 분석 버튼 콜백으로 예약된 상품)
+    # ----------------------------------------------
+    pending = st.session_state.get("pending_analysis")
+    if pending is not None:
+        st.session_state.pending_analysis = None
+        # 화면 클릭은 interactive: 같은 프로세스의 백필/배치보다 먼저 제공사 슬롯 배정
+        with scheduler.priority("interactive"):
+            _run_analysis(pending, settings)
 
     # ----------------------------------------------
     # Step 3: 상세 정보 및 분석 결과
@@ -328,6 +539,12 @@ def main():
                     st.json(json_res) 
                     st.caption("AI가 프롬프트 지침에 따라 생성한 최종 구조화 데이터입니다.")
 
+                # 규칙/AI 등 필드별 출처와 신뢰도
+                provenance = getattr(st.session_state.ai_result, "_provenance", None)
+                if provenance:
+                    with st.expander("📐 필드별 출처 (규칙 / AI)"):
+                        st.json(provenance)
+
 
             # ★ [추가] 4. 분석에 사용된 이미지 갤러리
             # if "analyzed_images" in st.session_state and st.session_state.analyzed_images:
@@ -353,27 +570,47 @@ def main():
 
             # 5. 실제 AI가 분석한 이미지 
             # ai_chunks가 있으면(이미지 분석 옵션을 켰으면) 이걸 우선 보여줍니다.
-            if "ai_chunks" in st.session_state and st.session_state.ai_chunks:
-                with st.expander(f"🧩 실제 AI가 본 이미지 ({len(st.session_state.ai_chunks)}장)"):
+            if st.session_state.get("ai_chunk_refs"):
+                with st.expander(f"🧩 실제 AI가 본 이미지 ({len(st.session_state.ai_chunk_refs)}장)"):
                     st.info("💡 긴 상세페이지는 AI가 인식하기 좋게 자동으로 잘라서(Chunking) 전송됩니다.")
                     
-                    # 3열 그리드로 예쁘게 출력
+                    # 3열 그리드로 예쁘게 출력 (Blob 저장소의 바이트로 렌더링)
+                    blob_store = get_blob_store()
                     cols = st.columns(3)
-                    for idx, b64_img in enumerate(st.session_state.ai_chunks):
+                    for idx, ref in enumerate(st.session_state.ai_chunk_refs):
                         with cols[idx % 3]:
-                            # 리스트인지 확인하여 방어 코드 추가
-                            if isinstance(b64_img, list):
-                                # 만약 리스트라면 첫 번째 것만 가져오거나 무시
-                                if b64_img: b64_img = b64_img[0]
-                                else: continue
+                            img_bytes = blob_store.get(ref)
+                            if img_bytes is None:
+                                # 메모리 상한으로 정리된 경우
+                                st.caption(f"image #{idx+1} (만료됨 - 다시 분석하면 표시됩니다)")
+                                continue
                             
-                            st.image(b64_img, caption=f"image #{idx+1}", width="content")
+                            st.image(img_bytes, caption=f"image #{idx+1}", width="content")
 
             
+            # ★ [추가] 프로파일링 결과 (예약된 분석이 있었던 경우)
+            profile_report = st.session_state.get("profile_report")
+            if profile_report:
+                with st.expander(f"🔬 프로파일링 결과 (cProfile + tracemalloc) — {profile_report['prdNo']}"):
+                    m1, m2 = st.columns(2)
+                    m1.metric("실행 시간", f"{profile_report['wall_seconds']:.2f}s")
+                    m2.metric("최대 메모리", f"{profile_report['peak_memory_bytes'] / 1024 / 1024:.1f}MB")
+                    st.markdown("**누적 시간 상위 함수**")
+                    st.code(profile_report["top_functions"])
+                    st.markdown("**상위 메모리 할당 위치**")
+                    st.dataframe(profile_report["top_allocations"], width="stretch")
+                    st.download_button(
+                        "📥 .prof 파일 다운로드",
+                        data=profile_report["prof_bytes"],
+                        file_name=f"analysis_{profile_report['prdNo']}.prof",
+                        mime="application/octet-stream"
+                    )
+
             # 6. 상세설명 HTML에서 뽑아낸 텍스트
-            if "clean_desc" in st.session_state and st.session_state.clean_desc:
+            if st.session_state.get("clean_desc_ref"):
+                clean_desc_text = get_blob_store().get_text(st.session_state.clean_desc_ref)
                 with st.expander(f"🧩 상세설명 HTML에서 뽑아낸 텍스트"):
-                    st.code(st.session_state.clean_desc)
+                    st.code(clean_desc_text if clean_desc_text is not None else "(만료됨 - 다시 분석하면 표시됩니다)")
             
             
         
@@ -418,8 +655,31 @@ def main():
                     st.error("결과 표시 중 오류가 발생했습니다.")
             
             with tab2:
-                st.info(f"{used_model} 모델이 작성한 상품 소개 문구입니다.")
-                st.markdown(f"> {res.description}")
+                # 2단계 분석: 설명이 아직 없으면 백그라운드 생성 결과 확인 / 즉시 생성
+                pending_key = st.session_state.get("description_key")
+                description_queue = get_description_queue()
+                if not res.description and pending_key and description_queue.status(pending_key) is not None:
+                    done = description_queue.result(pending_key)
+                    if done is None:
+                        status = description_queue.status(pending_key)
+                        if status == "error":
+                            st.warning("✍️ 설명 생성에 실패했습니다. '지금 바로 생성'으로 다시 시도할 수 있습니다.")
+                        else:
+                            st.info(f"✍️ 설명을 백그라운드에서 생성하고 있습니다. (상태: {status})")
+                        c_now, c_refresh = st.columns(2)
+                        if c_now.button("✍️ 지금 바로 생성"):
+                            with st.spinner("설명 생성 중..."), scheduler.priority("interactive"):
+                                done = description_queue.result_now(pending_key)
+                        if c_refresh.button("🔄 새로고침"):
+                            st.rerun(scope="fragment")
+                    if done is not None:
+                        st.session_state.ai_result = res = done
+                        st.session_state.description_key = None
+                        description_queue.forget(pending_key)
+
+                if res.description:
+                    st.info(f"{used_model} 모델이 작성한 상품 소개 문구입니다.")
+                    st.markdown(f"> {res.description}")
         else:
             # 아직 분석 결과가 없을 때
             st.info("분석된 결과가 없습니다. 다시 시도해주세요.")
@@ -0,0 +1,278 @@
+import argparse
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from ai.hedge import HedgePolicy
+from ai.model import CASCADE_MODEL_NAME, get_escalation_rates
+from util.dedup import DuplicateIndex
+from util.export import export_jsonl_to_parquet
+from util import metrics, rendition, scheduler
+from util.image_pool import configure_image_pipeline, shutdown_image_pipeline
+from util.profiler import profile_call, format_report_summary
+from util.work_queue import open_work_queue, run_worker
+from util.category_route import precompile_routes
+from util.ledger import RUN_ID as LEDGER_RUN_ID, get_ledger
+from util.cassette import REPLAY_LATENCIES, configure_cassette
+from prompts.product import DEFAULT_SYSTEM_PROMPT
+from schema.product import ProductSchema
+from util.product import getProductInfo, analyze_product_with_full_context, analyze_products_packed, generate_description
+
+# ==========================================
+# 대량(배치) 상품 분석 스크립트
+# 사용 예)
+#   python batch.py --input prd_nos.txt --output results.jsonl --no-images --pack-size 5
+#   python batch.py --prd-nos 123456 234567 --model gpt-4o-mini
+#   python batch.py --queue sqlite:///backfill.db --input all_prd_nos.txt --enqueue-only
+#   python batch.py --queue sqlite:///backfill.db --output results.jsonl   # 워커 (여러 프로세스 동시 실행 가능)
+# ==========================================
+def parse_args():
+    parser = argparse.ArgumentParser(description="상품번호 목록을 일괄 분석하여 JSONL로 저장합니다.")
+    parser.add_argument("--input", help="상품번호가 한 줄에 하나씩 들어있는 파일")
+    parser.add_argument("--prd-nos", nargs="*", default=[], help="분석할 상품번호 목록")
+    parser.add_argument("--output", default="results.jsonl", help="결과 저장 경로 (JSONL)")
+    parser.add_argument("--model", default="gemini-2.5-flash-lite", help=f"사용할 AI 모델 ('{CASCADE_MODEL_NAME}' 이면 저비용→고성능 캐스케이드)")
+    parser.add_argument("--no-images", action="store_true", help="이미지 없이 텍스트만 분석 (packed 모드 사용)")
+    parser.add_argument("--pack-size", type=int, default=5, help="텍스트 전용 모드에서 한 번에 묶어 보낼 상품 수 (1이면 묶지 않음)")
+    parser.add_argument("--workers", type=int, default=4, help="동시 실행 스레드 수")
+    parser.add_argument("--image-processes", type=int, default=None, help="이미지 변환 프로세스 수 (기본: CPU 코어 수, 0이면 순차 처리)")
+    parser.add_argument("--no-cdn-rendition", action="store_true", help="CDN 렌디션 협상 끄기 (기존 330x440 + 로컬 재인코딩, 전후 비교용)")
+    parser.add_argument("--parquet-dir", default=None, help="지정 시 결과를 run_date/ai_category_L 파티션 Parquet 으로도 내보내기 (pyarrow 필요)")
+    parser.add_argument("--profile-dir", default=None, help="지정 시 상품별 분석을 cProfile + tracemalloc 으로 실행해 <prdNo>.prof / .txt 저장 (프로파일링은 한 번에 1건씩 실행, 메모리 수치는 --workers 1 권장)")
+    parser.add_argument("--rules", action="store_true", help="규칙 기반 사전 추출 후 미확정 필드만 AI에 요청 (단건 분석 모드)")
+    parser.add_argument("--attributes-only", action="store_true", help="description 없이 속성만 요청 (--rules 와 함께 쓰면 규칙으로 모두 확정된 상품은 AI 호출 생략)")
+    parser.add_argument("--describe-later", default=None, metavar="PATH", help="2단계 분석: 속성만 먼저 --output 에 저장한 뒤, 속성 결과를 근거로 description 을 생성해 PATH(JSONL)에 저장")
+    parser.add_argument("--description-workers", type=int, default=2, help="--describe-later 설명 생성 동시 실행 수 (속성 분석보다 낮게)")
+    parser.add_argument("--compact-output", action="store_true", help="분류형 필드를 짧은 코드로 받아 라벨로 복원 (출력 토큰 절감, 단건 분석 모드; ai_style 은 허용 목록 안에서만 선택, 목록 밖 패턴은 자유 입력으로 보존)")
+    parser.add_argument("--detail-images", action="store_true", help="상세설명 HTML 이미지도 분석에 사용 (헤더만 받아 작은/초대형/배너 이미지 제외 후 정보량 순 상위만, 단건 분석 모드)")
+    parser.add_argument("--route-category", action="store_true", help="전시카테고리별 프롬프트/스키마 사용 (해당 없는 기장 항목 제외, 단건 분석 모드)")
+    parser.add_argument("--dedup-index", default=None, help="유사 상품 인덱스 경로 (지정 시 유사 상품은 기존 결과 재사용, 실행 후 인덱스 저장)")
+    parser.add_argument("--regenerate-description", action="store_true", help="유사 상품 재사용 시 description 만 새로 생성")
+    parser.add_argument("--hedge-percentile", type=float, default=None, help="지정 시 헤징 사용: 최근 지연시간 p{값} 초과 시 중복 요청 (예: 90)")
+    parser.add_argument("--hedge-model", default=None, help="헤지 요청을 보낼 대체 모델 (기본: 같은 모델)")
+    parser.add_argument("--hedge-budget", type=float, default=0.1, help="헤지 요청 비율 상한 (기본 0.1 = 10%%)")
+    parser.add_argument("--priority", choices=scheduler.PRIORITIES, default="bulk", help="스케줄러 우선순위 (같은 프로세스의 다른 작업과 제공사 동시 호출 한도를 나눠 쓸 때)")
+    parser.add_argument("--queue", default=None, help="내구성 작업 큐 (예: sqlite:///backfill.db). 입력 상품번호를 큐에 넣고 큐에서 꺼내 처리, 중단 후 재실행 시 이어서 처리")
+    parser.add_argument("--enqueue-only", action="store_true", help="큐에 작업만 추가하고 종료 (워커는 별도 프로세스/서버에서 실행)")
+    parser.add_argument("--requeue", choices=["leased", "dead"], default=None, help="점유 중(모든 워커 종료 확인 후) 또는 dead-letter 작업을 다시 대기 상태로")
+    parser.add_argument("--lease-size", type=int, default=20, help="워커가 한 번에 점유하는 작업 수")
+    parser.add_argument("--lease-seconds", type=int, default=300, help="작업 리스 시간(초), 하트비트로 자동 연장")
+    parser.add_argument("--max-attempts", type=int, default=3, help="작업별 최대 시도 횟수 (초과 시 dead-letter)")
+    parser.add_argument("--cassette", choices=["record", "replay"], default=None, help="외부 I/O(상품/검색 API, 이미지, LLM) 기록/재생 (기본: CASSETTE_MODE 환경변수)")
+    parser.add_argument("--cassette-path", default=None, help="cassette 파일 경로 (기본: CASSETTE_PATH 또는 .cache/cassette.db)")
+    parser.add_argument("--replay-latency", choices=REPLAY_LATENCIES, default=None, help="재생 시 지연시간: original(기록 당시) | zero")
+    return parser.parse_args()
+
+def load_prd_nos(args):
+    prd_nos = list(args.prd_nos)
+    if args.input:
+        with open(args.input, encoding="utf-8") as f:
+            prd_nos.extend(line.strip() for line in f if line.strip())
+    # 순서를 유지한 채 중복 제거
+    return list(dict.fromkeys(prd_nos))
+
+def run_batch(prd_nos, model_name, use_images, pack_size, workers, hedge=None, use_rules=False, require_description=True,
+              dedup_index=None, regenerate_description=False, profile_dir=None, compact_output=False, route_category=False,
+              detail_images=False):
+    """
+    상품정보 조회 → AI 분석을 일괄 수행합니다.
+    Return: {prdNo(str): ProductSchema 또는 None}
+    """
+    # 1. 상품 상세 조회 (네트워크 대기 위주라 스레드로 병렬 처리)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        fetched = list(pool.map(scheduler.bind(getProductInfo), prd_nos))
+
+    results = {}
+    product_rows = []
+    for prd_no, product_df in zip(prd_nos, fetched):
+        if product_df is None or isinstance(product_df, str) or product_df.empty:
+            print(f"❌ 상품정보 조회 실패 (건너뜀): {prd_no}")
+            results[str(prd_no)] = None
+        else:
+            product_rows.append(product_df)
+
+    # 2-A. 텍스트 전용: 여러 상품을 한 번의 호출로 묶어서 분석 (규칙 사전 추출은 단건 모드에서만 적용)
+    if not use_images and pack_size > 1 and not use_rules and require_description and dedup_index is None \
+            and profile_dir is None and not compact_output and not route_category:
+        chunks = [product_rows[i::workers] for i in range(workers)]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for packed in pool.map(
+                scheduler.bind(lambda rows: analyze_products_packed(rows, model_name=model_name, system_prompt=DEFAULT_SYSTEM_PROMPT, pack_size=pack_size, hedge=hedge)),
+                [c for c in chunks if c]
+            ):
+                results.update(packed)
+        return results
+
+    # 2-B. 상품별 단건 분석
+    def _analyze_one(product_df):
+        prd_no = str(product_df.iloc[0].get('prdNo'))
+        analyze_kwargs = dict(
+            model_name=model_name, use_images=use_images, system_prompt=DEFAULT_SYSTEM_PROMPT, hedge=hedge,
+            use_rules=use_rules, require_description=require_description,
+            dedup_index=dedup_index, regenerate_description=regenerate_description,
+            compact_output=compact_output, route_category=route_category, detail_images=detail_images
+        )
+        if profile_dir is None:
+            result, _, _, _ = analyze_product_with_full_context(product_df, **analyze_kwargs)
+            return prd_no, result
+
+        # 프로파일링: 상품별 .prof (pstats/snakeviz 용) + 요약 텍스트 저장
+        (result, _, _, _), report = profile_call(analyze_product_with_full_context, product_df, **analyze_kwargs)
+        with open(os.path.join(profile_dir, f"{prd_no}.prof"), "wb") as f:
+            f.write(report["prof_bytes"])
+        with open(os.path.join(profile_dir, f"{prd_no}.txt"), "w", encoding="utf-8") as f:
+            f.write(format_report_summary(report))
+        return prd_no, result
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for prd_no, result in pool.map(scheduler.bind(_analyze_one), product_rows):
+            results[prd_no] = result
+    return results
+
+def describe_later(records, path, model_name, workers):
+    """
+    2단계 분석의 2단계: 속성 결과(records)를 근거로 description 만 생성해 JSONL 로 저장
+    (상품 상세는 다시 조회하지만 util.transport 조건부 요청 캐시로 대부분 304)
+    Return: 생성 성공 건수
+    """
+    def _describe(record):
+        prd_no, attributes = record
+        product_df = getProductInfo(prd_no)
+        if product_df is None or isinstance(product_df, str) or product_df.empty:
+            return prd_no, None
+        result = generate_description(product_df, ProductSchema.model_validate(attributes), model_name=model_name)
+        return prd_no, result.description if result is not None else None
+
+    described = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool, open(path, "w", encoding="utf-8") as f:
+        for prd_no, description in pool.map(scheduler.bind(_describe), [r for r in records if r[1] is not None]):
+            described += description is not None
+            f.write(json.dumps({"prdNo": prd_no, "description": description}, ensure_ascii=False) + "\n")
+    return described
+
+def main():
+    args = parse_args()
+    prd_nos = load_prd_nos(args)
+
+    work_queue = None
+    if args.queue:
+        work_queue = open_work_queue(args.queue)
+        if prd_nos:
+            print(f"📥 작업 큐 추가: {work_queue.enqueue(prd_nos)}/{len(prd_nos)}건 (나머지는 이미 등록됨)")
+        if args.requeue:
+            print(f"♻️ {args.requeue} → pending: {work_queue.requeue(args.requeue)}건")
+        if args.enqueue_only:
+            print(f"📋 작업 큐 상태: {work_queue.counts()}")
+            return
+    elif not prd_nos:
+        print("분석할 상품번호가 없습니다.")
+        return
+
+    hedge = None
+    if args.hedge_percentile is not None:
+        hedge = HedgePolicy(percentile=args.hedge_percentile, fallback_model=args.hedge_model, budget_ratio=args.hedge_budget)
+
+    dedup_index = DuplicateIndex(path=args.dedup_index, autosave=False) if args.dedup_index else None
+    if args.profile_dir:
+        os.makedirs(args.profile_dir, exist_ok=True)
+
+    if args.route_category:
+        precompile_routes()
+
+    if args.no_cdn_rendition:
+        rendition.USE_CDN_RENDITIONS = False
+    if args.cassette:
+        configure_cassette(args.cassette, args.cassette_path, args.replay_latency)
+
+    # 이미지 분석 시: 다운로드(스레드) → 변환(프로세스) 파이프라인 사용
+    if not args.no_images:
+        configure_image_pipeline(processes=args.image_processes)
+
+    def _run(batch_prd_nos):
+        with scheduler.priority(args.priority):
+            return run_batch(
+                batch_prd_nos, args.model, not args.no_images, args.pack_size, args.workers, hedge=hedge,
+                use_rules=args.rules, require_description=not (args.attributes_only or args.describe_later),
+                dedup_index=dedup_index, regenerate_description=args.regenerate_description,
+                profile_dir=args.profile_dir, compact_output=args.compact_output, route_category=args.route_category,
+                detail_images=args.detail_images
+            )
+
+    try:
+        if work_queue is None:
+            records = [(prd_no, r.model_dump() if r is not None else None) for prd_no, r in _run(prd_nos).items()]
+        else:
+            # 큐에서 lease-size 개씩 점유 → 분석 → 완료/실패 기록 (큐가 빌 때까지)
+            summary = run_worker(
+                work_queue,
+                lambda batch_prd_nos: {p: r.model_dump() if r is not None else None for p, r in _run(batch_prd_nos).items()},
+                batch_size=args.lease_size, lease_seconds=args.lease_seconds, max_attempts=args.max_attempts
+            )
+            print(f"🧵 이번 워커 처리: 완료 {summary['done']}건, 실패 {summary['failed']}건")
+            # 출력은 이번 실행분이 아니라 큐 전체의 완료 결과 (여러 워커/재실행 누적)
+            records = list(work_queue.iter_results())
+    finally:
+        shutdown_image_pipeline()
+
+    if dedup_index is not None:
+        dedup_index.save()
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        for prd_no, result in records:
+            f.write(json.dumps({"prdNo": prd_no, "result": result}, ensure_ascii=False) + "\n")
+
+    success = sum(1 for _, r in records if r is not None)
+    print(f"✅ 분석 완료: {success}/{len(records)}건 → {args.output}")
+
+    if args.describe_later:
+        with scheduler.priority(args.priority):
+            described = describe_later(records, args.describe_later, args.model, args.description_workers)
+        print(f"✍️ 설명 생성 완료: {described}/{success}건 → {args.describe_later}")
+    if work_queue is not None:
+        print(f"📋 작업 큐 상태: {work_queue.counts()}")
+        for idx, (prd_no, attempts, last_error) in enumerate(work_queue.iter_dead()):
+            if idx >= 20:
+                print("  ... (이하 생략)")
+                break
+            print(f"  ☠️ {prd_no} ({attempts}회 시도): {last_error}")
+
+    if args.parquet_dir:
+        rows = export_jsonl_to_parquet(args.output, args.parquet_dir)
+        print(f"📦 Parquet 내보내기: {rows}건 → {args.parquet_dir}")
+
+    # 상품당 이미지 다운로드 바이트 / 변환 CPU 시간 (렌디션 협상 전후 비교용)
+    timings = metrics.snapshot()["timings"]
+    for mode in ("rendition", "legacy"):
+        bytes_stat = timings.get(f"image_bytes_per_product{{mode={mode}}}")
+        cpu_stat = timings.get(f"image_cpu_per_product{{mode={mode}}}")
+        if bytes_stat and cpu_stat:
+            print(f"  🖼️ [{mode}] 상품당 이미지 {bytes_stat['avg'] / 1024:.0f}KB, 변환 CPU {cpu_stat['avg'] * 1000:.0f}ms (n={bytes_stat['count']})")
+
+    # 스키마별 입력/출력 토큰 / 호출 지연시간 (압축 코드 출력, 카테고리 라우팅 전후 비교용)
+    for key, stat in sorted(timings.items()):
+        if key.startswith("ai_output_tokens{"):
+            latency = timings.get(key.replace("ai_output_tokens", "ai_schema_latency"))
+            latency_text = f", 지연 p50 {latency['p50']:.1f}s / p95 {latency['p95']:.1f}s" if latency else ""
+            input_stat = timings.get(key.replace("ai_output_tokens", "ai_input_tokens"))
+            input_text = f"입력 토큰 평균 {input_stat['avg']:.0f}, " if input_stat else ""
+            print(f"  🔤 {key[len('ai_output_tokens'):]}: {input_text}출력 토큰 평균 {stat['avg']:.0f} (n={stat['count']}){latency_text}")
+    route_counts = metrics.get_counters_by_name("category_route")
+    if route_counts:
+        print("  🧭 카테고리 라우팅: " + ", ".join(f"{labels['route']} {int(value)}건" for labels, value in sorted(route_counts, key=lambda x: x[0]["route"])))
+
+    if args.model == CASCADE_MODEL_NAME:
+        for category, entry in sorted(get_escalation_rates().items()):
+            print(f"  ⬆️ {category}: 승격 {int(entry['escalated'])}/{int(entry['requests'])}건 ({entry['rate']:.0%})")
+
+    # 이번 실행의 호출 장부 요약 (모델 / 대분류별, 상세는 Streamlit '호출 장부' 페이지)
+    usage_ledger = get_ledger()
+    if usage_ledger is not None:
+        summary = usage_ledger.summarize(by=("model", "category"), run_id=LEDGER_RUN_ID)
+        if not summary.empty:
+            print(f"📒 호출 장부 (run_id={LEDGER_RUN_ID}): 추정 비용 ${summary['cost_usd'].sum():.4f}")
+            for _, entry in summary.iterrows():
+                print(f"  📒 {entry['model']} / {entry['category']}: {int(entry['calls'])}회 (오류 {int(entry['errors'])}), "
+                      f"입력 {int(entry['input_tokens'])} / 출력 {int(entry['output_tokens'])} / 캐시 {int(entry['cached_tokens'])} 토큰, "
+                      f"지연 p95 {entry['latency_p95']:.1f}s, ${entry['cost_usd']:.4f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+import argparse
+import random
+import resource
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from ai.hedge import LATENCY_METRIC
+from util import metrics
+from util.image_pool import configure_image_pipeline, shutdown_image_pipeline
+from util.stub_server import STUB_ROUTES, LatencyProfile, StubServer, default_profiles, install_stub_endpoints
+from prompts.product import DEFAULT_SYSTEM_PROMPT
+from util.product import getProductInfo, analyze_product_with_full_context
+
+# ==========================================
+# 부하 테스트 (로컬 스텁 서버 대상)
+# - 목표 동시성(closed loop) 또는 목표 도착률(open loop, 포아송)로 분석 파이프라인 구동
+# - 처리량(상품/분), 단계별 p50/p95/p99, CPU/메모리 사용량 보고
+# 사용 예)
+#   python loadtest.py --concurrency 16 --duration 60
+#   python loadtest.py --rate 2 --duration 120 --openai-latency 800:4000 --openai-error-rate 0.02
+#   python loadtest.py --serve-stubs --port 18080          # 스텁 서버만 띄우기 (별도 프로세스)
+#   python loadtest.py --stub-url http://127.0.0.1:18080   # 이미 떠 있는 스텁 서버 사용
+# ==========================================
+STAGE_METRIC = "loadtest_stage_latency"
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="로컬 스텁 서버를 대상으로 상품 분석 파이프라인 부하 테스트를 수행합니다.")
+    parser.add_argument("--model", default="gemini-2.5-flash-lite", help="사용할 AI 모델")
+    parser.add_argument("--concurrency", type=int, default=8, help="closed loop: 동시에 분석하는 상품 수")
+    parser.add_argument("--rate", type=float, default=None, help="open loop: 초당 도착 상품 수 (지정 시 --concurrency 는 최대 동시 처리 수)")
+    parser.add_argument("--duration", type=float, default=60, help="부하 유지 시간(초)")
+    parser.add_argument("--products", type=int, default=1000, help="순환 사용할 서로 다른 상품번호 수")
+    parser.add_argument("--no-images", action="store_true", help="이미지 없이 텍스트만 분석")
+    parser.add_argument("--image-processes", type=int, default=None, help="이미지 변환 프로세스 수 (기본: CPU 코어 수)")
+    parser.add_argument("--seed", type=int, default=None, help="스텁 지연/오류 난수 시드")
+    parser.add_argument("--stub-url", default=None, help="이미 실행 중인 스텁 서버 주소 (미지정 시 프로세스 내에서 실행)")
+    parser.add_argument("--serve-stubs", action="store_true", help="스텁 서버만 실행 (부하 생성 없음)")
+    parser.add_argument("--port", type=int, default=0, help="--serve-stubs 포트")
+    for route in STUB_ROUTES:
+        parser.add_argument(f"--{route}-latency", default=None, metavar="MEDIAN[:P99]", help=f"{route} 지연시간(ms)")
+        parser.add_argument(f"--{route}-error-rate", type=float, default=0.0, help=f"{route} 503 응답 비율")
+        parser.add_argument(f"--{route}-rate-limit", type=float, default=0.0, help=f"{route} 429 응답 비율")
+    return parser.parse_args()
+
+def build_profiles(args):
+    profiles = {}
+    defaults = default_profiles()
+    for route in STUB_ROUTES:
+        latency = getattr(args, f"{route}_latency")
+        error_rate = getattr(args, f"{route}_error_rate")
+        rate_limit = getattr(args, f"{route}_rate_limit")
+        if latency is None and not error_rate and not rate_limit:
+            continue
+        median_ms, _, p99_ms = (latency or "").partition(":")
+        base = defaults[route]
+        profiles[route] = LatencyProfile(
+            median_ms=float(median_ms) if median_ms else base.median_ms,
+            p99_ms=float(p99_ms) if p99_ms else (None if median_ms else base.p99_ms),
+            error_rate=error_rate,
+            rate_limit_rate=rate_limit,
+        )
+    return profiles
+
+
+# ==========================================
+# 부하 생성
+# ==========================================
+def analyze_one(prd_no, model_name, use_images):
+    """상품 1건 분석 (단계별 지연시간 기록), 성공 여부 반환"""
+    start = time.perf_counter()
+    with metrics.timed(STAGE_METRIC, stage="product_api"):
+        product_df = getProductInfo(prd_no)
+    if product_df is None or isinstance(product_df, str):
+        metrics.incr("loadtest_results", outcome="product_api_error")
+        return False
+
+    with metrics.timed(STAGE_METRIC, stage="analyze"):
+        result, _, _, _ = analyze_product_with_full_context(
+            product_df, model_name=model_name, use_images=use_images, system_prompt=DEFAULT_SYSTEM_PROMPT
+        )
+    metrics.observe(STAGE_METRIC, time.perf_counter() - start, stage="total")
+    metrics.incr("loadtest_results", outcome="ok" if result is not None else "analyze_error")
+    return result is not None
+
+def run_closed_loop(prd_nos, concurrency, duration, **analyze_kwargs):
+    """각 워커가 끝나는 즉시 다음 상품을 시작 (동시성 고정)"""
+    deadline = time.monotonic() + duration
+    counter = iter(range(10 ** 12))
+    counter_lock = threading.Lock()
+
+    def _worker():
+        while time.monotonic() < deadline:
+            with counter_lock:
+                idx = next(counter)
+            analyze_one(prd_nos[idx % len(prd_nos)], **analyze_kwargs)
+
+    threads = [threading.Thread(target=_worker, daemon=True) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+def run_open_loop(prd_nos, rate, max_inflight, duration, **analyze_kwargs):
+    """
+    포아송 도착 (처리 속도와 무관하게 일정 비율로 투입)
+    - 대기열에서 기다린 시간까지 포함한 지연시간을 stage=queued_total 로 기록
+    """
+    def _run(prd_no, arrived_at):
+        metrics.observe(STAGE_METRIC, time.perf_counter() - arrived_at, stage="queue_wait")
+        analyze_one(prd_no, **analyze_kwargs)
+        metrics.observe(STAGE_METRIC, time.perf_counter() - arrived_at, stage="queued_total")
+
+    deadline = time.monotonic() + duration
+    idx = 0
+    with ThreadPoolExecutor(max_workers=max_inflight) as pool:
+        while time.monotonic() < deadline:
+            pool.submit(_run, prd_nos[idx % len(prd_nos)], time.perf_counter())
+            idx += 1
+            time.sleep(random.expovariate(rate))
+
+
+# ==========================================
+# 보고
+# ==========================================
+def _format_row(name, values):
+    if not values:
+        return f"  {name:<40} (표본 없음)"
+    p50, p95, p99 = (metrics.percentile(values, q) for q in (50, 95, 99))
+    return f"  {name:<40} n={len(values):>6}  p50={p50 * 1000:>8.0f}ms  p95={p95 * 1000:>8.0f}ms  p99={p99 * 1000:>8.0f}ms"
+
+def print_report(elapsed, usage_before, usage_after):
+    results = {labels["outcome"]: int(value) for labels, value in metrics.get_counters_by_name("loadtest_results")}
+    completed = results.get("ok", 0)
+    total = sum(results.values())
+
+    print("\n📊 부하 테스트 결과")
+    print(f"  경과 {elapsed:.1f}s, 처리 {total}건 (성공 {completed}건) → {completed / elapsed * 60:.1f} 상품/분")
+    for outcome, count in sorted(results.items()):
+        print(f"  - {outcome}: {count}")
+
+    print("\n⏱️ 단계별 지연시간")
+    for labels, values in sorted(metrics.get_samples_by_name(STAGE_METRIC), key=lambda x: x[0]["stage"]):
+        print(_format_row(labels["stage"], values))
+    for labels, values in metrics.get_samples_by_name("image_stage_latency"):
+        print(_format_row(f"image:{labels['stage']}", values))
+    for labels, values in metrics.get_samples_by_name(LATENCY_METRIC):
+        print(_format_row(f"llm:{labels.get('model', '')}", values))
+    for labels, values in metrics.get_samples_by_name("http_latency"):
+        print(_format_row(f"http:{labels.get('host', '')}", values))
+
+    stub_counts = metrics.get_counters_by_name("stub_requests")
+    if stub_counts:
+        print("\n🧪 스텁 서버 응답")
+        for labels, value in sorted(stub_counts, key=lambda x: (x[0]["route"], str(x[0]["status"]))):
+            print(f"  {labels['route']:<10} {labels['status']}: {int(value)}")
+
+    cpu_seconds = (usage_after.ru_utime - usage_before.ru_utime) + (usage_after.ru_stime - usage_before.ru_stime)
+    print("\n🖥️ 자원 사용량 (부하 생성 프로세스, 이미지 변환 워커 프로세스 제외)")
+    print(f"  CPU {cpu_seconds:.1f}s (평균 {cpu_seconds / elapsed * 100:.0f}% of 1 core)")
+    print(f"  최대 RSS {usage_after.ru_maxrss / 1024:.0f} MB")
+    print(f"  스레드 수 {threading.active_count()}")
+
+
+def main():
+    args = parse_args()
+    profiles = build_profiles(args)
+
+    if args.serve_stubs:
+        stub = StubServer(port=args.port, profiles=profiles, seed=args.seed).start()
+        print(f"🧪 스텁 서버 실행 중: {stub.base_url} (Ctrl+C 로 종료)")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            stub.stop()
+        return
+
+    stub = None
+    if args.stub_url:
+        install_stub_endpoints(args.stub_url)
+    else:
+        stub = StubServer(profiles=profiles, seed=args.seed).start()
+        stub.install()
+
+    configure_image_pipeline(processes=args.image_processes)
+    prd_nos = [str(100000000 + i) for i in range(args.products)]
+    analyze_kwargs = {"model_name": args.model, "use_images": not args.no_images}
+
+    mode = f"open loop {args.rate}/s" if args.rate else f"closed loop x{args.concurrency}"
+    print(f"🚀 부하 테스트 시작: {mode}, {args.duration:.0f}s, 모델 {args.model}")
+    metrics.reset()
+    usage_before = resource.getrusage(resource.RUSAGE_SELF)
+    start = time.perf_counter()
+    try:
+        if args.rate:
+            run_open_loop(prd_nos, args.rate, args.concurrency, args.duration, **analyze_kwargs)
+        else:
+            run_closed_loop(prd_nos, args.concurrency, args.duration, **analyze_kwargs)
+    finally:
+        elapsed = time.perf_counter() - start
+        usage_after = resource.getrusage(resource.RUSAGE_SELF)
+        shutdown_image_pipeline()
+        if stub is not None:
+            stub.stop()
+
+    print_report(elapsed, usage_before, usage_after)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import time
+import pandas as pd
+import streamlit as st
+from util.ledger import LEDGER_PATH, get_ledger
+
+# ==========================================
+# 호출 장부 대시보드 (util.ledger)
+# - 기간/실행(run_id)별 모델·카테고리·프롬프트 버전 단위 토큰, 지연시간, 추정 비용
+# - 토큰을 많이 쓴 상품, 프롬프트 수정 전후 비교
+# ==========================================
+PERIODS = {"최근 24시간": 86400, "최근 7일": 7 * 86400, "최근 30일": 30 * 86400, "전체": None}
+GROUP_COLUMNS = ["model", "category", "prompt_hash", "schema", "provider", "priority", "outcome"]
+
+
+def main():
+    st.set_page_config(page_title="호출 장부", layout="wide")
+    st.title("📒 LLM 호출 장부 (토큰 / 지연시간 / 비용)")
+
+    ledger = get_ledger()
+    if ledger is None:
+        st.info("LEDGER_PATH 가 비어 있어 호출 장부가 꺼져 있습니다.")
+        return
+
+    with st.sidebar:
+        st.caption(f"장부 파일: {LEDGER_PATH}")
+        period = st.selectbox("기간", list(PERIODS), index=1)
+        runs = ledger.runs()
+        run_options = ["전체"] + runs["run_id"].tolist()
+        run_id = st.selectbox("실행(run_id)", run_options, help="배치 1회 실행 = 1개 run_id (프로세스 단위)")
+        group_by = st.multiselect("묶음 기준", GROUP_COLUMNS, default=["model", "category"])
+
+    since = time.time() - PERIODS[period] if PERIODS[period] else None
+    calls = ledger.load(since=since, run_id=None if run_id == "전체" else run_id)
+    if calls.empty:
+        st.info("선택한 조건에 기록된 호출이 없습니다.")
+        return
+
+    # 전체 요약
+    total = ledger.summarize(by=("run_id",), calls=calls.assign(run_id="all")).iloc[0]
+    c1, c2, c3, c4, c5 = st.columns(5)
+    c1.metric("호출 수", f"{int(total['calls']):,}")
+    c2.metric("오류율", f"{total['errors'] / total['calls']:.1%}")
+    c3.metric("입력 / 출력 토큰", f"{int(total['input_tokens']):,} / {int(total['output_tokens']):,}")
+    c4.metric("지연 p95", f"{total['latency_p95']:.1f}s")
+    c5.metric("추정 비용", f"${total['cost_usd']:.2f}")
+
+    st.subheader("그룹별 집계")
+    if group_by:
+        st.dataframe(ledger.summarize(by=tuple(group_by), calls=calls), width="stretch", hide_index=True)
+
+    st.subheader("시간대별 토큰")
+    hourly = calls.assign(hour=pd.to_datetime(calls["ts"], unit="s").dt.floor("h"))
+    hourly = hourly.pivot_table(index="hour", columns="model", values="input_tokens", aggfunc="sum").fillna(0)
+    st.line_chart(hourly)
+
+    st.subheader("토큰을 많이 쓴 상품")
+    st.dataframe(ledger.top_products(limit=30, calls=calls), width="stretch", hide_index=True)
+
+    st.subheader("프롬프트 버전별 비교")
+    history = ledger.prompt_history(since=since)
+    st.dataframe(history, width="stretch", hide_index=True)
+    if not history.empty:
+        selected = st.selectbox("프롬프트 내용 보기", history["prompt_hash"].unique().tolist())
+        st.code(ledger.prompt_text(selected) or "", language="markdown")
+
+    st.subheader("최근 실행")
+    st.dataframe(runs, width="stretch", hide_index=True)
+
+
+main()
@@ -1,4 +1,6 @@
-DEFAULT_SYSTEM_PROMPT ="""
+# 시스템 프롬프트는 공통 본문 + 기장 항목별 지침/분류표로 조립합니다.
+# (카테고리 라우팅: util/category_route.py 가 해당 없는 기장 항목을 빼고 카테고리별로 조립)
+PROMPT_CORE = """
 너는 이커머스 상품 분석 전문가다.
 제공된 정보(이미지가 있다면 이미지 포함, 없다면 텍스트 기반)를 모두 종합하여 분석하라.
 이미지가 없다면 텍스트 기반으로 분석하라.
@@ -42,16 +44,8 @@ DEFAULT_SYSTEM_PROMPT ="""
 - 어떤 사람에게 적합한지
 - 동일한 단어 반복 사용 지양
 
-7. 상의기장(ai_top_length)
--  category 정보가 상의에 속하면 상의 분류를 참고하여 판단, 아니면 null
-
-8. 바지기장(ai_pants_length)
--  category 정보가 바지에 속하면 바지 분류를 참고하여 판단, 아니면 null
-
-9. 치마기장(ai_skirt_length)
--  category 정보가 치마에 속하면 치마 분류를 참고하여 판단, 아니면 null
-
-[스타일]
+"""
+PROMPT_STYLE_PATTERN = """[스타일]
 - 미니멀 : 미니멀, 모던, 심플, 깔끔, 군더더기, 절제, 무지, 원톤, 미니멀룩, 클린
 - 클래식 : 클래식, 포멀, 정장, 오피스룩, 출근룩, 하객룩, 격식, 셋업, 수트, 테일러드, 라펠, 싱글/더블, 블레이저, 슬랙스
 - 캐주얼 : 캐주얼, 데일리룩, 이지룩, 편한, 꾸안꾸, 기본템, 일상
@@ -76,18 +70,59 @@ DEFAULT_SYSTEM_PROMPT ="""
 - 컬러블록/그라데이션 : 컬러블록
 - 타이다이 : 타이다이
 
-[상의]
+"""
+LENGTH_FIELDS = ("ai_top_length", "ai_pants_length", "ai_skirt_length")
+# 기장 항목별 (지침 제목, 지침 내용, 분류표)
+LENGTH_PROMPT_SECTIONS = {
+    "ai_top_length": ("상의기장(ai_top_length)", "-  category 정보가 상의에 속하면 상의 분류를 참고하여 판단, 아니면 null",
+                      """[상의]
 - 레귤러 : 레귤러
 - 숏/크롭 : 숏, 크롭, 탱크답
 - 롱 : 롱기장, 롱티, 롱티셔츠, 롱
-
-[바지]
+"""),
+    "ai_pants_length": ("바지기장(ai_pants_length)", "-  category 정보가 바지에 속하면 바지 분류를 참고하여 판단, 아니면 null",
+                        """[바지]
 - 반바지 : 반바지, 쇼츠, 숏츠, 숏팬츠, 하프팬츠, 핫팬츠, 3부, 5부
 - 7부 : 7부, 칠부
 - 긴바지 : 긴바지, 롱팬츠
-
-[치마]
+"""),
+    "ai_skirt_length": ("치마기장(ai_skirt_length)", "-  category 정보가 치마에 속하면 치마 분류를 참고하여 판단, 아니면 null",
+                        """[치마]
 - 미니 : 미니스커트, 미니치마, 미니, 짧은치마, 숏스커트, 미니기장, 짧은기장, miniskirt
 - 미디 : 미디스커트, 미디치마, 미디, 미디기장, midiskirt
 - 롱 : 롱스커트, 롱기장, 롱, 맥시, 맥시스커트, 맥시기장, longskirt, maxiskrit
-"""
\ No newline at end of file
+"""),
+}
+
+def build_system_prompt(length_fields=LENGTH_FIELDS):
+    """공통 본문 + length_fields 에 해당하는 기장 지침(7번부터 번호 매김)과 분류표만 포함한 시스템 프롬프트"""
+    fields = [name for name in LENGTH_FIELDS if name in length_fields]
+    guides = "".join(
+        f"{7 + i}. {LENGTH_PROMPT_SECTIONS[name][0]}\n{LENGTH_PROMPT_SECTIONS[name][1]}\n\n" for i, name in enumerate(fields)
+    )
+    tables = "\n".join(LENGTH_PROMPT_SECTIONS[name][2] for name in fields)
+    return PROMPT_CORE + guides + PROMPT_STYLE_PATTERN + tables
+
+DEFAULT_SYSTEM_PROMPT = build_system_prompt()
+# 텍스트 전용 packed 모드: 여러 상품을 한 번의 호출로 분석할 때 시스템 프롬프트 뒤에 덧붙이는 지침
+PACKED_PROMPT_SUFFIX = """
+[복수 상품 분석]
+1. 입력에는 여러 상품이 [상품 N] 블록으로 구분되어 제공된다.
+2. 각 블록마다 정확히 하나의 결과를 items 배열에 작성하고, 블록 순서를 그대로 유지한다.
+3. prdNo는 블록에 표시된 상품번호를 그대로 복사한다. 누락하거나 중복하지 않는다.
+4. 한 상품의 정보를 다른 상품의 결과에 섞지 않는다. 위의 모든 규칙은 상품마다 개별 적용한다.
+"""
+# 압축 코드 출력 모드: 분류형 필드를 한글 라벨 대신 스키마에 정의된 코드로 받을 때 덧붙이는 지침
+COMPACT_PROMPT_SUFFIX = """
+[코드 응답]
+1. 성별/계절/스타일/패턴/핏/기장 항목은 한글 라벨 대신 스키마 필드 설명의 범례에 있는 코드로만 답한다.
+2. 분류 기준은 위의 한글 분류 기준을 그대로 따르고, 선택한 라벨에 대응하는 코드를 쓴다.
+3. 패턴이 범례에 없으면 ETC 로 답하고 ai_pattern_etc 에 실제 패턴명을 한글로 적는다. (그 외에는 ai_pattern_etc 는 null)
+4. description 등 나머지 항목은 기존 규칙대로 한글로 작성한다.
+"""
+# 2단계 분석의 1단계(속성 전용): description 없이 속성만 빠르게 받을 때 덧붙이는 지침
+ATTRIBUTES_ONLY_PROMPT_SUFFIX = """
+[속성 전용 응답]
+1. 이번 요청에서는 description 을 작성하지 않는다. 위의 description 작성 규칙(400자 이상 등)은 적용하지 않는다.
+2. 스키마에 있는 속성 항목만 분류 기준에 따라 간결하게 답한다.
+"""
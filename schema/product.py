@@ -1,5 +1,6 @@
-from pydantic import BaseModel, Field
-from typing import List, Optional
+from functools import lru_cache
+from pydantic import BaseModel, Field, PrivateAttr, create_model
+from typing import List, Literal, Optional, get_args, get_origin
 
 # --- 1. 데이터 구조 정의 (Pydantic Schema) ---
 # description 필드의 설명을 강화했습니다.
@@ -24,3 +25,141 @@ class ProductSchema(BaseModel):
     ai_pants_length : Optional[str] = Field(..., description="바지기장")
     ai_skirt_length : Optional[str] = Field(..., description="치마기장")
 
+    # 필드별 출처/신뢰도 (LLM 스키마에는 포함되지 않음)
+    # 예: {"ai_gender": {"source": "rule:category_L", "confidence": 0.9}}
+    _provenance: dict = PrivateAttr(default_factory=dict)
+
+
+
+# --- 2. 복수 상품 묶음 분석용 스키마 (텍스트 전용 packed 모드) ---
+class ProductBatchSchema(BaseModel):
+    items: List[ProductSchema] = Field(..., description="입력된 상품별 분석 결과 목록 (상품번호(prdNo)당 정확히 1개, 입력 순서 유지)")
+
+
+# --- 3. 부분 스키마 (아직 모르는 필드만 LLM에 요청할 때 사용) ---
+PRODUCT_FIELDS = list(ProductSchema.model_fields.keys())
+
+@lru_cache(maxsize=None)
+def build_partial_schema(field_names):
+    """
+    ProductSchema 에서 field_names(tuple) 에 해당하는 필드만 가진 스키마를 만듭니다.
+    필드 설명(description)은 원본 그대로 유지, 같은 조합은 캐시하여 재사용합니다.
+    """
+    ordered = [name for name in PRODUCT_FIELDS if name in field_names]
+    fields = {
+        name: (ProductSchema.model_fields[name].annotation, ProductSchema.model_fields[name])
+        for name in ordered
+    }
+    return create_model("ProductPartialSchema", **fields)
+
+def _empty_value(field_name):
+    annotation = ProductSchema.model_fields[field_name].annotation
+    if type(None) in get_args(annotation):
+        return None
+    if get_origin(annotation) is list:
+        return []
+    return ""
+
+def merge_partial_result(partial, known_values, provenance=None):
+    """
+    부분 스키마 결과 + 이미 확정된 값(known_values) 을 합쳐 ProductSchema 로 만듭니다.
+    어느 쪽에도 없는 필드는 빈 값(Optional 이면 None)으로 채웁니다.
+    """
+    values = {name: _empty_value(name) for name in PRODUCT_FIELDS}
+    values.update(known_values)
+    if partial is not None:
+        values.update(partial.model_dump())
+
+    merged = ProductSchema(**values)
+    merged._provenance = dict(provenance or {})
+    if partial is not None:
+        for name in type(partial).model_fields:
+            merged._provenance.setdefault(name, {"source": "llm", "confidence": None})
+    return merged
+
+
+# --- 4. 압축 코드 출력 스키마 (출력 토큰 절감) ---
+# 분류형 필드는 한글 라벨 대신 짧은 영문 코드(enum)로 받고, 받은 뒤 원래 라벨로 복원합니다.
+# 라벨은 prompts/product.py 분류 기준 및 ai/validate.py 허용값과 동일하게 유지해야 합니다.
+COMPACT_CODES = {
+    "ai_gender": {"M": "남성", "F": "여성", "U": "남녀공용", "K": "키즈"},
+    "ai_season": {"SP": "봄", "SU": "여름", "FA": "가을", "WI": "겨울", "ALL": "사계절"},
+    "ai_style": {
+        "MIN": "미니멀", "CLS": "클래식", "CAS": "캐주얼", "FEM": "페미닌",
+        "ROM": "로맨틱", "SPT": "스포티", "STR": "스트리트", "RES": "휴양지",
+    },
+    "ai_pattern": {
+        "SOL": "무지", "STR": "스트라이프", "CHK": "체크", "FLR": "플로럴", "DOT": "도트",
+        "GRP": "로고/그래픽", "LTR": "레터링", "ANM": "애니멀", "MIL": "밀리터리", "ETH": "보헤미안/에스닉",
+        "GEO": "기하학", "CBL": "컬러블록/그라데이션", "TDY": "타이다이", "ETC": "기타",
+    },
+    "ai_fit": {"SL": "슬림핏", "RG": "레귤러핏", "OV": "오버핏", "LS": "루즈핏"},
+    "ai_top_length": {"RG": "레귤러", "CR": "숏/크롭", "LG": "롱"},
+    "ai_pants_length": {"SH": "반바지", "CR": "7부", "LG": "긴바지"},
+    "ai_skirt_length": {"MI": "미니", "MD": "미디", "LG": "롱"},
+}
+# 목록 밖 값도 잃지 않도록 자유 입력 칸을 함께 두는 필드: {필드: 기타 코드} → '<필드>_etc' 에 실제 값
+# (ai_style 은 ai/validate.py 허용값과 같은 닫힌 목록이므로 자유 입력 없음)
+COMPACT_FREE_TEXT = {"ai_pattern": "ETC"}
+
+_COMPACT_TARGETS = {} # 압축 스키마 클래스 → 원래 필드 목록(tuple)
+
+def _compact_annotation(annotation, code_type):
+    if get_origin(annotation) is list:
+        return List[code_type]
+    if type(None) in get_args(annotation):
+        return Optional[code_type]
+    return code_type
+
+@lru_cache(maxsize=None)
+def build_compact_schema(field_names):
+    """
+    field_names(tuple) 필드를 가진 스키마에서 분류형 필드만 코드 enum(Literal)으로 바꾼 스키마.
+    필드 설명 끝에 '코드=라벨' 범례를 붙여 모델이 코드로만 답하게 합니다.
+    - ai_style 은 코드 목록(= 검증 허용값) 안에서만 선택 → 일반 스키마의 '등' 처럼 목록 밖 스타일은 받지 않음
+    - ai_pattern 은 목록에 없으면 ETC + ai_pattern_etc(자유 입력) → 복원 시 실제 값 사용
+    """
+    fields = {}
+    for name in [name for name in PRODUCT_FIELDS if name in field_names]:
+        info = ProductSchema.model_fields[name]
+        codes = COMPACT_CODES.get(name)
+        if codes is None:
+            fields[name] = (info.annotation, info)
+            continue
+        legend = ", ".join(f"{code}={label}" for code, label in codes.items())
+        annotation = _compact_annotation(info.annotation, Literal[tuple(codes)])
+        fields[name] = (annotation, Field(..., description=f"{info.description} [코드로만 응답: {legend}]"))
+        if name in COMPACT_FREE_TEXT:
+            etc_code = COMPACT_FREE_TEXT[name]
+            fields[f"{name}_etc"] = (Optional[str], Field(..., description=f"{name} 가 {etc_code} 일 때만 실제 값 (짧은 한글), 그 외에는 null"))
+    model = create_model("ProductCompactSchema", **fields)
+    _COMPACT_TARGETS[model] = tuple(field_names)
+    return model
+
+def compact_schema_for(response_schema):
+    """ProductSchema 또는 부분 스키마 → 대응하는 압축 스키마"""
+    return build_compact_schema(tuple(response_schema.model_fields))
+
+def decode_compact_result(result):
+    """
+    압축 스키마 결과의 코드를 한글 라벨로 복원해 원래 스키마(ProductSchema 또는 부분 스키마)로 반환.
+    압축 스키마 결과가 아니면 그대로 반환합니다.
+    """
+    field_names = _COMPACT_TARGETS.get(type(result))
+    if field_names is None:
+        return result
+    target = ProductSchema if set(field_names) == set(PRODUCT_FIELDS) else build_partial_schema(field_names)
+
+    values = result.model_dump()
+    free_text = {name: values.pop(f"{name}_etc", None) for name in COMPACT_FREE_TEXT}
+    for name, codes in COMPACT_CODES.items():
+        value = values.get(name)
+        if isinstance(value, list):
+            values[name] = [codes.get(code, code) for code in value]
+        elif value is not None:
+            values[name] = codes.get(value, value)
+    # 목록 밖 값: 기타 코드 + 자유 입력이 있으면 자유 입력 값으로
+    for name, etc_code in COMPACT_FREE_TEXT.items():
+        if values.get(name) == COMPACT_CODES[name][etc_code] and free_text[name] and free_text[name].strip():
+            values[name] = free_text[name].strip()
+    return target(**values)
@@ -0,0 +1,216 @@
+import argparse
+import json
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+from ai.resilience import get_breaker_states
+from util import metrics, scheduler
+from util.image_pool import configure_image_pipeline, shutdown_image_pipeline
+from util.microbatch import MicroBatcher, QueueFullError
+from util.transport import get_host_stats
+from util.category_route import precompile_routes
+from util.work_queue import open_work_queue, run_worker
+from prompts.product import DEFAULT_SYSTEM_PROMPT
+from util.product import getProductInfo, analyze_product_with_full_context, analyze_products_packed
+
+# ==========================================
+# 로컬 속성 추출 서비스 (HTTP)
+# - POST /extract             : 동기 분석 (timeout 초 안에 끝나지 않으면 504 + job_id)
+# - POST /extract/async       : 비동기 접수 (202 + job_id)
+# - GET  /extract/async/<id>  : 비동기 작업 상태/결과 조회
+# - GET  /health, /metrics    : 상태 / 지표
+# 요청 본문 예) {"prdNo": "123456", "model": "gemini-2.5-flash-lite", "use_images": true, "timeout": 60, "priority": "interactive"}
+# - priority: interactive | near_real_time(기본) | bulk (util.scheduler, 제공사 동시 호출 한도 배분)
+# - --backfill-queue 지정 시 같은 프로세스에서 작업 큐 백필을 bulk 우선순위로 함께 처리
+# 사용 예)
+#   python server.py --port 8000 --queue-size 200 --max-batch 16 --max-wait-ms 50
+#   python server.py --port 8000 --backfill-queue sqlite:///backfill.db --backfill-concurrency 16
+# ==========================================
+DEFAULT_MODEL = "gemini-2.5-flash-lite"
+DEFAULT_SYNC_TIMEOUT = 60
+MAX_SYNC_TIMEOUT = 300
+RETRY_AFTER_SECONDS = 2
+
+_JOB_PATH = re.compile(r"^/extract/async/(?P<job_id>[0-9a-f]+)$")
+
+
+def _analyze(product_df, model_name, use_images, use_rules, require_description, route_category):
+    result, _, _, _ = analyze_product_with_full_context(
+        product_df, model_name=model_name, use_images=use_images, system_prompt=DEFAULT_SYSTEM_PROMPT,
+        use_rules=use_rules, require_description=require_description, route_category=route_category
+    )
+    return result
+
+def _analyze_packed(product_rows, model_name, pack_size):
+    return analyze_products_packed(product_rows, model_name=model_name, system_prompt=DEFAULT_SYSTEM_PROMPT, pack_size=pack_size)
+
+def _parse_bool(body, name, default):
+    """JSON true/false 만 허용 ("false" 같은 문자열이 참으로 바뀌지 않도록)"""
+    value = body.get(name, default)
+    if not isinstance(value, bool):
+        raise ValueError(f"{name} must be a boolean")
+    return value
+
+def parse_extract_request(body):
+    """요청 본문 → (prdNo, 분석 옵션, 동기 대기 시간), 잘못된 요청이면 ValueError"""
+    if not isinstance(body, dict):
+        raise ValueError("request body must be a JSON object")
+    prd_no = body.get("prdNo")
+    if not prd_no or not str(prd_no).strip():
+        raise ValueError("prdNo is required")
+    options = {
+        "model_name": str(body.get("model") or DEFAULT_MODEL),
+        "use_images": _parse_bool(body, "use_images", True),
+        "use_rules": _parse_bool(body, "use_rules", False),
+        "require_description": _parse_bool(body, "require_description", True),
+        "route_category": _parse_bool(body, "route_category", False),
+        "priority": str(body.get("priority") or scheduler.DEFAULT_PRIORITY),
+    }
+    if options["priority"] not in scheduler.PRIORITIES:
+        raise ValueError(f"priority must be one of {', '.join(scheduler.PRIORITIES)}")
+    timeout = min(float(body.get("timeout", DEFAULT_SYNC_TIMEOUT)), MAX_SYNC_TIMEOUT)
+    return str(prd_no).strip(), options, timeout
+
+
+class ExtractHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    # ---------- 라우팅 ----------
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        batcher = self.server.batcher
+        if path == "/health":
+            breakers = get_breaker_states()
+            status = "degraded" if "open" in breakers.values() else "ok"
+            self._send_json(200, {"status": status, "queue": batcher.stats(), "breakers": breakers})
+        elif path == "/metrics":
+            self._send_json(200, {"queue": batcher.stats(), "http": get_host_stats(), "scheduler": scheduler.get_scheduler_stats(),
+                                  **metrics.snapshot()})
+        elif _JOB_PATH.match(path):
+            job = batcher.get_job(_JOB_PATH.match(path).group("job_id"))
+            if job is None:
+                self._send_json(404, {"error": "job not found"})
+            else:
+                self._send_json(200, job.to_dict())
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        path = urlsplit(self.path).path
+        if path not in ("/extract", "/extract/async"):
+            self._send_json(404, {"error": "not found"})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length) or b"{}")
+            prd_no, options, timeout = parse_extract_request(body)
+        except (ValueError, TypeError) as e:
+            self._send_json(400, {"error": str(e)})
+            return
+
+        try:
+            job = self.server.batcher.submit(prd_no, **options)
+        except QueueFullError as e:
+            # 백프레셔: 대기열이 가득 차면 즉시 거절 (호출 측 재시도)
+            self._send_json(429, {"error": str(e)}, headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
+            return
+
+        if path == "/extract/async":
+            self._send_json(202, {"job_id": job.id, "status": job.status, "status_url": f"/extract/async/{job.id}"})
+            return
+
+        if not job.wait(timeout):
+            # 작업은 계속 진행되므로 job_id 로 이어서 조회 가능
+            self._send_json(504, {"error": "timeout", "job_id": job.id, "status_url": f"/extract/async/{job.id}"})
+            return
+        data = job.to_dict()
+        self._send_json(200 if job.status == "done" else 502, data)
+
+    def _send_json(self, status, payload, headers=None):
+        data = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def create_server(host="127.0.0.1", port=8000, **batcher_kwargs):
+    server = ThreadingHTTPServer((host, port), ExtractHandler)
+    server.daemon_threads = True
+    server.batcher = MicroBatcher(getProductInfo, _analyze, packed_fn=_analyze_packed, **batcher_kwargs)
+    return server
+
+def start_backfill(queue_url, concurrency, model_name=DEFAULT_MODEL, lease_size=20):
+    """
+    작업 큐 백필을 백그라운드 스레드에서 bulk 우선순위로 실행 (큐가 비면 종료)
+    서비스 요청과 같은 프로세스에서 돌기 때문에 스케줄러가 제공사 한도를 나눠 줌
+    """
+    work_queue = open_work_queue(queue_url)
+
+    def _process(prd_nos):
+        def _one(prd_no):
+            product_df = getProductInfo(prd_no)
+            if product_df is None or isinstance(product_df, str) or product_df.empty:
+                return prd_no, None
+            result = _analyze(product_df, model_name, True, False, True, False)
+            return prd_no, result.model_dump() if result is not None else None
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            return dict(pool.map(scheduler.bind(_one), prd_nos))
+
+    def _run():
+        with scheduler.priority("bulk"):
+            summary = run_worker(work_queue, _process, batch_size=lease_size)
+        print(f"🧵 백필 종료: 완료 {summary['done']}건, 실패 {summary['failed']}건, 큐 상태 {work_queue.counts()}")
+
+    thread = threading.Thread(target=_run, name="backfill", daemon=True)
+    thread.start()
+    return thread
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="상품 속성 추출 HTTP 서비스를 실행합니다.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--queue-size", type=int, default=200, help="대기열 최대 길이 (초과 시 429)")
+    parser.add_argument("--max-batch", type=int, default=16, help="마이크로 배치 최대 요청 수")
+    parser.add_argument("--max-wait-ms", type=float, default=50, help="배치를 모으는 최대 대기 시간(ms)")
+    parser.add_argument("--workers", type=int, default=8, help="동시에 처리하는 배치 수")
+    parser.add_argument("--pack-size", type=int, default=5, help="텍스트 전용 요청을 한 번에 묶어 보낼 상품 수")
+    parser.add_argument("--image-processes", type=int, default=None, help="이미지 변환 프로세스 수 (기본: CPU 코어 수)")
+    parser.add_argument("--backfill-queue", default=None, help="같은 프로세스에서 bulk 우선순위로 처리할 작업 큐 (예: sqlite:///backfill.db)")
+    parser.add_argument("--backfill-concurrency", type=int, default=16, help="백필 동시 분석 수")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    configure_image_pipeline(processes=args.image_processes)
+    precompile_routes()
+    server = create_server(
+        args.host, args.port, queue_size=args.queue_size, max_batch=args.max_batch,
+        max_wait=args.max_wait_ms / 1000, workers=args.workers, pack_size=args.pack_size
+    )
+    if args.backfill_queue:
+        start_backfill(args.backfill_queue, args.backfill_concurrency)
+        print(f"🧵 백필 시작 (bulk): {args.backfill_queue}")
+    print(f"🚀 추출 서비스 실행 중: http://{args.host}:{args.port} (Ctrl+C 로 종료)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.batcher.shutdown()
+        shutdown_image_pipeline()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import base64
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+# ==========================================
+# 프로세스 공용 콘텐츠 주소 기반(content-addressed) Blob 저장소
+# - 같은 내용은 한 번만 저장 (키 = sha256)
+# - 전체 메모리 상한(max_bytes) 초과 시 가장 오래 안 쓴 항목부터 제거 (LRU)
+# - st.session_state 에는 이미지/긴 텍스트 대신 작은 키(ref)만 보관
+# ==========================================
+BLOB_STORE_MAX_BYTES = int(os.environ.get("BLOB_STORE_MAX_BYTES", 256 * 1024 * 1024))
+
+
+class BlobStore:
+    def __init__(self, max_bytes=BLOB_STORE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._items = OrderedDict() # key -> (mime, bytes)
+        self._lock = threading.Lock()
+
+    def put(self, data, mime="application/octet-stream"):
+        key = hashlib.sha256(data).hexdigest()[:32]
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                return key
+            self._items[key] = (mime, data)
+            self.total_bytes += len(data)
+            self._evict()
+        return key
+
+    def _evict(self):
+        # 방금 넣은 항목(맨 뒤)은 남겨두고 오래된 것부터 제거
+        while self.total_bytes > self.max_bytes and len(self._items) > 1:
+            _, (_, data) = self._items.popitem(last=False)
+            self.total_bytes -= len(data)
+
+    def get(self, key):
+        """Return: bytes (없거나 제거된 경우 None)"""
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            self._items.move_to_end(key)
+            return item[1]
+
+    def get_mime(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            return item[0] if item else None
+
+    def put_text(self, text):
+        return self.put(text.encode("utf-8"), mime="text/plain; charset=utf-8")
+
+    def get_text(self, key):
+        data = self.get(key)
+        return data.decode("utf-8") if data is not None else None
+
+    def put_data_uri(self, data_uri):
+        """ "data:image/jpeg;base64,..." → 디코딩한 바이트로 저장 (base64 대비 약 25% 절약) """
+        header, _, encoded = data_uri.partition("base64,")
+        mime = header[len("data:"):].rstrip(";") or "application/octet-stream"
+        return self.put(base64.b64decode(encoded), mime=mime)
+
+    def get_data_uri(self, key):
+        """저장된 바이트 → "data:<mime>;base64,..." (보낼 때만 만들어 씀), 없거나 제거된 경우 None"""
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            self._items.move_to_end(key)
+            mime, data = item
+        return f"data:{mime};base64,{base64.b64encode(data).decode('utf-8')}"
+
+    def stats(self):
+        with self._lock:
+            return {"items": len(self._items), "bytes": self.total_bytes, "max_bytes": self.max_bytes}
+
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_blob_store():
+    """프로세스 공용 저장소 (모든 Streamlit 세션이 공유)"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = BlobStore()
+        return _store
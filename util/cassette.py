@@ -0,0 +1,163 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from util import metrics
+
+# ==========================================
+# 외부 I/O 기록/재생 (cassette)
+# - record: 상품/검색 JSON, 이미지 바이트, LLM 응답을 요청 단위로 SQLite 파일 1개에 저장 (본문은 zlib 압축)
+# - replay: 네트워크/LLM 호출 없이 저장된 응답을 돌려줌 → 벤치마크/프로파일링/회귀 확인을 오프라인에서 같은 결과로 반복
+#   지연시간은 기록 당시 값(original) 또는 0(zero) 으로 재현
+# - 요청 키: 종류(kind) + 요청 내용(URL/파라미터, 모델/프롬프트/이미지/스키마 필드)의 SHA-256
+# - replay 중 기록에 없는 요청은 CassetteMissError (조용히 실제 호출로 넘어가지 않음)
+# - 설정: CASSETTE_MODE=off|record|replay, CASSETTE_PATH, CASSETTE_LATENCY=original|zero (또는 configure_cassette())
+# ==========================================
+CASSETTE_MODES = ("off", "record", "replay")
+REPLAY_LATENCIES = ("original", "zero")
+CASSETTE_MODE = os.environ.get("CASSETTE_MODE", "off")
+CASSETTE_PATH = os.environ.get("CASSETTE_PATH", ".cache/cassette.db")
+CASSETTE_LATENCY = os.environ.get("CASSETTE_LATENCY", "original")
+COMPRESS_LEVEL = 6
+
+
+class CassetteMissError(Exception):
+    """replay 모드에서 기록되지 않은 요청"""
+
+
+def request_key(kind, request):
+    """요청 내용(JSON 직렬화 가능한 값) → 키"""
+    digest = hashlib.sha256(kind.encode("utf-8"))
+    digest.update(json.dumps(request, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class Cassette:
+    def __init__(self, path, mode="replay", latency="original"):
+        if mode not in CASSETTE_MODES or mode == "off":
+            raise ValueError(f"cassette mode must be record or replay: {mode}")
+        if latency not in REPLAY_LATENCIES:
+            raise ValueError(f"replay latency must be one of {', '.join(REPLAY_LATENCIES)}: {latency}")
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        if mode == "replay" and not os.path.exists(path):
+            raise FileNotFoundError(f"cassette not found: {path}")
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    meta TEXT,
+                    body BLOB,
+                    latency REAL,
+                    recorded_at REAL
+                )
+            """)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _connect(self):
+        # 호출마다 새 연결 (스레드 간 공유하지 않음)
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA busy_timeout=30000")
+        return conn
+
+    def get(self, key):
+        """Return: (meta dict, body bytes, latency 초) 또는 None"""
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT meta, body, latency FROM entries WHERE key = ?", (key,)).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        meta, body, latency = row
+        return json.loads(meta), zlib.decompress(body) if body else b"", latency or 0.0
+
+    def put(self, key, kind, meta, body, latency):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, kind, meta, body, latency, recorded_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, kind, json.dumps(meta, ensure_ascii=False), zlib.compress(body, COMPRESS_LEVEL) if body else b"",
+                     latency, time.time())
+                )
+        finally:
+            conn.close()
+
+    def stats(self):
+        """종류별 기록 수 / 압축 바이트"""
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT kind, COUNT(*), SUM(LENGTH(body)) FROM entries GROUP BY kind").fetchall()
+        finally:
+            conn.close()
+        return {kind: {"entries": count, "bytes": size or 0} for kind, count, size in rows}
+
+    def through(self, kind, request, call, encode, decode):
+        """
+        call() 결과를 기록하거나(record) 기록된 결과를 돌려줌(replay)
+        encode(result) -> (meta dict, body bytes), decode(meta, body) -> result
+        (record 중 예외가 난 호출은 기록하지 않음 → 재시도에 성공한 응답만 남음)
+        """
+        key = request_key(kind, request)
+        if self.mode == "replay":
+            entry = self.get(key)
+            if entry is None:
+                metrics.incr("cassette", kind=kind, outcome="miss")
+                raise CassetteMissError(f"{kind} 요청이 기록에 없습니다 ({key[:12]}): {str(request)[:120]}")
+            meta, body, latency = entry
+            if self.latency == "original" and latency:
+                time.sleep(latency)
+            metrics.incr("cassette", kind=kind, outcome="replay")
+            return decode(meta, body)
+
+        start = time.perf_counter()
+        result = call()
+        latency = time.perf_counter() - start
+        meta, body = encode(result)
+        self.put(key, kind, meta, body, latency)
+        metrics.incr("cassette", kind=kind, outcome="record")
+        return result
+
+
+_cassette = None
+_cassette_configured = False
+_cassette_lock = threading.Lock()
+
+def configure_cassette(mode=None, path=None, latency=None):
+    """
+    기록/재생 모드 설정 (기본값: 환경변수), mode="off" 면 해제
+    벤치마크/테스트 코드에서 프로세스 시작 시 1회 호출
+    """
+    global _cassette, _cassette_configured
+    mode = mode or CASSETTE_MODE
+    with _cassette_lock:
+        _cassette = None if mode == "off" else Cassette(path or CASSETTE_PATH, mode, latency or CASSETTE_LATENCY)
+        _cassette_configured = True
+        if _cassette is not None:
+            print(f"📼 cassette {mode} 모드: {_cassette.path} (재생 지연: {_cassette.latency})")
+        return _cassette
+
+def get_cassette():
+    """현재 cassette (off 면 None, 처음 호출 시 환경변수로 설정)"""
+    if not _cassette_configured:
+        configure_cassette()
+    return _cassette
+
+def through(kind, request, call, encode, decode):
+    """cassette 가 꺼져 있으면 call() 그대로, 켜져 있으면 기록/재생"""
+    cassette = get_cassette()
+    if cassette is None:
+        return call()
+    return cassette.through(kind, request, call, encode, decode)
@@ -0,0 +1,74 @@
+from functools import lru_cache
+from prompts.product import LENGTH_FIELDS, build_system_prompt
+from schema.product import PRODUCT_FIELDS, build_partial_schema
+
+# ==========================================
+# 카테고리 라우팅 (전시카테고리 → 카테고리별 프롬프트/스키마)
+# - getPrdInfoByJson 으로 뽑아 둔 category_S > category_M > category_L 순으로 키워드 검사
+# - 해당 없는 기장 항목(ai_top_length 등)은 프롬프트 지침/분류표와 스키마에서 모두 빼고, 결과에서 null 로 채움
+# - 라우팅 규칙은 아래 테이블(데이터)로만 정의, 어느 규칙에도 맞지 않으면 전체 프롬프트/스키마("all") 사용
+# ==========================================
+DEFAULT_ROUTE = "all"
+
+# (라우트, 키워드, 적용되는 기장 항목) — 위에서부터 순서대로 검사 (먼저 매칭된 라우트 우선)
+# 의류를 먼저 검사: '부츠컷 팬츠', '스카프 블라우스' 처럼 잡화 키워드가 섞인 의류 카테고리 오분류 방지
+CATEGORY_ROUTES = [
+    ("onepiece", ["원피스", "드레스"], ("ai_skirt_length",)),
+    ("skirt", ["스커트", "치마"], ("ai_skirt_length",)),
+    ("pants", ["팬츠", "바지", "슬랙스", "청바지", "레깅스", "조거", "쇼츠", "반바지", "부츠컷"], ("ai_pants_length",)),
+    ("top", ["티셔츠", "셔츠", "블라우스", "니트", "스웨터", "가디건", "맨투맨", "후드", "민소매", "나시", "조끼", "상의",
+             "자켓", "재킷", "코트", "점퍼", "패딩", "바람막이", "아우터", "집업"], ("ai_top_length",)),
+    ("shoes", ["신발", "슈즈", "운동화", "스니커즈", "구두", "로퍼", "샌들", "슬리퍼", "부츠", "골프화", "러닝화"], ()),
+    ("bag", ["가방", "백팩", "크로스백", "토트백", "숄더백", "클러치", "지갑", "파우치"], ()),
+    ("golf_gear", ["골프용품", "골프공", "골프클럽", "캐디백", "드라이버", "퍼터", "아이언", "웨지"], ()),
+    ("acc", ["모자", "비니", "양말", "벨트", "장갑", "스카프", "머플러", "넥타이", "주얼리", "액세서리", "악세서리", "시계",
+             "선글라스"], ()),
+]
+ROUTE_SOURCES = ["category_S", "category_M", "category_L"]
+
+
+class CategoryRoute:
+    """
+    라우트별로 한 번만 만들어 재사용 (get_route 캐시)
+    prompt: 기본 시스템 프롬프트에서 해당 없는 기장 지침/분류표를 뺀 프롬프트
+    schema: 해당 없는 기장 항목을 뺀 부분 스키마 (build_partial_schema 캐시 공유)
+    not_applicable: 결과에서 null 로 채울 필드
+    """
+    def __init__(self, name, length_fields):
+        self.name = name
+        self.length_fields = tuple(length_fields)
+        self.not_applicable = tuple(f for f in LENGTH_FIELDS if f not in self.length_fields)
+        self.prompt = build_system_prompt(self.length_fields)
+        self.schema = build_partial_schema(tuple(f for f in PRODUCT_FIELDS if f not in self.not_applicable))
+
+    def __repr__(self):
+        return f"CategoryRoute({self.name}, 제외={list(self.not_applicable)})"
+
+
+@lru_cache(maxsize=None)
+def get_route(name):
+    if name == DEFAULT_ROUTE:
+        return CategoryRoute(DEFAULT_ROUTE, LENGTH_FIELDS)
+    for route_name, _, length_fields in CATEGORY_ROUTES:
+        if route_name == name:
+            return CategoryRoute(route_name, length_fields)
+    raise KeyError(f"unknown category route: {name}")
+
+def match_route_name(row, routes=CATEGORY_ROUTES):
+    """전시카테고리(세분류부터)에 처음 매칭되는 라우트 이름, 없으면 DEFAULT_ROUTE"""
+    for source in ROUTE_SOURCES:
+        text = str(row.get(source) or "").upper()
+        if not text:
+            continue
+        for route_name, keywords, _ in routes:
+            if any(k.upper() in text for k in keywords):
+                return route_name
+    return DEFAULT_ROUTE
+
+def route_product(product_df):
+    """상품 1건(getPrdInfoByJson 결과) → CategoryRoute"""
+    return get_route(match_route_name(product_df.iloc[0]))
+
+def precompile_routes():
+    """모든 라우트의 프롬프트/스키마를 미리 생성 (배치/서비스 시작 시 1회)"""
+    return [get_route(DEFAULT_ROUTE)] + [get_route(name) for name, _, _ in CATEGORY_ROUTES]
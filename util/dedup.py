@@ -0,0 +1,203 @@
+import atexit
+import hashlib
+import json
+import os
+import re
+import threading
+import pandas as pd
+from util import metrics
+from util.image import compute_data_uri_dhash, compute_image_dhash
+
+# ==========================================
+# 유사(중복) 상품 인덱스
+# - 재등록/컬러 분리/묶음 구성 등 사실상 같은 상품의 분석 결과를 재사용하기 위함
+# - 텍스트: 정규화한 상품명+고시정보+상세설명의 문자 3-gram MinHash → LSH 밴딩으로 후보 검색
+# - 이미지: 대표 이미지 dHash(64bit) → 16bit 구간 4개로 버킷팅 (해밍거리 3 이하면 반드시 후보)
+#   (분석 파이프라인이 이미 변환한 이미지가 있으면 그 바이트로 계산 → 다시 다운로드하지 않음)
+# - 저장: 추가할 때마다 쓰지 않고 SAVE_DEBOUNCE_SECONDS 동안 모아서 1회 (세션/스레드 간 저장은 잠금으로 직렬화)
+# ==========================================
+NUM_PERM = 64          # MinHash 순열 수
+LSH_BANDS = 16         # 밴드 수 (밴드당 4행) → 유사도 약 0.5 이상부터 후보로 잡힘
+SHINGLE_SIZE = 3
+MATCH_THRESHOLD = 0.85 # 이 점수 이상이면 같은 상품으로 간주
+TEXT_WEIGHT = 0.7      # 이미지 해시가 양쪽 모두 있을 때 텍스트:이미지 = 0.7:0.3
+
+SAVE_DEBOUNCE_SECONDS = 10 # autosave: 마지막 저장 예약 후 이 시간 동안의 추가를 모아서 저장
+
+DEDUP_INDEX_PATH = os.environ.get("DEDUP_INDEX_PATH", ".cache/dedup_index.json")
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+def _make_permutations(num_perm):
+    # 고정 시드 → 프로세스/재시작과 무관하게 같은 서명 (인덱스 저장/로드 가능)
+    perms = []
+    for i in range(num_perm):
+        digest = hashlib.blake2b(f"perm-{i}".encode(), digest_size=16).digest()
+        a = int.from_bytes(digest[:8], "big") % _MERSENNE_PRIME or 1
+        b = int.from_bytes(digest[8:], "big") % _MERSENNE_PRIME
+        perms.append((a, b))
+    return perms
+
+_PERMUTATIONS = _make_permutations(NUM_PERM)
+
+
+def normalize_text(text):
+    text = str(text or "").lower()
+    text = re.sub(r"[^0-9a-z가-힣]+", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+def build_product_text(product_df, clean_desc=""):
+    """상품명 + 고시정보 + 정제된 상세설명을 하나의 정규화 텍스트로 합칩니다."""
+    row = product_df.iloc[0] if isinstance(product_df, pd.DataFrame) else product_df
+    notices = row.get("notices")
+    notice_text = " ".join(f"{k} {v}" for k, v in notices.items()) if isinstance(notices, dict) else ""
+    return normalize_text(f"{row.get('prdNm', '')} {notice_text} {clean_desc}")
+
+def minhash_signature(text):
+    shingles = {text[i:i + SHINGLE_SIZE] for i in range(max(1, len(text) - SHINGLE_SIZE + 1))}
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode(), digest_size=4).digest(), "big") for s in shingles]
+    return [min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes) for a, b in _PERMUTATIONS]
+
+def signature_similarity(sig_a, sig_b):
+    """MinHash 서명으로 추정한 Jaccard 유사도"""
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / len(sig_a)
+
+def image_similarity(hash_a, hash_b):
+    return 1 - bin(hash_a ^ hash_b).count("1") / 64
+
+def _band_keys(signature):
+    rows = len(signature) // LSH_BANDS
+    return [f"t{band}:" + ",".join(map(str, signature[band * rows:(band + 1) * rows])) for band in range(LSH_BANDS)]
+
+def _image_keys(image_hash):
+    return [f"i{part}:{(image_hash >> (16 * part)) & 0xFFFF}" for part in range(4)]
+
+
+class DuplicateIndex:
+    """
+    분석 완료된 상품의 서명 + 결과를 보관하고, 새 상품과 가장 유사한 기존 상품을 찾습니다.
+    """
+    def __init__(self, path=None, threshold=MATCH_THRESHOLD, use_image_hash=True, autosave=True):
+        self.path = path
+        self.autosave = autosave # False 면 호출 측에서 save() (배치처럼 추가가 잦은 경우), True 면 모아서 지연 저장
+        self.threshold = threshold
+        self.use_image_hash = use_image_hash
+        self.entries = {}  # prdNo -> {"signature", "image_hash", "result"}
+        self.buckets = {}  # LSH 키 -> {prdNo, ...}
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock() # 파일 쓰기 직렬화 (동시에 쓴 내용이 섞이지 않도록)
+        self._save_timer = None
+        self._dirty = False
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def _fingerprint(self, product_df, clean_desc, image_data_uri=None):
+        row = product_df.iloc[0]
+        signature = minhash_signature(build_product_text(product_df, clean_desc))
+        image_hash = None
+        images = row.get("prdImg")
+        if self.use_image_hash and image_data_uri:
+            image_hash = compute_data_uri_dhash(image_data_uri)
+        elif self.use_image_hash and isinstance(images, list) and images:
+            image_hash = compute_image_dhash(images[0])
+        return signature, image_hash
+
+    def _index_entry(self, prd_no, entry):
+        keys = _band_keys(entry["signature"])
+        if entry.get("image_hash") is not None:
+            keys += _image_keys(entry["image_hash"])
+        for key in keys:
+            self.buckets.setdefault(key, set()).add(prd_no)
+
+    def _score(self, signature, image_hash, entry):
+        text_score = signature_similarity(signature, entry["signature"])
+        if image_hash is None or entry.get("image_hash") is None:
+            return text_score
+        return TEXT_WEIGHT * text_score + (1 - TEXT_WEIGHT) * image_similarity(image_hash, entry["image_hash"])
+
+    def find(self, product_df, clean_desc="", image_data_uri=None):
+        """
+        Return: (기존 prdNo, 점수, 기존 결과 dict, 지문) — 기준 미달이면 (None, 최고점수, None, 지문)
+        image_data_uri: 이미 변환한 대표 이미지 (없으면 대표 이미지를 내려받아 해시 계산)
+        지문(fingerprint)은 add() 에 다시 넘겨 해시를 재계산하지 않도록 함
+        """
+        fingerprint = self._fingerprint(product_df, clean_desc, image_data_uri)
+        signature, image_hash = fingerprint
+        prd_no = str(product_df.iloc[0].get("prdNo"))
+
+        keys = _band_keys(signature) + (_image_keys(image_hash) if image_hash is not None else [])
+        best = (None, 0.0, None)
+        with self._lock:
+            candidates = set().union(*(self.buckets.get(key, set()) for key in keys))
+            candidates.discard(prd_no)
+            for candidate in candidates:
+                entry = self.entries[candidate]
+                score = self._score(signature, image_hash, entry)
+                if score > best[1]:
+                    best = (candidate, score, entry["result"])
+
+        metrics.incr("dedup_lookups")
+        if best[0] is not None and best[1] >= self.threshold:
+            metrics.incr("dedup_hits")
+            return best[0], best[1], best[2], fingerprint
+        return None, best[1], None, fingerprint
+
+    def add(self, product_df, clean_desc, result, fingerprint=None):
+        """분석 결과(ProductSchema)를 인덱스에 추가 (중복 복사본이 아닌 원본 분석만 추가 권장)"""
+        signature, image_hash = fingerprint or self._fingerprint(product_df, clean_desc)
+        prd_no = str(product_df.iloc[0].get("prdNo"))
+        entry = {"signature": signature, "image_hash": image_hash, "result": result.model_dump()}
+        with self._lock:
+            self.entries[prd_no] = entry
+            self._index_entry(prd_no, entry)
+            self._dirty = True
+            if self.path and self.autosave and self._save_timer is None:
+                self._save_timer = threading.Timer(SAVE_DEBOUNCE_SECONDS, self.flush)
+                self._save_timer.daemon = True
+                self._save_timer.start()
+
+    def flush(self):
+        """예약된 지연 저장을 지금 실행 (변경이 없으면 생략)"""
+        with self._lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+            dirty = self._dirty
+        if dirty and self.path:
+            self.save()
+
+    def save(self, path=None):
+        path = path or self.path
+        with self._save_lock:
+            with self._lock:
+                data = json.dumps(self.entries, ensure_ascii=False)
+                self._dirty = False
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            # 다른 프로세스/스레드의 임시 파일과 겹치지 않도록 pid + 스레드 id (util.transport 와 동일)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+    def load(self, path):
+        with open(path, encoding="utf-8") as f:
+            entries = json.load(f)
+        with self._lock:
+            self.entries = entries
+            self.buckets = {}
+            for prd_no, entry in entries.items():
+                self._index_entry(prd_no, entry)
+
+
+_default_index = None
+_default_index_lock = threading.Lock()
+
+def get_default_index():
+    """프로세스 공용 인덱스 (DEDUP_INDEX_PATH 에 저장)"""
+    global _default_index
+    with _default_index_lock:
+        if _default_index is None:
+            _default_index = DuplicateIndex(path=DEDUP_INDEX_PATH)
+            atexit.register(_default_index.flush) # 종료 시 아직 저장 안 된 추가분 저장
+        return _default_index
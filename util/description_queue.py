@@ -0,0 +1,176 @@
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from util import metrics, scheduler
+from util.blob_store import get_blob_store
+from util.product import generate_description
+
+# ==========================================
+# description 백그라운드 생성 큐 (2단계 분석의 2단계)
+# - 속성(1단계)은 바로 반환하고, 설명은 적은 수의 백그라운드 워커가 천천히 생성
+# - 같은 key 는 한 번만 생성 (중복 제거), key 는 description_key() — 세션 + 상품 + 분석 조건(모델/프롬프트/속성)
+#   → 다른 세션이나 다른 조건으로 다시 분석한 같은 상품의 설명을 섞어 쓰지 않음
+# - 화면에서 바로 필요하면 result_now(): 아직 시작 전이면 대기열에서 빼서 즉시 생성, 실패했던 항목은 다시 생성
+# - 이미지 조각은 프로세스 공용 Blob 저장소(util.blob_store)에 두고 참조만 보관, 생성 직전에 data URI 로 복원
+#   (저장소에서 제거되었으면 텍스트만으로 생성), 생성에 성공한 항목은 호출 인자를 버리고 결과만 보관
+# ==========================================
+DESCRIPTION_WORKERS = int(os.environ.get("DESCRIPTION_WORKERS", "1")) # 속성 분석과 경쟁하지 않도록 작게 유지
+MAX_ENTRIES = 1000 # 보관하는 작업(결과) 수 상한
+BACKGROUND_PRIORITY = "near_real_time" # 화면 클릭(interactive)보다 뒤, 백필(bulk)보다 앞 (result_now 는 호출한 쪽 우선순위)
+
+
+def description_key(prd_no, attributes, model_name=None, system_prompt=None, scope=None):
+    """
+    큐 key: scope(세션 등) + 상품번호 + 분석 조건 해시
+    attributes: 1단계 속성 결과 (ProductSchema, description 은 제외하고 해시)
+    """
+    values = attributes.model_dump(exclude={"description"}) if attributes is not None else None
+    digest = hashlib.sha256(
+        json.dumps([model_name, system_prompt, values], ensure_ascii=False, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()[:16]
+    return f"{scope or '-'}:{prd_no}:{digest}"
+
+
+def _failed(future):
+    return future.done() and (future.cancelled() or future.exception() is not None or future.result() is None)
+
+
+class DescriptionQueue:
+    def __init__(self, workers=DESCRIPTION_WORKERS):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="description")
+        self._entries = {} # key -> (future, call_args) — 성공한 항목은 call_args 가 None
+        self._lock = threading.Lock()
+
+    def submit(self, key, html_content, attributes, **kwargs):
+        """
+        description 생성 예약 (이미 예약/완료된 key 면 무시)
+        kwargs: generate_description 인자 (model_name, image_list, system_prompt, hedge)
+        """
+        with self._lock:
+            if key in self._entries:
+                return
+            if len(self._entries) >= MAX_ENTRIES:
+                # 가장 오래된 완료 항목부터 정리
+                for old_key in [k for k, (f, _) in self._entries.items() if f.done()][:len(self._entries) - MAX_ENTRIES + 1]:
+                    self._entries.pop(old_key)
+            kwargs = dict(kwargs)
+            image_list = kwargs.pop("image_list", None)
+            if image_list:
+                blob_store = get_blob_store()
+                kwargs["image_refs"] = [blob_store.put_data_uri(data_uri) for data_uri in image_list]
+            call_args = (html_content, attributes, kwargs)
+            future = self._pool.submit(self._generate_background, *call_args)
+            self._entries[key] = (future, call_args)
+        future.add_done_callback(lambda f, key=key: self._release(key, f))
+        metrics.incr("description_queue_submitted")
+
+    def _release(self, key, future):
+        """생성에 성공하면 호출 인자(상품 DataFrame, 이미지 참조)를 버림 (재시도가 필요한 실패 항목만 보관)"""
+        if _failed(future):
+            return
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] is future:
+                self._entries[key] = (future, None)
+
+    @staticmethod
+    def _generate(html_content, attributes, kwargs):
+        kwargs = dict(kwargs)
+        image_refs = kwargs.pop("image_refs", None)
+        if image_refs:
+            blob_store = get_blob_store()
+            image_list = [blob_store.get_data_uri(ref) for ref in image_refs]
+            if any(data_uri is None for data_uri in image_list):
+                # 저장소에서 제거된 이미지가 있으면 텍스트만으로 생성
+                metrics.incr("description_queue_images_evicted")
+                image_list = None
+            kwargs["image_list"] = image_list
+        return generate_description(html_content, attributes, **kwargs)
+
+    @staticmethod
+    def _generate_background(html_content, attributes, kwargs):
+        with scheduler.priority(BACKGROUND_PRIORITY):
+            return DescriptionQueue._generate(html_content, attributes, kwargs)
+
+    def status(self, key):
+        """None(미예약) | "queued" | "running" | "done" | "error" """
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return None
+        future = entry[0]
+        if future.running():
+            return "running"
+        if not future.done():
+            return "queued"
+        if _failed(future):
+            return "error"
+        return "done"
+
+    def result(self, key):
+        """완료된 결과 (ProductSchema), 아직이거나 실패면 None"""
+        return self.result_now(key, wait=False)
+
+    def result_now(self, key, wait=True, timeout=None):
+        """
+        결과가 바로 필요할 때 (on-demand)
+        - 대기 중이면 대기열에서 빼서 현재 스레드에서 즉시 생성
+        - 생성 중이면 끝날 때까지 대기 (wait=False 면 None)
+        - 이전 생성이 실패했으면 현재 스레드에서 다시 생성 (wait=False 면 None)
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return None
+        future, call_args = entry
+
+        if not wait and (not future.done() or _failed(future)):
+            return None
+        if not future.done() and future.cancel():
+            metrics.incr("description_queue_promoted")
+            return self._generate_now(key, call_args)
+        if _failed(future):
+            metrics.incr("description_queue_retried")
+            return self._generate_now(key, call_args)
+
+        try:
+            return future.result(timeout=timeout)
+        except (CancelledError, TimeoutError, Exception) as e:
+            print(f"❌ description 생성 실패 ({key}): {e}")
+            return None
+
+    def _generate_now(self, key, call_args):
+        """현재 스레드에서 즉시 생성 (실패하면 오류 상태로 남겨 다시 시도할 수 있게 함)"""
+        future = Future()
+        try:
+            result = self._generate(*call_args)
+        except Exception as e:
+            print(f"❌ description 생성 실패 ({key}): {e}")
+            future.set_exception(e)
+            result = None
+        else:
+            future.set_result(result)
+        with self._lock:
+            if key in self._entries: # 생성 중에 forget 된 항목은 되살리지 않음
+                self._entries[key] = (future, None if not _failed(future) else call_args)
+        return result
+
+    def forget(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        if entry is not None:
+            entry[0].cancel()
+
+
+_default_queue = None
+_default_lock = threading.Lock()
+
+def get_description_queue():
+    """프로세스 공용 description 큐"""
+    global _default_queue
+    with _default_lock:
+        if _default_queue is None:
+            _default_queue = DescriptionQueue()
+        return _default_queue
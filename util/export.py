@@ -0,0 +1,124 @@
+import datetime
+import json
+import os
+import re
+import uuid
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError: # 선택 의존성: 내보내기 기능을 쓸 때만 필요
+    pa = None
+    pq = None
+
+# ==========================================
+# 분석 결과 → 파티션 Parquet 내보내기 (검색/추천팀 대량 적재용)
+# - 경로: <root>/run_date=YYYY-MM-DD/ai_category_L=<대분류>/part-<uuid>.parquet (Hive 파티션)
+# - 저카디널리티 속성은 dictionary 인코딩, ai_season/ai_style 은 list<string> 컬럼
+# - 파티션별로 row_group_size 만큼 모이면 즉시 row group 으로 기록 → 전체를 메모리에 올리지 않음
+# ==========================================
+DICTIONARY_COLUMNS = [
+    "brandNm", "ai_category_M", "ai_category_S", "ai_gender", "ai_fit", "ai_pattern",
+    "ai_top_length", "ai_pants_length", "ai_skirt_length",
+]
+LIST_COLUMNS = ["ai_season", "ai_style"]
+STRING_COLUMNS = ["prdNo", "prdNm", "ai_size", "description"]
+DEFAULT_ROW_GROUP_SIZE = 10000
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("Parquet 내보내기에는 pyarrow 가 필요합니다. (pip install pyarrow)")
+
+def build_arrow_schema():
+    _require_pyarrow()
+    fields = [pa.field(name, pa.string()) for name in STRING_COLUMNS]
+    fields += [pa.field(name, pa.dictionary(pa.int32(), pa.string())) for name in DICTIONARY_COLUMNS]
+    fields += [pa.field(name, pa.list_(pa.string())) for name in LIST_COLUMNS]
+    return pa.schema(fields)
+
+def _partition_value(value):
+    # 경로 구분자 등 파일 시스템에서 문제되는 문자 치환
+    text = str(value or "미분류").strip() or "미분류"
+    return re.sub(r'[\\/:*?"<>|=]+', "_", text)
+
+
+class ParquetExporter:
+    """
+    with ParquetExporter("exports") as exporter:
+        for result in results:
+            exporter.write(result)
+    """
+    def __init__(self, root_dir, run_date=None, row_group_size=DEFAULT_ROW_GROUP_SIZE):
+        _require_pyarrow()
+        self.root_dir = root_dir
+        self.run_date = run_date or datetime.date.today().isoformat()
+        self.row_group_size = row_group_size
+        self.schema = build_arrow_schema()
+        self._buffers = {}  # 대분류 → [row dict, ...]
+        self._writers = {}  # 대분류 → ParquetWriter
+        self.rows_written = 0
+
+    def write(self, result):
+        """ProductSchema 또는 dict 한 건 추가"""
+        row = result.model_dump() if hasattr(result, "model_dump") else dict(result)
+        partition = _partition_value(row.get("ai_category_L"))
+        buffer = self._buffers.setdefault(partition, [])
+        buffer.append(row)
+        if len(buffer) >= self.row_group_size:
+            self._flush(partition)
+
+    def _flush(self, partition):
+        rows = self._buffers.get(partition)
+        if not rows:
+            return
+        columns = {}
+        for name in STRING_COLUMNS:
+            columns[name] = pa.array([r.get(name) for r in rows], type=pa.string())
+        for name in DICTIONARY_COLUMNS:
+            columns[name] = pa.array([r.get(name) for r in rows], type=pa.string()).dictionary_encode()
+        for name in LIST_COLUMNS:
+            columns[name] = pa.array([r.get(name) or [] for r in rows], type=pa.list_(pa.string()))
+        table = pa.table([columns[field.name] for field in self.schema], schema=self.schema)
+
+        writer = self._writers.get(partition)
+        if writer is None:
+            directory = os.path.join(self.root_dir, f"run_date={self.run_date}", f"ai_category_L={partition}")
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"part-{uuid.uuid4().hex}.parquet")
+            writer = pq.ParquetWriter(path, self.schema, compression="zstd", use_dictionary=DICTIONARY_COLUMNS)
+            self._writers[partition] = writer
+
+        writer.write_table(table, row_group_size=self.row_group_size)
+        self.rows_written += len(rows)
+        self._buffers[partition] = []
+
+    def close(self):
+        for partition in list(self._buffers):
+            self._flush(partition)
+        for writer in self._writers.values():
+            writer.close()
+        self._writers = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def export_jsonl_to_parquet(jsonl_path, root_dir, run_date=None, row_group_size=DEFAULT_ROW_GROUP_SIZE):
+    """
+    batch.py 결과(JSONL: {"prdNo", "result"}) 를 한 줄씩 읽어 Parquet 으로 내보냅니다.
+    Return: 기록된 행 수
+    """
+    with ParquetExporter(root_dir, run_date=run_date, row_group_size=row_group_size) as exporter:
+        with open(jsonl_path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                result = record.get("result", record)
+                if result:
+                    exporter.write(result)
+    return exporter.rows_written
@@ -1,5 +1,7 @@
-import requests
+from util.transport import http_get
+from util.image_probe import rank_images
 import base64
+import time
 from PIL import Image, ImageStat
 from io import BytesIO
 
@@ -16,7 +18,7 @@ def encode_image_to_base64(image_url, model_name):
         headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
         }
-        response = requests.get(image_url, headers=headers, timeout=5)
+        response = http_get(image_url, headers=headers, timeout=5)
         
         if response.status_code == 200:
             # 1. 이미지 데이터 로드
@@ -117,91 +119,139 @@ def find_safe_split_point(img, start_y, max_height, lookback_range=200):
             
     return best_cut_y
 
-# 이미지 chunk
-def encode_image_to_base64_chunk(image_url, model_name):
+# 이미지 다운로드 (네트워크 대기 → 스레드에서 실행)
+def fetch_image_bytes(image_url):
     """
-    이미지를 다운로드하여 Base64 리스트로 반환 (긴 이미지는 자름)
-    Return: List[str] (예: ["data:...", "data:..."])
+    이미지 원본 바이트를 다운로드합니다. 실패 시 None
     """
     try:
         headers = {"User-Agent": "Mozilla/5.0"}
-        response = requests.get(image_url, headers=headers, timeout=5)
+        response = http_get(image_url, headers=headers, timeout=5)
         if response.status_code == 200:
-            img_data = response.content
-            try:
-                img = Image.open(BytesIO(img_data))
-                if img.mode in ("RGBA", "P"): img = img.convert("RGB")
-                
+            return response.content
+    except Exception:
+        return None
+    return None
+
+# 이미지 디코딩/리사이즈/크롭/인코딩 (CPU 작업 → 배치 모드에서는 별도 프로세스에서 실행)
+PASSTHROUGH_MIME_TYPES = {"image/jpeg", "image/png", "image/webp"}
+
+def process_image_bytes(img_data, model_name, passthrough_max_size=None):
+    """
+    다운로드한 이미지 바이트를 AI 전송용 조각으로 변환합니다. (긴 이미지는 자름)
+    프로세스 간 전달 비용을 줄이기 위해 base64 문자열이 아닌 (mime, bytes) 로 반환합니다.
+    passthrough_max_size: (w, h) — CDN 렌디션이 이미 이 규격 이내면 재인코딩 없이 원본 바이트 사용
+    Return: List[(mime_type, bytes)]
+    """
+    try:
+        img = Image.open(BytesIO(img_data)) # 헤더만 읽음 (픽셀 디코딩은 실제 사용 시점)
+        
+        width, height = img.size
+        if width < 50 or height < 50: return [] 
+
+        # CDN 이 이미 모델 입력 규격으로 내려준 일반 비율 이미지는 그대로 전송
+        if passthrough_max_size and height <= width * 2.0 \
+                and width <= passthrough_max_size[0] and height <= passthrough_max_size[1]:
+            mime = Image.MIME.get(img.format)
+            if mime in PASSTHROUGH_MIME_TYPES:
+                return [(mime, img_data)]
+
+        if img.mode in ("RGBA", "P"): img = img.convert("RGB")
+
+        MAX_SIZE = 1024
+        JPEG_QUALITY = 100 if "gemini" in model_name.lower() else 85
+        results = []
+        
+        # [Case A] 세로로 긴 상세페이지 (높이가 너비의 2배 이상)
+        if height > width * 2.0:
+            # 1. 가로 너비를 1024px로 리사이징 (세로 비율 유지)
+            if width > MAX_SIZE:
+                ratio = MAX_SIZE / width
+                new_width = MAX_SIZE
+                new_height = int(height * ratio)
+                img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
                 width, height = img.size
-                if width < 50 or height < 50: return [] 
 
-                MAX_SIZE = 1024
-                JPEG_QUALITY = 100 if "gemini" in model_name.lower() else 85
-                results = []
+            # 2. 추출할 조각의 높이 설정 (정사각형에 가깝게)
+            crop_h = width 
+            
+            # 3. 핵심 4지점 좌표 계산 (Top, 1/3지점, 2/3지점, Bottom)
+            # 만약 이미지가 너무 짧아서 4개가 안 나오면 중복 제거됨
+            offsets = [
+                0,                          # [1] 헤드 (메인 이미지)
+                int(height * 0.33),         # [2] 상단부 (모델 착용샷)
+                int(height * 0.66),         # [3] 하단부 (디테일/컬러)
+                max(0, height - crop_h)     # [4] 푸터 (사이즈표/정보)
+            ]
+            
+            # 좌표 중복 제거 및 정렬
+            unique_offsets = sorted(list(set(offsets)))
+            
+            for y in unique_offsets:
+                bottom = min(y + crop_h, height)
                 
-                # [Case A] 세로로 긴 상세페이지 (높이가 너비의 2배 이상)
-                if height > width * 2.0:
-                    # 1. 가로 너비를 1024px로 리사이징 (세로 비율 유지)
-                    if width > MAX_SIZE:
-                        ratio = MAX_SIZE / width
-                        new_width = MAX_SIZE
-                        new_height = int(height * ratio)
-                        img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-                        width, height = img.size
-
-                    # 2. 추출할 조각의 높이 설정 (정사각형에 가깝게)
-                    crop_h = width 
-                    
-                    # 3. 핵심 4지점 좌표 계산 (Top, 1/3지점, 2/3지점, Bottom)
-                    # 만약 이미지가 너무 짧아서 4개가 안 나오면 중복 제거됨
-                    offsets = [
-                        0,                          # [1] 헤드 (메인 이미지)
-                        int(height * 0.33),         # [2] 상단부 (모델 착용샷)
-                        int(height * 0.66),         # [3] 하단부 (디테일/컬러)
-                        max(0, height - crop_h)     # [4] 푸터 (사이즈표/정보)
-                    ]
-                    
-                    # 좌표 중복 제거 및 정렬
-                    unique_offsets = sorted(list(set(offsets)))
-                    
-                    for y in unique_offsets:
-                        bottom = min(y + crop_h, height)
-                        
-                        # 범위 보정 (이미지 끝을 넘어가지 않게)
-                        if bottom == height:
-                            y = max(0, height - crop_h)
-                        
-                        cropped = img.crop((0, y, width, bottom))
-                        
-                        # 전송용 변환
-                        buf = BytesIO()
-                        cropped.save(buf, format="JPEG", quality=JPEG_QUALITY)
-                        b64_str = base64.b64encode(buf.getvalue()).decode('utf-8')
-                        results.append(f"data:image/jpeg;base64,{b64_str}")
-                        
-                    return results # 최대 4장 반환
+                # 범위 보정 (이미지 끝을 넘어가지 않게)
+                if bottom == height:
+                    y = max(0, height - crop_h)
                 
-                # [Case B] 일반 비율 이미지
-                else:
-                    # if width > MAX_SIZE or height > MAX_SIZE:
-                        # img.thumbnail((MAX_SIZE, MAX_SIZE), Image.Resampling.LANCZOS)
-                    buf = BytesIO()
-                    img.save(buf, format="webp", quality=JPEG_QUALITY)
-                    b64_str = base64.b64encode(buf.getvalue()).decode('utf-8')
-                    return [f"data:image/jpeg;base64,{b64_str}"]
-            except Exception: return []
+                cropped = img.crop((0, y, width, bottom))
+                
+                # 전송용 변환
+                buf = BytesIO()
+                cropped.save(buf, format="JPEG", quality=JPEG_QUALITY)
+                results.append(("image/jpeg", buf.getvalue()))
+                
+            return results # 최대 4장 반환
+        
+        # [Case B] 일반 비율 이미지
+        else:
+            # if width > MAX_SIZE or height > MAX_SIZE:
+                # img.thumbnail((MAX_SIZE, MAX_SIZE), Image.Resampling.LANCZOS)
+            buf = BytesIO()
+            img.save(buf, format="webp", quality=JPEG_QUALITY)
+            return [("image/webp", buf.getvalue())]
     except Exception: return []
-    return []
+
+def process_image_bytes_timed(img_data, model_name, passthrough_max_size=None):
+    """(워커 프로세스에서 실행) 변환 결과 + 소요 CPU 시간(초)"""
+    start = time.process_time()
+    parts = process_image_bytes(img_data, model_name, passthrough_max_size)
+    return parts, time.process_time() - start
+
+def to_data_uris(parts):
+    """ [(mime_type, bytes), ...] → ["data:<mime>;base64,...", ...] """
+    return [f"data:{mime};base64,{base64.b64encode(data).decode('utf-8')}" for mime, data in parts]
+
+# 이미지 chunk
+def encode_image_to_base64_chunk(image_url, model_name, passthrough_max_size=None):
+    """
+    이미지를 다운로드하여 Base64 리스트로 반환 (긴 이미지는 자름)
+    Return: List[str] (예: ["data:...", "data:..."])
+    """
+    img_data = fetch_image_bytes(image_url)
+    if not img_data:
+        return []
+    return to_data_uris(process_image_bytes(img_data, model_name, passthrough_max_size))
 
 # html에서 img 링크 추출
-def extract_img_for_html(soup, basic_ext_nm, max_images=6):
-    found_images = []
-    seen_urls = set()
-    
-    # 모든 img 태그 검색
+DETAIL_IMAGE_SLOTS = 2 # 상품 이미지가 많아도 상세설명 이미지에 보장하는 자리 (사이즈표/소재 안내 등)
+URL_EXCLUDE_HINTS = ['logo', 'icon', 'button', 'tracker', 'pixel', 'sns', 'banner']
+
+def extract_img_for_html(soup, basic_ext_nm, max_images=6, detail_slots=DETAIL_IMAGE_SLOTS):
+    """
+    상품 이미지(basic_ext_nm: extract_all_valid_images 결과) + 상세설명 HTML 이미지를 합쳐 최대 max_images 장
+    - 상세설명 이미지는 URL 로 1차 제외 → 사전 검사(util.image_probe, 본문 다운로드 전)로 작은/초대형/배너/중복 제외
+      → 정보량 순 상위만 사용
+    - 상세설명 이미지 자리: 최소 detail_slots 장, 상품 이미지가 모자라면 남는 자리 전부
+    """
+    product_images = list(basic_ext_nm or [])
+    seen_urls = set(product_images)
+    candidates = []
+
+    # 모든 img 태그 검색 (지연 로딩 속성 우선)
     for img in soup.find_all('img'):
-        src = img.get('src')
-        if not src:
+        src = img.get('ec-data-src') or img.get('data-src') or img.get('src')
+        if not src or src.startswith("data:"):
             continue
             
         # 절대 경로 변환 (urllib 사용 권장)
@@ -217,25 +267,29 @@ def extract_img_for_html(soup, basic_ext_nm, max_images=6):
         # 1. 중복 제거
         if full_url in seen_urls:
             continue
+        seen_urls.add(full_url)
             
         # 2. 아이콘, 로고, 작은 UI 요소 제외 (파일명이나 클래스명으로 1차 필터)
         lower_src = full_url.lower()
-        if any(x in lower_src for x in ['logo', 'icon', 'button', 'tracker', 'pixel', 'sns', 'banner']):
+        if any(x in lower_src for x in URL_EXCLUDE_HINTS):
             continue
+        candidates.append(full_url)
 
-        found_images.append(basic_ext_nm)
-        found_images.append(full_url)
-        seen_urls.add(full_url)
-        
-        # 최대 개수 도달 시 중단 (비용 관리)
-        if len(found_images) >= max_images:
-            break
-    return found_images
+    # 3. 헤더만 받아 크기 검사 후 정보량 순 정렬 (필요한 장수만큼만)
+    detail_limit = min(max_images, max(detail_slots, max_images - len(product_images)))
+    detail_images = rank_images(candidates, limit=detail_limit) if candidates and detail_limit > 0 else []
+    return product_images[:max_images - len(detail_images)] + detail_images
 
 
 # ==========================================
 # [헬퍼 함수] 딕셔너리에서 기본+추가 이미지 모두 추출
 # ==========================================
+def _cdn_image_url(ext_nm):
+    # ES 리스트용 이미지(appPrdImgUrl)처럼 이미 전체 URL 이면 그대로 사용
+    if str(ext_nm).startswith(("http://", "https://", "//")):
+        return ext_nm
+    return f"https://cdn2.halfclub.com/rimg/330x440/contain/{ext_nm}?format=webp"
+
 def extract_all_valid_images(img_data):
     # 데이터가 딕셔너리가 아니면(None, float 등) 빈 리스트 반환
     if not isinstance(img_data, dict):
@@ -246,7 +300,7 @@ def extract_all_valid_images(img_data):
     # 1. 기본 이미지 (basicExtNm) - 필수값이어도 안전하게 get 사용
     if img_data.get('basicExtNm'):
         basicExtNm = img_data['basicExtNm']
-        valid_urls.append(f"https://cdn2.halfclub.com/rimg/330x440/contain/{basicExtNm}?format=webp" )
+        valid_urls.append(_cdn_image_url(basicExtNm))
         
     # 2. 추가 이미지 (add1ExtNm ~ add9ExtNm) 순회
     for i in range(1, 10):
@@ -254,6 +308,38 @@ def extract_all_valid_images(img_data):
         url = img_data.get(key)
         # 키가 있고, 값이 비어있지 않은 경우에만 추가
         if url:
-            valid_urls.append(f"https://cdn2.halfclub.com/rimg/330x440/contain/{url}?format=webp" )
+            valid_urls.append(_cdn_image_url(url))
             
-    return valid_urls
\ No newline at end of file
+    return valid_urls
+
+# ==========================================
+# [헬퍼 함수] 이미지 지각 해시 (dHash, 64bit)
+# - 유사 상품 판별용: 리사이즈/재인코딩에는 거의 변하지 않고, 다른 이미지면 크게 달라짐
+# ==========================================
+def compute_dhash(img, hash_size=8):
+    gray = img.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.LANCZOS)
+    pixels = list(gray.getdata())
+    value = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            value = (value << 1) | (1 if left > right else 0)
+    return value
+
+def compute_bytes_dhash(img_data):
+    """이미지 바이트 → dHash(int), 실패 시 None"""
+    try:
+        return compute_dhash(Image.open(BytesIO(img_data)))
+    except Exception as e:
+        print(f"이미지 해시 계산 실패: {e}")
+        return None
+
+def compute_data_uri_dhash(data_uri):
+    """이미 변환한 이미지(data URI) → dHash (다시 다운로드하지 않음)"""
+    return compute_bytes_dhash(base64.b64decode(data_uri.partition("base64,")[2]))
+
+def compute_image_dhash(image_url):
+    """이미지 URL → dHash(int), 실패 시 None"""
+    img_data = fetch_image_bytes(image_url)
+    return compute_bytes_dhash(img_data) if img_data else None
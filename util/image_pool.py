@@ -0,0 +1,129 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from ai.model import first_tier_model
+from util import metrics, scheduler
+from util.image import fetch_image_bytes, process_image_bytes_timed, to_data_uris
+from util import rendition
+
+# ==========================================
+# 배치 모드용 이미지 파이프라인
+# - 네트워크 다운로드: 스레드 풀 (I/O 대기)
+# - 디코딩/리사이즈/크롭/인코딩: 프로세스 풀 (GIL 회피 → 코어 수만큼 확장)
+# - 다운로드가 끝난 이미지부터 즉시 프로세스 풀로 넘겨 두 단계를 겹쳐서 실행
+# - 설정하지 않으면(Streamlit UI 기본값) 기존처럼 현재 스레드에서 순차 처리
+# ==========================================
+class ImagePipeline:
+    def __init__(self, processes=None, fetch_threads=16):
+        self.processes = processes or os.cpu_count() or 1
+        self.fetch_pool = ThreadPoolExecutor(max_workers=fetch_threads, thread_name_prefix="img-fetch")
+        # 멀티스레드 프로세스에서 fork 하면 잠금 상태가 복제될 수 있으므로 spawn 사용
+        self.process_pool = ProcessPoolExecutor(
+            max_workers=self.processes,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+
+    def _fetch_then_submit(self, image_url, model_name, passthrough_max_size):
+        """다운로드 완료 즉시 CPU 작업을 프로세스 풀에 제출 (파이프라인 연결)"""
+        with metrics.timed("image_stage_latency", stage="fetch"):
+            img_data = fetch_image_bytes(image_url)
+        if not img_data:
+            return None, 0
+        return self.process_pool.submit(process_image_bytes_timed, img_data, model_name, passthrough_max_size), len(img_data)
+
+    def encode_many(self, targets, model_name):
+        """
+        여러 이미지를 병렬로 변환합니다. (입력 순서 유지)
+        targets: [(url, passthrough_max_size), ...]
+        Return: [(url, List[data uri], 다운로드 바이트, CPU 초), ...] — 실패한 이미지는 빈 리스트
+        """
+        fetch_futures = [
+            self.fetch_pool.submit(scheduler.bind(self._fetch_then_submit), url, model_name, passthrough)
+            for url, passthrough in targets
+        ]
+
+        results = []
+        for (url, _), fetch_future in zip(targets, fetch_futures):
+            process_future, nbytes = fetch_future.result()
+            parts, cpu_seconds = [], 0.0
+            if process_future is not None:
+                try:
+                    with metrics.timed("image_stage_latency", stage="process_wait"):
+                        parts, cpu_seconds = process_future.result()
+                except Exception as e:
+                    print(f"이미지 처리 프로세스 오류: {e}")
+            results.append((url, to_data_uris(parts), nbytes, cpu_seconds))
+        return results
+
+    def shutdown(self):
+        self.fetch_pool.shutdown(wait=True)
+        self.process_pool.shutdown(wait=True)
+
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+def configure_image_pipeline(processes=None, fetch_threads=16):
+    """배치 실행 시작 시 1회 호출 (processes=0 이면 파이프라인 해제 → 순차 처리)"""
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is not None:
+            _pipeline.shutdown()
+            _pipeline = None
+        if processes != 0:
+            _pipeline = ImagePipeline(processes=processes, fetch_threads=fetch_threads)
+        return _pipeline
+
+def shutdown_image_pipeline():
+    configure_image_pipeline(processes=0)
+
+def _encode_serial(targets, model_name, max_images):
+    results = []
+    for img_url, passthrough in targets:
+        # 최대 6장까지만 처리 (비용 및 속도 고려)
+        if sum(1 for r in results if r[1]) >= max_images:
+            break
+        # ★ 핵심: URL을 그냥 보내지 않고, Base64로 변환해서 보냄
+        img_data = fetch_image_bytes(img_url)
+        if not img_data:
+            results.append((img_url, [], 0, 0.0))
+            continue
+        parts, cpu_seconds = process_image_bytes_timed(img_data, model_name, passthrough)
+        results.append((img_url, to_data_uris(parts), len(img_data), cpu_seconds))
+    return results
+
+def encode_images(image_urls, model_name, max_images=6, detail="low"):
+    """
+    이미지 URL 목록 → 변환에 성공한 앞쪽 max_images 장
+    - CDN 렌디션 정책(util.rendition)에 맞춰 URL 의 크기/포맷을 조정해서 다운로드
+    - 상품 단위 다운로드 바이트/CPU 시간을 기록 (mode=rendition|legacy 로 전후 비교)
+    Return: [(url, List[data uri]), ...]
+    """
+    model_name = first_tier_model(model_name) # 캐스케이드는 첫 단계 모델 기준으로 받고 변환
+    targets = [rendition.build_rendition_url(url, model_name, detail) for url in image_urls]
+    pipeline = _pipeline
+
+    # 상품 단위로 이미지 단계 슬롯 점유 (백필 중에도 interactive 요청의 이미지 변환이 먼저 시작)
+    with scheduler.slot("image"):
+        if pipeline is not None:
+            # 실패분을 감안해 앞쪽 후보만 병렬 처리 (후보가 모자라면 다음 묶음 처리)
+            results = []
+            for start in range(0, len(targets), max_images):
+                results.extend(pipeline.encode_many(targets[start:start + max_images], model_name))
+                if sum(1 for r in results if r[1]) >= max_images:
+                    break
+        else:
+            results = _encode_serial(targets, model_name, max_images)
+
+    mode = "rendition" if rendition.USE_CDN_RENDITIONS else "legacy"
+    metrics.observe("image_bytes_per_product", sum(r[2] for r in results), mode=mode)
+    metrics.observe("image_cpu_per_product", sum(r[3] for r in results), mode=mode)
+
+    encoded = []
+    for url, chunks, _, _ in results:
+        if not chunks:
+            print(f"❌ 이미지 변환 실패 (건너뜀): {url}")
+        elif len(encoded) < max_images:
+            encoded.append((url, chunks))
+    return encoded
@@ -0,0 +1,128 @@
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from util import metrics, scheduler
+from util.transport import http_probe
+
+# ==========================================
+# 상세설명 이미지 사전 검사 (본문 다운로드 전)
+# - Range 요청으로 앞부분(PROBE_BYTES)만 받아 전체 크기(Content-Range/Content-Length)와 가로/세로 확인
+#   (PNG / GIF / JPEG / WebP 헤더 직접 파싱 — PIL 은 잘린 WebP 를 열지 못함)
+# - 추적 픽셀/아이콘(MIN_IMAGE_SIDE 미만), 초대형 파일(MAX_IMAGE_BYTES 초과),
+#   가로 띠 배너/구분선(MAX_ASPECT_RATIO 초과), 같은 이미지 반복(크기+바이트 동일)은 다운로드 전에 제외
+# - 남은 후보는 정보량(면적, 상한 적용) 순으로 정렬 → 상위 몇 장만 실제로 다운로드
+# ==========================================
+PROBE_BYTES = 32 * 1024 # JPEG 는 EXIF 뒤에 SOF 가 오므로 여유 있게
+MIN_IMAGE_SIDE = 50 # encode_image_to_base64 의 아이콘/추적픽셀 기준과 동일
+MAX_IMAGE_BYTES = 10 * 1024 * 1024
+MAX_ASPECT_RATIO = 5.0 # 가로/세로 (세로로 긴 상세 이미지는 process_image_bytes 가 잘라서 처리하므로 제한 없음)
+MAX_PROBES = 20 # 상품 1건에서 검사하는 후보 수 상한
+PROBE_WORKERS = 8
+SCORE_MAX_WIDTH = 1000 # 정보량 점수 상한 (이보다 큰 이미지는 모델 입력 시 축소되므로 가산점 없음)
+SCORE_MAX_HEIGHT = 3000
+
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def parse_image_size(head):
+    """
+    이미지 앞부분 바이트 → (포맷, 가로, 세로), 알 수 없으면 None
+    """
+    if head.startswith(b"\x89PNG\r\n\x1a\n") and len(head) >= 24:
+        width, height = struct.unpack(">II", head[16:24])
+        return "png", width, height
+    if head[:6] in (b"GIF87a", b"GIF89a") and len(head) >= 10:
+        width, height = struct.unpack("<HH", head[6:10])
+        return "gif", width, height
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP" and len(head) >= 30:
+        chunk = head[12:16]
+        if chunk == b"VP8 ":
+            width, height = struct.unpack("<HH", head[26:30])
+            return "webp", width & 0x3FFF, height & 0x3FFF
+        if chunk == b"VP8L":
+            b0, b1, b2, b3 = head[21:25]
+            return "webp", 1 + (((b1 & 0x3F) << 8) | b0), 1 + (((b3 & 0x0F) << 10) | (b2 << 2) | ((b1 & 0xC0) >> 6))
+        if chunk == b"VP8X":
+            return "webp", 1 + int.from_bytes(head[24:27], "little"), 1 + int.from_bytes(head[27:30], "little")
+        return None
+    if head[:2] == b"\xff\xd8":
+        i = 2
+        while i + 9 <= len(head):
+            if head[i] != 0xFF:
+                i += 1
+                continue
+            marker = head[i + 1]
+            if marker == 0xFF:
+                i += 1
+                continue
+            if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+                i += 2
+                continue
+            if marker in _JPEG_SOF_MARKERS:
+                height, width = struct.unpack(">HH", head[i + 5:i + 9])
+                return "jpeg", width, height
+            i += 2 + struct.unpack(">H", head[i + 2:i + 4])[0]
+    return None
+
+
+def probe_image(image_url):
+    """
+    이미지 1장 사전 검사
+    Return: {"url", "format", "width", "height", "bytes", "reason"} — reason 이 None 이면 통과
+    """
+    probe = {"url": image_url, "format": None, "width": None, "height": None, "bytes": None, "reason": None}
+    try:
+        status, total_bytes, _, head = http_probe(image_url, headers={"User-Agent": "Mozilla/5.0"}, max_bytes=PROBE_BYTES)
+    except Exception as e:
+        print(f"이미지 사전 검사 실패: {image_url} ({e})")
+        probe["reason"] = "error"
+        return probe
+    if status not in (200, 206):
+        probe["reason"] = "error"
+        return probe
+
+    probe["bytes"] = total_bytes
+    size = parse_image_size(head)
+    if size is not None:
+        probe["format"], probe["width"], probe["height"] = size
+
+    if total_bytes is not None and total_bytes > MAX_IMAGE_BYTES:
+        probe["reason"] = "too_large"
+    elif size is not None and min(probe["width"], probe["height"]) < MIN_IMAGE_SIDE:
+        probe["reason"] = "too_small"
+    elif size is not None and probe["width"] > probe["height"] * MAX_ASPECT_RATIO:
+        probe["reason"] = "banner"
+    return probe
+
+
+def _score(probe):
+    """정보량 점수: 면적(상한 적용), 크기를 모르는 이미지는 0 (통과는 시키되 맨 뒤)"""
+    if probe["width"] is None:
+        return 0
+    return min(probe["width"], SCORE_MAX_WIDTH) * min(probe["height"], SCORE_MAX_HEIGHT)
+
+
+def rank_images(image_urls, limit=None):
+    """
+    후보 URL(문서 순서) → 사전 검사 통과한 URL 을 정보량 순으로 최대 limit 개
+    (점수가 같으면 문서 앞쪽 우선)
+    """
+    candidates = list(dict.fromkeys(image_urls))[:MAX_PROBES]
+    if not candidates:
+        return []
+    with ThreadPoolExecutor(max_workers=min(PROBE_WORKERS, len(candidates)), thread_name_prefix="img-probe") as pool:
+        probes = list(pool.map(scheduler.bind(probe_image), candidates))
+
+    kept, seen = [], set()
+    for order, probe in enumerate(probes):
+        signature = (probe["width"], probe["height"], probe["bytes"])
+        if probe["reason"] is None and probe["width"] is not None and signature in seen:
+            probe["reason"] = "duplicate"
+        seen.add(signature)
+        metrics.incr("image_probe", outcome=probe["reason"] or "kept")
+        if probe["reason"] is None:
+            kept.append((-_score(probe), order, probe["url"]))
+        else:
+            print(f"🚫 상세 이미지 제외 ({probe['reason']}, {probe['width']}x{probe['height']}, {probe['bytes']}B): {probe['url']}")
+
+    ranked = [url for _, _, url in sorted(kept)]
+    return ranked[:limit] if limit is not None else ranked
@@ -0,0 +1,302 @@
+import atexit
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+import pandas as pd
+
+# ==========================================
+# LLM 호출 장부 (토큰 / 지연시간 / 결과)
+# - 제공사 호출 1회(재시도/헤지 포함 실제 과금 단위)마다 1행 기록
+#   (여러 상품을 묶은 packed 호출은 응답 항목별로 1행씩, 토큰은 항목 수로 나눠 기록 — 지연시간/결과는 호출 값 그대로)
+# - 태그: 모델, 프롬프트 해시(시스템 프롬프트 내용 기준), 스키마, ai_category_L, prdNo, 실행 ID(run_id)
+# - 쓰기는 메모리에 모았다가 FLUSH_EVERY 건 / FLUSH_SECONDS 초마다 SQLite(WAL) 에 일괄 저장 (호출 경로에서 디스크 대기 최소화)
+# - 조회: summarize(그룹별 합계/지연 분위수), top_products(토큰 많이 쓴 상품), prompt_history(프롬프트 수정 전후 비교), runs
+# - LEDGER_PATH="" 이면 기록하지 않음
+# ==========================================
+LEDGER_PATH = os.environ.get("LEDGER_PATH", ".cache/ledger.db")
+RUN_ID = os.environ.get("LEDGER_RUN_ID") or f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+FLUSH_EVERY = 50
+FLUSH_SECONDS = 5.0
+
+# 모델별 100만 토큰당 단가(USD, 입력/출력 정가) — 캐시 할인은 반영하지 않은 상한 추정치
+# 환경변수로 덮어쓰기: LEDGER_PRICES='{"gpt-4o": [2.5, 10.0]}'
+TOKEN_PRICES = {
+    "gemini-2.5-flash-lite": (0.10, 0.40),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+}
+TOKEN_PRICES.update({k: tuple(v) for k, v in json.loads(os.environ.get("LEDGER_PRICES", "{}")).items()})
+
+COLUMNS = ["ts", "run_id", "model", "provider", "prompt_hash", "schema", "category", "prd_no", "priority",
+           "input_tokens", "output_tokens", "cached_tokens", "images", "latency", "outcome"]
+
+
+def prompt_hash(system_prompt):
+    """시스템 프롬프트 버전 식별자 (내용이 같으면 같은 해시)"""
+    return hashlib.sha1(str(system_prompt or "").encode("utf-8")).hexdigest()[:10]
+
+
+class UsageLedger:
+    def __init__(self, path):
+        self.path = path
+        self._buffer = []
+        self._prompts = {}
+        self._known_prompts = set()
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS calls (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    ts REAL NOT NULL,
+                    run_id TEXT, model TEXT, provider TEXT, prompt_hash TEXT, schema TEXT, category TEXT, prd_no TEXT,
+                    priority TEXT,
+                    input_tokens INTEGER, output_tokens INTEGER, cached_tokens INTEGER, images INTEGER,
+                    latency REAL, outcome TEXT
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_calls_ts ON calls (ts)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_calls_run ON calls (run_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_calls_prompt ON calls (model, prompt_hash)")
+            conn.execute("CREATE TABLE IF NOT EXISTS prompts (prompt_hash TEXT PRIMARY KEY, first_seen REAL, text TEXT)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA busy_timeout=30000")
+        return conn
+
+    def record(self, model, provider, system_prompt, schema, usage, latency, outcome, category=None, prd_no=None,
+               priority=None, images=0):
+        """
+        호출 1회 기록
+        usage: 제공사 래퍼가 채운 {"input_tokens", "output_tokens", "cached_tokens", "images"} (없는 값은 None)
+        """
+        p_hash = prompt_hash(system_prompt)
+        row = (
+            time.time(), RUN_ID, model, provider, p_hash, schema, category, prd_no, priority,
+            usage.get("input_tokens"), usage.get("output_tokens"), usage.get("cached_tokens"), usage.get("images", images),
+            latency, outcome,
+        )
+        with self._lock:
+            self._buffer.append(row)
+            if p_hash not in self._known_prompts:
+                self._known_prompts.add(p_hash)
+                self._prompts[p_hash] = str(system_prompt or "")
+            due = len(self._buffer) >= FLUSH_EVERY or time.monotonic() - self._last_flush >= FLUSH_SECONDS
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            rows, prompts = self._buffer, self._prompts
+            self._buffer, self._prompts = [], {}
+            self._last_flush = time.monotonic()
+        if not rows and not prompts:
+            return
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(f"INSERT INTO calls ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})", rows)
+                conn.executemany(
+                    "INSERT OR IGNORE INTO prompts (prompt_hash, first_seen, text) VALUES (?, ?, ?)",
+                    [(h, time.time(), text) for h, text in prompts.items()]
+                )
+        except sqlite3.Error as e:
+            print(f"⚠️ 호출 장부 저장 실패 ({len(rows)}건): {e}")
+        finally:
+            conn.close()
+
+    # ---------- 조회 ----------
+    def load(self, since=None, run_id=None):
+        """조건에 맞는 호출 행 → DataFrame (since: epoch 초)"""
+        self.flush()
+        where, params = [], []
+        if since is not None:
+            where.append("ts >= ?")
+            params.append(since)
+        if run_id is not None:
+            where.append("run_id = ?")
+            params.append(run_id)
+        sql = f"SELECT {', '.join(COLUMNS)} FROM calls" + (f" WHERE {' AND '.join(where)}" if where else "")
+        conn = self._connect()
+        try:
+            return pd.read_sql_query(sql, conn, params=params)
+        finally:
+            conn.close()
+
+    def summarize(self, by=("model",), since=None, run_id=None, calls=None):
+        """
+        그룹별 집계 (by: COLUMNS 중 일부, 예: ("model", "category"))
+        Return: DataFrame [by..., calls, errors, input_tokens, output_tokens, cached_tokens, images,
+                           latency_avg, latency_p95, cost_usd]
+        """
+        calls = self.load(since, run_id) if calls is None else calls
+        if calls.empty:
+            return pd.DataFrame(columns=list(by) + ["calls", "errors", "input_tokens", "output_tokens", "cached_tokens",
+                                                     "images", "latency_avg", "latency_p95", "cost_usd"])
+        calls = calls.assign(
+            errors=(calls["outcome"] != "ok").astype(int),
+            cost_usd=estimate_cost(calls),
+            category=calls["category"].fillna("미분류"),
+        )
+        grouped = calls.groupby(list(by), dropna=False)
+        summary = grouped.agg(
+            calls=("outcome", "size"),
+            errors=("errors", "sum"),
+            input_tokens=("input_tokens", "sum"),
+            output_tokens=("output_tokens", "sum"),
+            cached_tokens=("cached_tokens", "sum"),
+            images=("images", "sum"),
+            latency_avg=("latency", "mean"),
+            latency_p95=("latency", lambda s: s.quantile(0.95)),
+            cost_usd=("cost_usd", "sum"),
+        )
+        return summary.reset_index().sort_values("cost_usd", ascending=False)
+
+    def top_products(self, limit=20, since=None, run_id=None, calls=None):
+        """토큰을 많이 쓴 상품 (상품별 입력+출력 토큰 합계 내림차순)"""
+        calls = self.load(since, run_id) if calls is None else calls
+        calls = calls[calls["prd_no"].notna()]
+        summary = self.summarize(by=("prd_no",), calls=calls)
+        summary["total_tokens"] = summary["input_tokens"] + summary["output_tokens"]
+        return summary.sort_values("total_tokens", ascending=False).head(limit)
+
+    def prompt_history(self, model=None, since=None):
+        """
+        프롬프트 버전별 집계 (처음 사용 시각 순) — 프롬프트 수정 후 토큰/지연이 늘었는지 비교
+        Return: DataFrame [model, prompt_hash, first_seen, last_seen, calls, input_avg, output_avg, latency_avg, latency_p95]
+        """
+        calls = self.load(since)
+        if model is not None:
+            calls = calls[calls["model"] == model]
+        if calls.empty:
+            return pd.DataFrame(columns=["model", "prompt_hash", "first_seen", "last_seen", "calls", "input_avg",
+                                         "output_avg", "latency_avg", "latency_p95"])
+        history = calls.groupby(["model", "prompt_hash"]).agg(
+            first_seen=("ts", "min"),
+            last_seen=("ts", "max"),
+            calls=("ts", "size"),
+            input_avg=("input_tokens", "mean"),
+            output_avg=("output_tokens", "mean"),
+            latency_avg=("latency", "mean"),
+            latency_p95=("latency", lambda s: s.quantile(0.95)),
+        ).reset_index().sort_values(["model", "first_seen"])
+        for column in ("first_seen", "last_seen"):
+            history[column] = pd.to_datetime(history[column], unit="s")
+        return history
+
+    def prompt_text(self, p_hash):
+        self.flush()
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT text FROM prompts WHERE prompt_hash = ?", (p_hash,)).fetchone()
+        finally:
+            conn.close()
+        return row[0] if row else None
+
+    def runs(self, limit=20):
+        """최근 실행(run_id)별 시작/종료 시각, 호출 수, 토큰, 추정 비용"""
+        calls = self.load()
+        if calls.empty:
+            return pd.DataFrame(columns=["run_id", "started", "ended", "calls", "input_tokens", "output_tokens", "cost_usd"])
+        calls = calls.assign(cost_usd=estimate_cost(calls))
+        runs = calls.groupby("run_id").agg(
+            started=("ts", "min"),
+            ended=("ts", "max"),
+            calls=("ts", "size"),
+            input_tokens=("input_tokens", "sum"),
+            output_tokens=("output_tokens", "sum"),
+            cost_usd=("cost_usd", "sum"),
+        ).reset_index().sort_values("started", ascending=False).head(limit)
+        for column in ("started", "ended"):
+            runs[column] = pd.to_datetime(runs[column], unit="s")
+        return runs
+
+
+def estimate_cost(calls):
+    """호출 행별 추정 비용(USD), 단가 미등록 모델은 0"""
+    prices_in = calls["model"].map(lambda m: TOKEN_PRICES.get(m, (0.0, 0.0))[0])
+    prices_out = calls["model"].map(lambda m: TOKEN_PRICES.get(m, (0.0, 0.0))[1])
+    return (calls["input_tokens"].fillna(0) * prices_in + calls["output_tokens"].fillna(0) * prices_out) / 1_000_000
+
+
+_default_ledger = None
+_default_lock = threading.Lock()
+
+def get_ledger():
+    """프로세스 공용 장부 (LEDGER_PATH 가 비어 있으면 None)"""
+    global _default_ledger
+    if not LEDGER_PATH:
+        return None
+    with _default_lock:
+        if _default_ledger is None:
+            _default_ledger = UsageLedger(LEDGER_PATH)
+            atexit.register(_default_ledger.flush)
+        return _default_ledger
+
+
+# ---------- 호출 태그 컨텍스트 ----------
+# 제공사 호출 지점에서는 상품 정보를 모르므로, 분석 함수가 스레드 로컬로 prdNo/카테고리를 지정
+_context = threading.local()
+
+def current_tags():
+    return dict(getattr(_context, "tags", None) or {})
+
+@contextmanager
+def tags(**values):
+    """이 블록에서(현재 스레드) 기록되는 호출에 붙일 태그 (prd_no=, category=)"""
+    previous = getattr(_context, "tags", None)
+    _context.tags = {**(previous or {}), **{k: v for k, v in values.items() if v is not None}}
+    try:
+        yield
+    finally:
+        _context.tags = previous
+
+def bind(fn):
+    """현재 태그를 고정한 함수 (스레드 풀에 제출할 때 태그 전달용)"""
+    captured = current_tags()
+
+    def _run(*args, **kwargs):
+        with tags(**captured):
+            return fn(*args, **kwargs)
+    return _run
+
+def _split_usage(usage, parts):
+    """토큰/이미지 수를 parts 개로 나눔 (나머지는 앞쪽부터 1씩 → 합계 보존, 값이 없으면 None 유지)"""
+    shares = [{} for _ in range(parts)]
+    for name, value in usage.items():
+        for i, share in enumerate(shares):
+            share[name] = None if value is None else int(value) // parts + (1 if i < int(value) % parts else 0)
+    return shares
+
+def record_call(model, provider, system_prompt, schema, usage, latency, outcome, response=None, images=0, priority=None):
+    """
+    제공사 호출 1회 기록 (장부 비활성/오류여도 호출 흐름에는 영향 없음)
+    response 가 묶음 응답(items)이면 항목별 prdNo / ai_category_L 로 나눠 기록
+    """
+    ledger = get_ledger()
+    if ledger is None:
+        return
+    context = current_tags()
+    items = getattr(response, "items", None)
+    try:
+        if isinstance(items, list) and items:
+            usage = dict(usage, images=usage.get("images", images))
+            for item, share in zip(items, _split_usage(usage, len(items))):
+                ledger.record(model, provider, system_prompt, schema, share, latency, outcome,
+                              category=getattr(item, "ai_category_L", None) or context.get("category"),
+                              prd_no=getattr(item, "prdNo", None) or context.get("prd_no"), priority=priority)
+            return
+        category = getattr(response, "ai_category_L", None) or context.get("category")
+        ledger.record(model, provider, system_prompt, schema, usage, latency, outcome,
+                      category=category, prd_no=context.get("prd_no"), priority=priority, images=images)
+    except Exception as e:
+        print(f"⚠️ 호출 장부 기록 실패: {e}")
@@ -0,0 +1,113 @@
+import math
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+# ==========================================
+# 프로세스 공용 지표(카운터/지연시간) 수집기
+# - 스레드 안전, 외부 의존성 없음
+# - 지표 이름 + 라벨(model=..., category=...) 조합별로 집계
+# ==========================================
+MAX_SAMPLES = 5000 # 지연시간 표본은 지표별 최근 N개만 보관 (메모리 상한)
+
+_lock = threading.Lock()
+_counters = defaultdict(float)
+_samples = defaultdict(lambda: deque(maxlen=MAX_SAMPLES))
+_labels = {} # key -> (name, labels) 역참조
+
+
+def _key(name, labels):
+    if not labels:
+        key = name
+    else:
+        label_str = ",".join(f"{k}={v}" for k, v in sorted(labels.items()))
+        key = f"{name}{{{label_str}}}"
+    if key not in _labels:
+        _labels[key] = (name, dict(labels))
+    return key
+
+def incr(name, value=1, **labels):
+    """카운터 증가"""
+    with _lock:
+        _counters[_key(name, labels)] += value
+
+def observe(name, value, **labels):
+    """지연시간 등 분포형 값 기록"""
+    with _lock:
+        _samples[_key(name, labels)].append(value)
+
+@contextmanager
+def timed(name, **labels):
+    """with 블록의 실행 시간(초)을 기록"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+def get_counter(name, **labels):
+    with _lock:
+        return _counters.get(_key(name, labels), 0)
+
+def get_samples(name, **labels):
+    with _lock:
+        return list(_samples.get(_key(name, labels), []))
+
+def get_counters_by_name(name):
+    """
+    같은 이름의 카운터를 라벨별로 반환
+    Return: [(labels: dict, value), ...]
+    """
+    with _lock:
+        return [
+            (labels, _counters[key])
+            for key, (metric_name, labels) in _labels.items()
+            if metric_name == name and key in _counters
+        ]
+
+def get_samples_by_name(name):
+    """
+    같은 이름의 지연시간 표본을 라벨별로 반환
+    Return: [(labels: dict, [값, ...]), ...]
+    """
+    with _lock:
+        return [
+            (labels, list(_samples[key]))
+            for key, (metric_name, labels) in _labels.items()
+            if metric_name == name and key in _samples
+        ]
+
+def percentile(values, q):
+    """q: 0~100 사이 백분위 (최근접 순위 방식)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[idx]
+
+def snapshot():
+    """현재까지의 모든 지표를 dict로 반환 (대시보드/헬스체크용)"""
+    with _lock:
+        counters = dict(_counters)
+        samples = {k: list(v) for k, v in _samples.items()}
+
+    timings = {}
+    for key, values in samples.items():
+        if not values:
+            continue
+        timings[key] = {
+            "count": len(values),
+            "avg": sum(values) / len(values),
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "p99": percentile(values, 99),
+            "max": max(values),
+        }
+    return {"counters": counters, "timings": timings}
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _samples.clear()
+        _labels.clear()
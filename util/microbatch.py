@@ -0,0 +1,232 @@
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from util import metrics, scheduler
+
+# ==========================================
+# 마이크로 배치 분석 큐 (로컬 추출 서비스용)
+# - 짧은 시간(max_wait) 안에 들어온 요청을 모아 한 번에 처리
+#   · 같은 상품번호 요청은 1회만 조회/분석 후 결과 공유
+#   · 텍스트 전용 요청은 packed 호출로 묶어서 분석
+# - 대기열이 가득 차면 QueueFullError (서비스에서는 429 로 응답)
+# ==========================================
+DEFAULT_QUEUE_SIZE = 200
+DEFAULT_MAX_BATCH = 16
+DEFAULT_MAX_WAIT_SECONDS = 0.05
+DEFAULT_WORKERS = 8
+DEFAULT_PACK_SIZE = 5
+JOB_RETENTION = 5000 # 완료된 작업 결과 보관 개수 (비동기 조회용)
+
+
+class QueueFullError(Exception):
+    """대기열 포화 (호출 측에서 잠시 후 재시도)"""
+
+
+class ExtractJob:
+    def __init__(self, prd_no, options):
+        self.id = uuid.uuid4().hex
+        self.prd_no = str(prd_no)
+        self.options = options
+        self.status = "queued" # queued → running → done | error
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self._done = threading.Event()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def finish(self, result=None, error=None):
+        self.result = result
+        self.error = error
+        self.status = "error" if error or result is None else "done"
+        if self.status == "error" and self.error is None:
+            self.error = "analysis_failed"
+        self.finished_at = time.time()
+        self._done.set()
+
+    def to_dict(self):
+        data = {"job_id": self.id, "prdNo": self.prd_no, "status": self.status}
+        if self.finished_at is not None:
+            data["elapsed_seconds"] = round(self.finished_at - self.created_at, 3)
+        if self.result is not None:
+            data["result"] = self.result.model_dump()
+            data["provenance"] = getattr(self.result, "_provenance", None) or {}
+        if self.error:
+            data["error"] = self.error
+        return data
+
+
+def _options_key(options):
+    return tuple(sorted(options.items()))
+
+
+class MicroBatcher:
+    """
+    fetch_fn(prd_no) -> product_df
+    analyze_fn(product_df, **options) -> result (단건)
+    packed_fn(product_rows, pack_size=, model_name=) -> {prdNo: result} (텍스트 전용 묶음)
+    """
+    def __init__(self, fetch_fn, analyze_fn, packed_fn=None, queue_size=DEFAULT_QUEUE_SIZE, max_batch=DEFAULT_MAX_BATCH,
+                 max_wait=DEFAULT_MAX_WAIT_SECONDS, workers=DEFAULT_WORKERS, pack_size=DEFAULT_PACK_SIZE):
+        self.fetch_fn = fetch_fn
+        self.analyze_fn = analyze_fn
+        self.packed_fn = packed_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.pack_size = pack_size
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="extract")
+        # 실행 중 배치 수 상한: 워커가 모두 바쁘면 요청은 대기열에 남아 백프레셔(429)가 동작
+        self._slots = threading.BoundedSemaphore(workers)
+        self._jobs = OrderedDict()
+        self._jobs_lock = threading.Lock()
+        self._inflight = 0
+        self._inflight_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="microbatch-dispatcher", daemon=True)
+        self._dispatcher.start()
+
+    # ---------- 제출/조회 ----------
+    def submit(self, prd_no, **options):
+        job = ExtractJob(prd_no, options)
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            metrics.incr("extract_rejected")
+            raise QueueFullError(f"queue full ({self._queue.maxsize})")
+        with self._jobs_lock:
+            self._jobs[job.id] = job
+            while len(self._jobs) > JOB_RETENTION:
+                oldest_id, oldest = next(iter(self._jobs.items()))
+                if oldest.finished_at is None:
+                    break
+                self._jobs.pop(oldest_id)
+        metrics.incr("extract_submitted")
+        return job
+
+    def get_job(self, job_id):
+        with self._jobs_lock:
+            return self._jobs.get(job_id)
+
+    def stats(self):
+        with self._inflight_lock:
+            inflight = self._inflight
+        return {
+            "queue_depth": self._queue.qsize(),
+            "queue_capacity": self._queue.maxsize,
+            "inflight_batches": inflight,
+            "max_batch": self.max_batch,
+            "max_wait_seconds": self.max_wait,
+        }
+
+    def shutdown(self):
+        self._stopped.set()
+        self._dispatcher.join(timeout=5)
+        self._pool.shutdown(wait=True)
+
+    # ---------- 배치 수집 ----------
+    def _dispatch_loop(self):
+        while not self._stopped.is_set():
+            if not self._slots.acquire(timeout=0.5):
+                continue
+            try:
+                first = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                self._slots.release()
+                continue
+            batch = [first]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            metrics.observe("extract_batch_size", len(batch))
+            with self._inflight_lock:
+                self._inflight += 1
+            try:
+                self._pool.submit(self._run_batch, batch)
+            except RuntimeError as e:
+                # 종료 중 (풀이 이미 닫힘)
+                for job in batch:
+                    job.finish(error=str(e))
+                return
+
+    # ---------- 배치 실행 ----------
+    def _run_batch(self, batch):
+        try:
+            # 옵션이 같은 요청끼리, 그 안에서 같은 상품번호끼리 묶음
+            groups = {}
+            for job in batch:
+                job.status = "running"
+                groups.setdefault(_options_key(job.options), {}).setdefault(job.prd_no, []).append(job)
+            metrics.incr("extract_coalesced", len(batch) - sum(len(g) for g in groups.values()))
+
+            for key, jobs_by_prd in groups.items():
+                options = dict(key)
+                # 요청별 우선순위(util.scheduler)는 분석 옵션이 아니라 실행 컨텍스트로 전달
+                with scheduler.priority(options.pop("priority", None) or scheduler.DEFAULT_PRIORITY):
+                    self._run_group(options, jobs_by_prd)
+        except Exception as e:
+            print(f"❌ 마이크로 배치 처리 실패: {e}")
+            for job in batch:
+                if not job.wait(0):
+                    job.finish(error=str(e))
+        finally:
+            with self._inflight_lock:
+                self._inflight -= 1
+            self._slots.release()
+
+    def _run_group(self, options, jobs_by_prd):
+        prd_nos = list(jobs_by_prd)
+        with metrics.timed("extract_stage_latency", stage="fetch"):
+            fetched = list(self._pool_map(self.fetch_fn, prd_nos))
+
+        product_rows = {}
+        for prd_no, product_df in zip(prd_nos, fetched):
+            if product_df is None or isinstance(product_df, str) or product_df.empty:
+                self._finish(jobs_by_prd[prd_no], error="product_not_found")
+            else:
+                product_rows[prd_no] = product_df
+
+        # 텍스트 전용 + 전체 스키마 요청은 packed 호출로 묶음
+        packable = self.packed_fn is not None and not options.get("use_images", True) \
+            and options.get("require_description", True) and not options.get("use_rules", False) \
+            and not options.get("route_category", False)
+        with metrics.timed("extract_stage_latency", stage="analyze"):
+            if packable and len(product_rows) > 1:
+                results = self.packed_fn(list(product_rows.values()), pack_size=self.pack_size,
+                                         model_name=options.get("model_name"))
+                for prd_no in product_rows:
+                    self._finish(jobs_by_prd[prd_no], result=results.get(prd_no))
+            else:
+                def _analyze(item):
+                    prd_no, product_df = item
+                    try:
+                        return prd_no, self.analyze_fn(product_df, **options), None
+                    except Exception as e:
+                        return prd_no, None, str(e)
+
+                for prd_no, result, error in self._pool_map(_analyze, list(product_rows.items())):
+                    self._finish(jobs_by_prd[prd_no], result=result, error=error)
+
+    def _pool_map(self, fn, items):
+        # 배치 실행 스레드 자신도 풀 소속이므로, 풀 고갈(교착)을 피하기 위해 별도 단기 스레드 사용
+        if len(items) <= 1:
+            return list(map(fn, items))
+        with ThreadPoolExecutor(max_workers=min(len(items), self.max_batch)) as pool:
+            return list(pool.map(scheduler.bind(fn), items))
+
+    def _finish(self, jobs, result=None, error=None):
+        for job in jobs:
+            job.finish(result=result, error=error)
+            metrics.incr("extract_completed", status=job.status)
+            metrics.observe("extract_latency", job.finished_at - job.created_at)
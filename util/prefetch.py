@@ -0,0 +1,202 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from util import metrics, scheduler
+from util.blob_store import get_blob_store
+from util.image_pool import encode_images
+from util.product import getProductInfo, getProductInfoFromEs, build_user_content, select_image_urls
+
+# ==========================================
+# 검색 결과 선행 준비 (speculative prefetch)
+# - 화면에 보이는 검색 결과 상품의 상세정보 / 상세설명 텍스트 / 이미지 조각을 클릭 전에 미리 준비
+# - LLM 호출은 하지 않음 (네트워크/CPU 작업만) → 클릭하면 바로 모델 호출
+# - 워커 수(PREFETCH_WORKERS), 한 번에 예약하는 상품 수(PREFETCH_LIMIT), 보관 수(MAX_ENTRIES) 로 제한
+# - 검색어/페이지가 바뀌면 화면에서 사라진 상품의 대기 작업은 취소, 실행 중인 작업은 단계 사이에서 중단
+# - bulk 우선순위로 실행 (util.scheduler) → 클릭한 상품의 실제 분석이 항상 먼저 슬롯을 받음
+# - 이미지 조각은 프로세스 공용 Blob 저장소(util.blob_store, 용량 상한 + LRU)에 바이트로 두고 세션에는 참조만 보관
+#   → data URI 는 모델 호출 직전에 만듦 (제거되어 없으면 호출하는 쪽에서 다시 변환)
+# ==========================================
+PREFETCH_WORKERS = int(os.environ.get("PREFETCH_WORKERS", "2"))
+PREFETCH_LIMIT = int(os.environ.get("PREFETCH_LIMIT", "10")) # 화면 앞쪽부터 예약할 상품 수
+MAX_ENTRIES = 20 # 세션별 보관 수 (이미지 조각이 커서 작게 유지, 오래된 완료 항목부터 정리)
+PREFETCH_PRIORITY = "bulk"
+TAKE_TIMEOUT = 30 # 실행 중인 준비 작업을 기다리는 최대 시간(초)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def _get_executor():
+    """프로세스 공용 워커 풀 (세션이 많아도 동시 준비 작업 수는 PREFETCH_WORKERS 로 고정)"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="prefetch")
+        return _executor
+
+
+def _failed(future):
+    return future.done() and (future.cancelled() or future.exception() is not None)
+
+
+class PrefetchCancelled(Exception):
+    """화면에서 사라진 상품의 준비 작업 중단"""
+
+
+class PrefetchedProduct:
+    """
+    분석 직전까지 준비된 상품 1건 (analyze_product_with_full_context(prefetched=...) 로 전달)
+    image_refs: [(url, List[Blob 저장소 키]), ...] — 이미지 미사용으로 준비했으면 None
+    """
+    def __init__(self, product_df, user_content, clean_desc, image_refs, model_name, max_images, detail_images=False):
+        self.product_df = product_df
+        self.user_content = user_content
+        self.clean_desc = clean_desc
+        self.image_refs = image_refs
+        self.model_name = model_name
+        self.max_images = max_images
+        self.detail_images = detail_images
+
+    def matches(self, model_name, max_images, use_images, detail_images=False):
+        """준비할 때와 같은 조건(모델별 렌디션/조각 크기, 장수, 상세설명 이미지 포함 여부)인지"""
+        if not use_images:
+            return True
+        return (self.image_refs is not None and self.model_name == model_name and self.max_images == max_images
+                and self.detail_images == detail_images)
+
+    def load_images(self):
+        """
+        encode_images 형식 [(url, List[data uri]), ...] 으로 복원 (모델 호출 직전에 사용)
+        준비하지 않았거나 저장소에서 하나라도 제거되었으면 None
+        """
+        if self.image_refs is None:
+            return None
+        blob_store = get_blob_store()
+        images = []
+        for url, refs in self.image_refs:
+            data_uris = [blob_store.get_data_uri(ref) for ref in refs]
+            if any(data_uri is None for data_uri in data_uris):
+                metrics.incr("prefetch", outcome="evicted")
+                return None
+            images.append((url, data_uris))
+        return images
+
+
+class Prefetcher:
+    """세션(화면) 1개의 선행 준비 상태 — 워커 풀은 프로세스 공용"""
+    def __init__(self, limit=PREFETCH_LIMIT, max_entries=MAX_ENTRIES):
+        self.limit = limit
+        self.max_entries = max_entries
+        self._entries = OrderedDict() # prdNo -> (future, (model_name, max_images, use_images, detail_images))
+        self._wanted = set() # 현재 화면에 보이는 상품 (여기서 빠지면 실행 중인 작업도 중단)
+        self._lock = threading.Lock()
+
+    def prefetch(self, items, model_name, use_images=True, max_images=6, detail_images=False):
+        """
+        화면에 보이는 검색 결과(process_es_hit_to_display 형식) 앞쪽 limit 건을 준비 예약
+        같은 조건으로 이미 예약/완료된 상품은 다시 예약하지 않음
+        """
+        items = [item for item in items if item.get('prdNo')][:self.limit]
+        spec = (model_name, max_images, use_images, detail_images)
+        with self._lock:
+            self._wanted = {item['prdNo'] for item in items}
+            for prd_no, (future, _) in list(self._entries.items()):
+                if prd_no not in self._wanted and not future.done() and future.cancel():
+                    self._entries.pop(prd_no)
+                    metrics.incr("prefetch", outcome="cancelled")
+            for item in items:
+                entry = self._entries.get(item['prdNo'])
+                if entry is not None and entry[1] == spec and not _failed(entry[0]):
+                    continue
+                future = _get_executor().submit(self._prepare, item, model_name, use_images, max_images, detail_images)
+                self._entries[item['prdNo']] = (future, spec)
+                metrics.incr("prefetch", outcome="scheduled")
+            self._evict()
+
+    def cancel(self):
+        """대기 중인 준비 작업 전부 취소 (새 검색 시)"""
+        self.prefetch([], None)
+
+    def take(self, prd_no, model_name, use_images=True, max_images=6, detail_images=False):
+        """
+        클릭한 상품의 준비 결과 (없거나 조건이 다르면 None → 호출한 쪽에서 직접 조회/변환)
+        - 아직 시작 전이면 취소하고 None (클릭 처리가 interactive 로 직접 하는 편이 빠름)
+        - 준비 중이면 끝날 때까지 대기 (중복 다운로드 방지)
+        """
+        with self._lock:
+            entry = self._entries.get(prd_no)
+        if entry is None:
+            metrics.incr("prefetch", outcome="miss")
+            return None
+        future, _ = entry
+        if not future.done() and future.cancel():
+            with self._lock:
+                self._entries.pop(prd_no, None)
+            metrics.incr("prefetch", outcome="not_started")
+            return None
+        outcome = "hit" if future.done() else "running"
+        try:
+            prefetched = future.result(timeout=TAKE_TIMEOUT)
+        except (CancelledError, TimeoutError, Exception) as e:
+            print(f"⚠️ 선행 준비 결과 사용 불가 ({prd_no}): {e}")
+            prefetched = None
+        if prefetched is None or not prefetched.matches(model_name, max_images, use_images, detail_images):
+            metrics.incr("prefetch", outcome="unusable")
+            return None
+        metrics.incr("prefetch", outcome=outcome)
+        return prefetched
+
+    def _check(self, prd_no):
+        if prd_no not in self._wanted:
+            raise PrefetchCancelled(prd_no)
+
+    def _prepare(self, item, model_name, use_images, max_images, detail_images):
+        prd_no = item['prdNo']
+        with scheduler.priority(PREFETCH_PRIORITY):
+            with metrics.timed("prefetch_latency", stage="detail"):
+                if item.get('raw_data'):
+                    product_df = getProductInfoFromEs(item['raw_data'])
+                else:
+                    product_df = getProductInfo(prd_no)
+            if product_df is None or isinstance(product_df, str) or product_df.empty:
+                return None
+            self._check(prd_no)
+
+            with metrics.timed("prefetch_latency", stage="text"):
+                user_content, clean_desc = build_user_content(product_df)
+            self._check(prd_no)
+
+            image_refs = None
+            if use_images:
+                with metrics.timed("prefetch_latency", stage="images"):
+                    image_urls = select_image_urls(product_df.iloc[0], max_images, detail_images)
+                    self._check(prd_no)
+                    if image_urls:
+                        blob_store = get_blob_store()
+                        image_refs = [
+                            (url, [blob_store.put_data_uri(data_uri) for data_uri in data_uris])
+                            for url, data_uris in encode_images(image_urls, model_name, max_images)
+                        ]
+        return PrefetchedProduct(product_df, user_content, clean_desc, image_refs, model_name, max_images, detail_images)
+
+    def _evict(self):
+        # (잠금 보유 상태에서 호출) 화면에 없는 완료 항목부터 정리
+        overflow = len(self._entries) - self.max_entries
+        if overflow <= 0:
+            return
+        for prd_no in [k for k, (f, _) in self._entries.items() if f.done() and k not in self._wanted][:overflow]:
+            self._entries.pop(prd_no)
+
+
+def get_prefetch_stats():
+    """
+    선행 준비 결과 집계
+    Return: {"scheduled": n, "cancelled": n, "hit": n, "running": n, "not_started": n, "miss": n, "unusable": n,
+             "evicted": 준비한 이미지가 저장소에서 제거되어 다시 변환한 횟수, "hit_rate": 클릭 중 준비 결과를 사용한 비율}
+    """
+    stats = {outcome: 0 for outcome in ("scheduled", "cancelled", "hit", "running", "not_started", "miss", "unusable", "evicted")}
+    for labels, value in metrics.get_counters_by_name("prefetch"):
+        stats[labels["outcome"]] = stats.get(labels["outcome"], 0) + int(value)
+    clicks = sum(stats[k] for k in ("hit", "running", "not_started", "miss", "unusable"))
+    stats["hit_rate"] = (stats["hit"] + stats["running"]) / clicks if clicks else 0.0
+    return stats
@@ -1,14 +1,21 @@
-import requests
+from util.transport import http_get
 import pandas as pd
 import json
 import ast
-from util.image import encode_image_to_base64_chunk, extract_all_valid_images
+from util.image import extract_all_valid_images, extract_img_for_html
+from util.image_pool import encode_images
 from bs4 import BeautifulSoup
 from requests.exceptions import HTTPError
 from ai.model import call_ai_service
-
-# 상품api 에서 상품정보 추출
-def getProductInfo(prd_no):
+from prompts.product import DEFAULT_SYSTEM_PROMPT, PACKED_PROMPT_SUFFIX, COMPACT_PROMPT_SUFFIX, ATTRIBUTES_ONLY_PROMPT_SUFFIX
+from schema.product import ProductSchema, ProductBatchSchema, PRODUCT_FIELDS, build_partial_schema, merge_partial_result, \
+    compact_schema_for, decode_compact_result
+from util import ledger, metrics, search
+from util.rules import apply_rules, format_known_values
+from util.category_route import route_product
+
+# 상품api 원본 JSON 조회 (실패 시 None)
+def _fetch_product_json(prd_no):
     url = f"https://hapix.halfclub.com/product/products/withoutPrice/{prd_no}"
 
     payload = {
@@ -20,18 +27,82 @@ def getProductInfo(prd_no):
     }
 
     try:
-        response = requests.get(url, params=payload, timeout=5)
+        response = http_get(url, params=payload, timeout=5)
         response.raise_for_status()
-        data = response.json()
-
-        result = getPrdInfoByJson(data)
-        return result
+        return response.json()
     
     except HTTPError as http_err:
         print(f"HTTP error ocurred:, {http_err}")
     except Exception as err:
         print(f"Orther error occured: {err}")
 
+# 상품api 에서 상품정보 추출
+def getProductInfo(prd_no):
+    data = _fetch_product_json(prd_no)
+    if data is None:
+        return None
+    try:
+        return getPrdInfoByJson(data)
+    except Exception as err:
+        print(f"Orther error occured: {err}")
+
+# 검색 결과(ES _source) 에서 상품정보 추출 (상세 API 왕복 생략)
+def getProductInfoFromEs(es_source, mode=None):
+    """
+    검색 hit 의 raw_data 로 바로 정규화 (getProductInfo 와 같은 형식의 DataFrame 반환)
+    mode: "description" | "skip" | "off" (기본: util.search.ES_FAST_PATH_MODE, 설명은 util/search.py 참고)
+    결과(hit / partial / miss / off)는 es_fast_path 지표로 기록 — 상세 API 를 실제로 호출하지 않은 경우만 hit
+    상세설명 보충 호출이 실패하면 getProductInfo 로 대체
+    """
+    mode = mode or search.ES_FAST_PATH_MODE
+    prd_no = es_source.get('prdNo')
+    if mode == "off":
+        metrics.incr("es_fast_path", outcome="off")
+        return getProductInfo(prd_no)
+
+    mapped = search.map_es_to_internal_schema(es_source)
+    missing = search.es_missing_fields(mapped)
+    supplement = search.es_missing_fields(mapped, search.ES_SUPPLEMENT_FIELDS)
+    if missing == ['productImage'] and mode == "description":
+        # 이미지 객체만 없는 경우: 어차피 상세 API 를 호출하므로 이미지도 상세 API 값으로 보충 (skip 모드는 누락으로 처리)
+        metrics.incr("es_fast_path_missing", field="productImage")
+        missing, supplement = [], supplement + ['productImage']
+    if missing:
+        for field in missing:
+            metrics.incr("es_fast_path_missing", field=field)
+        metrics.incr("es_fast_path", outcome="miss")
+        return getProductInfo(prd_no)
+
+    outcome = "hit"
+    if supplement and mode == "description":
+        # 상세설명/정보고시만 상세 API 에서 보충 (나머지는 ES 값 유지, 조건부 요청 캐시 적용)
+        detail = _fetch_product_json(prd_no)
+        detail = detail.get('data', detail) if isinstance(detail, dict) else None
+        if not isinstance(detail, dict):
+            metrics.incr("es_fast_path", outcome="miss")
+            return getProductInfo(prd_no)
+        for field in supplement:
+            mapped[field] = detail.get(field)
+        outcome = "partial"
+
+    metrics.incr("es_fast_path", outcome=outcome)
+    return getPrdInfoByJson(mapped)
+
+def get_es_fast_path_stats():
+    """
+    ES fast path 결과 집계
+    Return: {"hit": n, "partial": n, "miss": n, "off": n, "hit_rate": 상세 API 를 전혀 호출하지 않은 비율,
+             "detail_calls": 상세 API 를 호출한 건수 (partial 포함), "missing": {필드: 누락 횟수}}
+    """
+    stats = {outcome: 0 for outcome in ("hit", "partial", "miss", "off")}
+    for labels, value in metrics.get_counters_by_name("es_fast_path"):
+        stats[labels["outcome"]] = stats.get(labels["outcome"], 0) + int(value)
+    total = sum(stats.values())
+    stats["hit_rate"] = stats["hit"] / total if total else 0.0
+    stats["detail_calls"] = stats["partial"] + stats["miss"] + stats["off"]
+    stats["missing"] = {labels["field"]: int(value) for labels, value in metrics.get_counters_by_name("es_fast_path_missing")}
+    return stats
+
 # json 데이터 정규화
 def getPrdInfoByJson(data):
     """
@@ -183,29 +254,25 @@ def format_product_metadata(rowData):
 
     return meta_text
 
-# 상품정보 기반 스타일, 속성, 카테고리 등 추론
-def analyze_product_with_full_context(html_content, model_name="gemini-2.5-flash-lite", max_images=6, use_images=True, system_prompt=None):
+# HTML 상세설명 정제
+def extract_clean_desc(html_desc, max_chars=6000):
     """
-    이미지 + HTML설명 + 메타데이터(브랜드, 스펙, 옵션)를 모두 통합하여 분석
+    상세설명 HTML에서 텍스트만 추출합니다. (구조감을 살리기 위해 줄바꿈 유지)
     """
-    
-    # 1. 메타데이터 텍스트 생성
-    metadata_text = format_product_metadata(html_content)
-    
-    # 2. HTML 상세설명 (기존 로직)
-    row = html_content.iloc[0]
-
-    # 대표이미지(추가이미지 포함)
-    basic_ext_nm = row.get('prdImg', '')
-    # basic_ext_nm = f"https://cdn2.halfclub.com/rimg/330x440/contain/{basic_ext_nm}?format=webp"
-
-    html_desc = row.get('prdDesc', '')
     if html_desc:
         soup = BeautifulSoup(html_desc, 'html.parser')
-        # 텍스트 추출 (구조감을 살리기 위해 줄바꿈 유지)
-        clean_desc = soup.get_text(separator="\n", strip=True)[:6000] # 컨텍스트 조금 더 확보
-    else:
-        clean_desc = "(상세설명 없음)"
+        return soup.get_text(separator="\n", strip=True)[:max_chars] # 컨텍스트 조금 더 확보
+    return "(상세설명 없음)"
+
+# AI에게 전달할 유저 메시지 생성
+def build_user_content(html_content):
+    """
+    메타데이터 + 상세설명 텍스트를 구분해서 유저 메시지로 만듭니다.
+    Return: (user_content, clean_desc)
+    """
+    metadata_text = format_product_metadata(html_content)
+    row = html_content.iloc[0]
+    clean_desc = extract_clean_desc(row.get('prdDesc', ''))
 
     # 유저 메시지에 메타데이터와 상세설명을 구분해서 주입
     user_content = f"""
@@ -217,51 +284,323 @@ def analyze_product_with_full_context(html_content, model_name="gemini-2.5-flash
         [상세 페이지 문구]
         {clean_desc}
         """
+    return user_content, clean_desc
+
+# 유사 상품 결과 재사용
+def _reuse_duplicate_result(html_content, user_content, dup_prd_no, score, dup_result, model_name, system_prompt,
+                            regenerate_description=False, hedge=None):
+    """
+    유사 상품의 기존 분석 결과를 복사합니다. (기본 정보는 현재 상품 값, 속성 출처는 duplicate:<prdNo>)
+    regenerate_description=True 이면 description 만 새로 생성합니다.
+    """
+    row = html_content.iloc[0]
+    values = dict(dup_result)
+    values.update({"prdNo": str(row.get("prdNo")), "prdNm": row.get("prdNm"), "brandNm": row.get("brandNm")})
+    provenance = {
+        name: {"source": f"duplicate:{dup_prd_no}", "confidence": round(score, 3)}
+        for name in values if name not in ("prdNo", "prdNm", "brandNm")
+    }
+
+    if not regenerate_description:
+        return merge_partial_result(None, values, provenance)
+
+    # 설명 재생성이 실패해도 유사 상품의 설명으로 결과를 돌려줌 (호출 오류가 배치/마이크로배치 전체로 번지지 않도록)
+    try:
+        partial = _request_description(
+            {k: v for k, v in values.items() if k != "description"}, user_content, model_name, system_prompt, hedge=hedge
+        )
+    except Exception as e:
+        print(f"⚠️ 유사 상품 설명 재생성 실패 → 기존 설명 유지: {row.get('prdNo')} ({e})")
+        partial = None
+    if partial is None or not getattr(partial, "description", None):
+        metrics.incr("dedup_description_fallback")
+        return merge_partial_result(None, values, provenance)
+    provenance.pop("description", None)
+    return merge_partial_result(partial, values, provenance)
+
+def _request_description(known_values, user_content, model_name, system_prompt, image_list=None, hedge=None):
+    """확정된 속성을 근거로 description 만 요청 (부분 스키마)"""
+    with ledger.tags(prd_no=known_values.get("prdNo"), category=known_values.get("ai_category_L")):
+        return call_ai_service(
+            system_prompt=system_prompt,
+            user_text=format_known_values(known_values) + user_content,
+            image_list=image_list or [],
+            model_name=model_name,
+            response_schema=build_partial_schema(("description",)),
+            hedge=hedge
+        )
+
+def generate_description(html_content, attributes, model_name="gemini-2.5-flash-lite", image_list=None, system_prompt=None, hedge=None):
+    """
+    2단계 분석의 두 번째 단계: 속성 결과(attributes)를 근거로 description 만 생성합니다.
+    image_list: 1단계에서 보낸 이미지 조각 재사용 (없으면 텍스트만)
+    Return: description 이 채워진 ProductSchema (실패 시 None)
+    """
+    user_content, _ = build_user_content(html_content)
+    values = attributes.model_dump()
+    values.pop("description", None)
+    provenance = dict(getattr(attributes, "_provenance", None) or {})
+    provenance.pop("description", None)
+
+    with metrics.timed("description_latency", model=model_name):
+        partial = _request_description(values, user_content, model_name, system_prompt or DEFAULT_SYSTEM_PROMPT,
+                                       image_list=image_list, hedge=hedge)
+    if partial is None:
+        return None
+    return merge_partial_result(partial, values, provenance)
+
+# 분석에 보낼 이미지 URL 후보
+def select_image_urls(row, max_images=6, detail_images=False):
+    """
+    대표이미지(추가이미지 포함) URL 목록, detail_images=True 이면 상세설명 HTML 이미지를 사전 검사 후 합침
+    """
+    basic_ext_nm = row.get('prdImg') or []
+    if not detail_images:
+        return basic_ext_nm
+    soup = BeautifulSoup(row.get('prdDesc') or '', 'html.parser')
+    return extract_img_for_html(soup, basic_ext_nm, max_images)
+
+# 상품정보 기반 스타일, 속성, 카테고리 등 추론
+def analyze_product_with_full_context(html_content, model_name="gemini-2.5-flash-lite", max_images=6, use_images=True, system_prompt=None, hedge=None,
+                                      use_rules=False, require_description=True, dedup_index=None, regenerate_description=False,
+                                      compact_output=False, route_category=False, prefetched=None, detail_images=False):
+    """
+    이미지 + HTML설명 + 메타데이터(브랜드, 스펙, 옵션)를 모두 통합하여 분석
+    hedge: ai.hedge.HedgePolicy (응답 지연 시 중복 요청, 선택 사항)
+    use_rules: 규칙 기반 사전 추출(util.rules) 후 아직 모르는 필드만 LLM에 요청
+    require_description: False 이면 description 없이 속성만 요청 (2단계 분석의 1단계, 설명은 generate_description 으로 나중에 생성)
+    dedup_index: util.dedup.DuplicateIndex — 유사 상품이 이미 분석되어 있으면 결과를 복사 (regenerate_description=True 면 설명만 재생성)
+    compact_output: 분류형 필드를 짧은 코드(enum)로 받아 라벨로 복원 (출력 토큰 절감)
+    route_category: 전시카테고리로 카테고리별 프롬프트/스키마 선택 (해당 없는 기장 항목은 요청하지 않고 null)
+    prefetched: util.prefetch.PrefetchedProduct — 클릭 전에 미리 만들어 둔 유저 메시지/이미지 조각 (있으면 다시 만들지 않음)
+    detail_images: 상품 이미지 외에 상세설명 HTML 이미지도 사용 (본문 다운로드 전 헤더 검사로 작은/초대형/배너 이미지 제외)
+    """
     
+    system_prompt = system_prompt or DEFAULT_SYSTEM_PROMPT
+
+    # 1~2. 메타데이터 + HTML 상세설명 텍스트 생성
+    if prefetched is not None:
+        user_content, clean_desc = prefetched.user_content, prefetched.clean_desc
+    else:
+        user_content, clean_desc = build_user_content(html_content)
+    row = html_content.iloc[0]
+
     ai_image_inputs = []
     used_image_urls = [] # ★ 실제로 사용된(Base64 변환 성공한) 이미지 URL 저장용
 
+    # --- 2. 스마트 이미지 추출 및 필터링 ---
+    # 대표이미지(추가이미지 포함) + detail_images 이면 상세설명 이미지 (사전 검사 후 상위만)
+    # (검색 화면에서 미리 변환해 둔 조각이 있으면 그대로 사용)
+    prefetched_images, found_images, head_images = None, None, []
     if use_images:
-        # 이미지 추가 (Base64 변환 로직은 기존과 동일하므로 함수 호출로 대체)
-        # --- 2. 스마트 이미지 추출 및 필터링 ---
-        # found_images = extract_img_for_html(soup, basic_ext_nm)
-        found_images = basic_ext_nm
+        prefetched_images = prefetched.load_images() if prefetched is not None else None
+        if prefetched_images is None:
+            found_images = select_image_urls(row, max_images, detail_images)
+        # 유사 상품 조회용으로 대표 이미지 1장만 먼저 변환 (나머지는 중복이 아닐 때만 변환)
+        if dedup_index is not None and found_images:
+            head_images = encode_images(found_images[:1], model_name, 1)
+
+    # 유사 상품 결과 재사용 (재등록/컬러 분리 등)
+    # (이미지 해시는 위에서 변환한 대표 이미지로 계산 → 대표 이미지를 다시 내려받지 않음)
+    fingerprint = None
+    if dedup_index is not None:
+        head_encoded = prefetched_images or head_images
+        dup_prd_no, score, dup_result, fingerprint = dedup_index.find(
+            html_content, clean_desc, image_data_uri=head_encoded[0][1][0] if head_encoded else None
+        )
+        if dup_prd_no is not None:
+            print(f"♻️ 유사 상품 {dup_prd_no} (유사도 {score:.2f}) 분석 결과 재사용: {row.get('prdNo')}")
+            result = _reuse_duplicate_result(
+                html_content, user_content, dup_prd_no, score, dup_result, model_name, system_prompt,
+                regenerate_description=regenerate_description, hedge=hedge
+            )
+            return result, [], [], clean_desc
+
+    # 카테고리 라우팅: 기본 프롬프트면 카테고리별 프롬프트로 교체 (사용자 수정 프롬프트는 스키마만 축소)
+    route_fields = ()
+    if route_category:
+        route = route_product(html_content)
+        route_fields = route.not_applicable
+        metrics.incr("category_route", route=route.name)
+        if system_prompt == DEFAULT_SYSTEM_PROMPT:
+            system_prompt = route.prompt
+
+    # 규칙 기반 사전 추출 / 속성 전용 / 카테고리 라우팅 → LLM 에는 미확정 필드만 요청
+    response_schema = ProductSchema
+    known_values, provenance = {}, {}
+    if not require_description:
+        # description 은 나중에(2단계) 생성 → 긴 설명 작성 규칙은 이번 호출에서 제외
+        provenance["description"] = {"source": "deferred", "confidence": None}
+        system_prompt = system_prompt + ATTRIBUTES_ONLY_PROMPT_SUFFIX
+    if use_rules or not require_description or route_fields:
+        if use_rules:
+            rule_values, rule_provenance = apply_rules(html_content)
+            known_values.update(rule_values)
+            provenance.update(rule_provenance)
+        user_content = format_known_values(known_values) + user_content
+        for name in route_fields:
+            known_values[name] = None
+            provenance[name] = {"source": f"category_route:{route.name}", "confidence": 1.0}
+        unknown_fields = tuple(
+            name for name in PRODUCT_FIELDS
+            if name not in known_values and (require_description or name != "description")
+        )
+        if not unknown_fields:
+            print(f"📐 규칙만으로 모든 필드 확정 → LLM 호출 생략: {row.get('prdNo')}")
+            return merge_partial_result(None, known_values, provenance), [], [], clean_desc
+        response_schema = build_partial_schema(unknown_fields)
 
+    if use_images:
         # 외부 이미지 제한정책으로 인한 로컬 다운로드
-        if found_images:
-            valid_image_count = 0
-
-            for img_url in found_images:
-                # 최대 6장까지만 처리 (비용 및 속도 고려)
-                if valid_image_count >= max_images:
-                    break
-                    
-                # ★ 핵심: URL을 그냥 보내지 않고, Base64로 변환해서 보냄
-                base64_image = encode_image_to_base64_chunk(img_url, model_name)
-                
-                if base64_image:
-                    ai_image_inputs.extend(base64_image)    
-                    used_image_urls.append(base64_image)
-                    valid_image_count += 1
-                    print(f"✅ 이미지 변환 성공: {img_url}")
-                else:
-                    print(f"❌ 이미지 변환 실패 (건너뜀): {img_url}")
+        # (배치 모드에서 파이프라인이 설정되어 있으면 다운로드는 스레드, 변환은 프로세스 풀에서 병렬 처리)
+        encoded_images = []
+        if prefetched_images is not None:
+            encoded_images = prefetched_images
+        elif found_images:
+            # 최대 6장까지만 처리 (비용 및 속도 고려), 유사 상품 조회 때 변환한 대표 이미지는 재사용
+            rest_urls = found_images[1:] if dedup_index is not None else found_images
+            encoded_images = head_images + encode_images(rest_urls, model_name, max_images - len(head_images))
+        for img_url, base64_image in encoded_images:
+            ai_image_inputs.extend(base64_image)    
+            used_image_urls.append(base64_image)
+            print(f"✅ 이미지 변환 성공: {img_url}")
+
+    # 압축 코드 출력: 요청은 코드 스키마로, 응답은 response_schema 로 복원
+    request_schema, request_prompt = response_schema, system_prompt
+    if compact_output:
+        request_schema = compact_schema_for(response_schema)
+        request_prompt = system_prompt + COMPACT_PROMPT_SUFFIX
 
     # --- 4. OpenAI API 호출 ---
     try:
-        response = call_ai_service(
-            system_prompt=system_prompt,
-            user_text=user_content,
-            image_list=ai_image_inputs,
-            model_name=model_name
-        )
+        # 호출 장부 태그: 규칙으로 대분류를 이미 알면 그 값 (아니면 응답의 ai_category_L)
+        with metrics.timed("ai_schema_latency", model=model_name, schema=request_schema.__name__), \
+                ledger.tags(prd_no=str(row.get('prdNo')), category=known_values.get("ai_category_L")):
+            response = call_ai_service(
+                system_prompt=request_prompt,
+                user_text=user_content,
+                image_list=ai_image_inputs,
+                model_name=model_name,
+                response_schema=request_schema,
+                hedge=hedge
+            )
       
         # ★ [핵심 수정] 무조건 3개의 값을 반환해야 합니다!
         if response is None:
             return None, [], [], [] # (1. 결과, 2. 원본 URL들, 3. 크롭 이미지들, 4. 상세설명에서 추출한 text)
+        response = decode_compact_result(response)
+
+        # 부분 스키마로 요청한 경우 규칙 결과와 합쳐서 ProductSchema 로 복원
+        if response_schema is not ProductSchema:
+            response = merge_partial_result(response, known_values, provenance)
+
+        # 새로 분석한 결과는 유사 상품 인덱스에 등록
+        if dedup_index is not None:
+            dedup_index.add(html_content, clean_desc, response, fingerprint)
 
         return response, used_image_urls, ai_image_inputs, clean_desc
         
     except Exception as e:
         print(f"API 호출 중 오류 발생: {e}")
-        return None
\ No newline at end of file
+        return None, [], [], []
+
+# ==========================================
+# [텍스트 전용] 복수 상품 묶음(packed) 분석
+# ==========================================
+def _build_packed_user_content(product_rows):
+    """
+    여러 상품의 메타데이터 + 상세설명을 [상품 N] 블록으로 묶어 하나의 유저 메시지로 만듭니다.
+    """
+    blocks = []
+    for idx, product_df in enumerate(product_rows, start=1):
+        row = product_df.iloc[0]
+        metadata_text = format_product_metadata(product_df)
+        clean_desc = extract_clean_desc(row.get('prdDesc', ''))
+        blocks.append(
+            f"[상품 {idx}] 상품번호(prdNo): {row.get('prdNo')}\n"
+            f"{metadata_text}\n"
+            f"[상세 페이지 문구]\n{clean_desc}\n"
+        )
+
+    return (
+        "다음은 여러 상품에 대한 텍스트 데이터이다. 각 블록의 내용을 해당 상품 분석의 핵심 근거로 삼아라.\n\n"
+        + "\n----------------\n".join(blocks)
+    )
+
+def _match_packed_items(product_rows, items):
+    """
+    입력 상품마다 결과가 정확히 1개씩 있는지 prdNo 기준으로 확인합니다.
+    Return: (matched: {prdNo: 결과}, failed_rows: [입력 DataFrame])
+    """
+    by_prd_no = {}
+    for item in items or []:
+        by_prd_no.setdefault(str(item.prdNo), []).append(item)
+
+    matched, failed_rows = {}, []
+    for product_df in product_rows:
+        prd_no = str(product_df.iloc[0].get('prdNo'))
+        candidates = by_prd_no.get(prd_no, [])
+        if len(candidates) == 1:
+            matched[prd_no] = candidates[0]
+        else:
+            failed_rows.append(product_df)
+    return matched, failed_rows
+
+def analyze_products_packed(product_rows, model_name="gemini-2.5-flash-lite", system_prompt=None, pack_size=5, hedge=None):
+    """
+    이미지 없이(텍스트 전용) 여러 상품을 한 번의 AI 호출로 묶어서 분석합니다.
+    - 시스템 프롬프트/스키마 오버헤드와 왕복 횟수를 pack_size 배로 줄임
+    - 입력 상품마다 결과가 정확히 1개인지 prdNo로 검증
+    - 검증 실패한 상품만 절반씩 쪼개서 재시도, 1개짜리 묶음은 단건 분석으로 처리
+    Return: {prdNo(str): ProductSchema 또는 None}
+    """
+    system_prompt = system_prompt or DEFAULT_SYSTEM_PROMPT
+    packed_prompt = system_prompt + PACKED_PROMPT_SUFFIX
+    results = {}
+
+    # (묶음 단위 작업 스택) 실패한 묶음은 쪼개서 다시 쌓는다
+    pending = [product_rows[i:i + pack_size] for i in range(0, len(product_rows), pack_size)]
+    pending.reverse()
+
+    while pending:
+        pack = pending.pop()
+
+        # 1개짜리 묶음은 일반 단건 분석으로 처리 (묶음 프롬프트 불필요)
+        if len(pack) == 1:
+            prd_no = str(pack[0].iloc[0].get('prdNo'))
+            result, _, _, _ = analyze_product_with_full_context(
+                pack[0], model_name=model_name, use_images=False, system_prompt=system_prompt, hedge=hedge
+            )
+            results[prd_no] = result
+            continue
+
+        try:
+            with ledger.tags(prd_no=",".join(str(r.iloc[0].get('prdNo')) for r in pack)):
+                response = call_ai_service(
+                    system_prompt=packed_prompt,
+                    user_text=_build_packed_user_content(pack),
+                    image_list=[],
+                    model_name=model_name,
+                    response_schema=ProductBatchSchema,
+                    hedge=hedge,
+                    repack=lambda prd_nos, pack=pack: _build_packed_user_content(
+                        [r for r in pack if str(r.iloc[0].get('prdNo')) in prd_nos]
+                    )
+                )
+            items = response.items if response is not None else []
+        except Exception as e:
+            print(f"묶음 분석 API 호출 중 오류 발생 ({len(pack)}건): {e}")
+            items = []
+
+        matched, failed_rows = _match_packed_items(pack, items)
+        results.update(matched)
+        print(f"📦 묶음 분석 {len(pack)}건 중 {len(matched)}건 성공")
+
+        # 실패한 상품만 더 작은 묶음으로 재시도
+        # (일부만 실패하면 실패분만 다시 묶고, 전부 실패하면 절반으로 쪼갠다 → 무한 반복 방지)
+        if failed_rows:
+            group = len(failed_rows) if len(failed_rows) < len(pack) else max(1, len(pack) // 2)
+            for i in range(0, len(failed_rows), group):
+                pending.append(failed_rows[i:i + group])
+
+    return results
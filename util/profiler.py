@@ -0,0 +1,108 @@
+import cProfile
+import io
+import marshal
+import pstats
+import threading
+import time
+import tracemalloc
+
+# ==========================================
+# 단건 분석 온디맨드 프로파일러 (cProfile + tracemalloc)
+# - 외부 도구 없이 운영 데이터에서 느린 상품(거대 prdDesc, 초대형 이미지 등)의 병목 진단
+# - cProfile 은 호출 스레드만 측정 (헤징/이미지 프로세스 풀 내부 작업은 대기 시간으로 보임)
+# - tracemalloc 은 프로세스 전체 기준 → 정확한 메모리 측정은 동시 작업이 없을 때 권장
+# - 프로파일링 실행은 프로세스 안에서 한 번에 1건 (Python 3.12+ 는 프로파일러를 동시에 2개 켤 수 없음)
+#   → 배치 --profile-dir 의 다른 워커 / 다른 Streamlit 세션은 앞 실행이 끝날 때까지 대기
+# ==========================================
+TOP_FUNCTIONS = 30
+TOP_ALLOCATIONS = 15
+TRACEMALLOC_FRAMES = 10
+
+_profile_lock = threading.Lock()
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+
+
+def _start_tracemalloc():
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        _tracemalloc_users += 1
+        tracemalloc.reset_peak()
+
+def _stop_tracemalloc():
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0:
+            tracemalloc.stop()
+
+def profile_call(fn, *args, **kwargs):
+    """
+    fn(*args, **kwargs) 를 cProfile + tracemalloc 아래에서 실행합니다.
+    Return: (fn 반환값, report)
+    report = {
+        "wall_seconds": 실행 시간,
+        "top_functions": 누적시간 상위 함수 (pstats 텍스트),
+        "peak_memory_bytes": 실행 중 최대 추적 메모리,
+        "top_allocations": [{"location", "size_bytes", "count"}, ...] (실행 종료 시점 기준 상위 할당 위치),
+        "prof_bytes": .prof 파일 내용 (snakeviz / pstats 로 열람 가능),
+    }
+    다른 스레드가 프로파일링 중이면 끝날 때까지 기다린 뒤 실행 (대기 시간은 wall_seconds 에 포함하지 않음)
+    """
+    with _profile_lock:
+        profiler = cProfile.Profile()
+        _start_tracemalloc()
+        start = time.perf_counter()
+        try:
+            profiler.enable()
+            try:
+                result = fn(*args, **kwargs)
+            finally:
+                profiler.disable()
+            wall_seconds = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+        finally:
+            _stop_tracemalloc()
+
+    stream = io.StringIO()
+    stats = pstats.Stats(profiler, stream=stream)
+    stats.sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+
+    snapshot = snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ))
+    top_allocations = [
+        {
+            "location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+            "size_bytes": stat.size,
+            "count": stat.count,
+        }
+        for stat in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]
+    ]
+
+    profiler.create_stats()
+    report = {
+        "wall_seconds": wall_seconds,
+        "top_functions": stream.getvalue(),
+        "peak_memory_bytes": peak,
+        "top_allocations": top_allocations,
+        "prof_bytes": marshal.dumps(profiler.stats),
+    }
+    return result, report
+
+def format_report_summary(report):
+    """배치/로그 출력용 요약 텍스트"""
+    lines = [
+        f"실행 시간: {report['wall_seconds']:.2f}s",
+        f"최대 메모리: {report['peak_memory_bytes'] / 1024 / 1024:.1f}MB",
+        "",
+        "[상위 할당 위치]",
+    ]
+    lines += [f"- {a['location']}: {a['size_bytes'] / 1024:.0f}KB ({a['count']}개)" for a in report["top_allocations"]]
+    lines += ["", "[누적 시간 상위 함수]", report["top_functions"]]
+    return "\n".join(lines)
@@ -0,0 +1,48 @@
+import os
+import re
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from ai.model import first_tier_model, provider_of
+
+# ==========================================
+# CDN 렌디션(크기/포맷) 협상
+# - 모델이 실제로 보는 해상도에 맞춰 CDN(rimg)에서 리사이즈된 이미지를 받음
+#   → 다운로드 바이트와 로컬 리사이즈/재인코딩 CPU 를 함께 절감
+# - 받은 이미지가 이미 규격 이내면 PIL 재인코딩 없이 원본 바이트를 그대로 전송
+# - USE_CDN_RENDITIONS=0 이면 기존 방식(330x440 + 로컬 재인코딩)으로 동작 (전후 비교용)
+# ==========================================
+USE_CDN_RENDITIONS = os.environ.get("USE_CDN_RENDITIONS", "1") != "0"
+
+# (제공사, detail) → CDN 렌디션
+# - openai detail=low : 모델 측에서 512px 이내로 축소 → 3:4 비율 384x512 이면 충분
+# - gemini            : 768px 타일 1장 안에 들어가는 576x768
+RENDITION_POLICIES = {
+    ("openai", "low"): {"width": 384, "height": 512, "mode": "contain", "format": "webp"},
+    ("openai", "high"): {"width": 768, "height": 1024, "mode": "contain", "format": "webp"},
+    ("gemini", "low"): {"width": 576, "height": 768, "mode": "contain", "format": "webp"},
+    ("gemini", "high"): {"width": 768, "height": 1024, "mode": "contain", "format": "webp"},
+    ("qwen", "low"): {"width": 384, "height": 512, "mode": "contain", "format": "webp"},
+}
+
+_RIMG_PATTERN = re.compile(r"/rimg/\d+x\d+/[a-z]+/")
+
+
+def get_rendition(model_name, detail="low"):
+    if not USE_CDN_RENDITIONS:
+        return None
+    return RENDITION_POLICIES.get((provider_of(first_tier_model(model_name)), detail))
+
+def build_rendition_url(url, model_name, detail="low"):
+    """
+    CDN rimg URL 의 크기/포맷 파라미터를 모델에 맞게 바꿉니다.
+    Return: (url, passthrough_max_size) — rimg URL 이 아니거나 정책이 없으면 (원본 url, None)
+    """
+    policy = get_rendition(model_name, detail)
+    if policy is None or not _RIMG_PATTERN.search(url):
+        return url, None
+
+    url = _RIMG_PATTERN.sub(f"/rimg/{policy['width']}x{policy['height']}/{policy['mode']}/", url, count=1)
+    parts = urlsplit(url)
+    query = dict(parse_qsl(parts.query))
+    query["format"] = policy["format"]
+    url = urlunsplit(parts._replace(query=urlencode(query)))
+    return url, (policy["width"], policy["height"])
@@ -0,0 +1,220 @@
+import re
+import pandas as pd
+from prompts.product import LENGTH_PROMPT_SECTIONS, PROMPT_STYLE_PATTERN
+from util.category_route import DEFAULT_ROUTE, match_route_name, get_route
+
+# ==========================================
+# 규칙 기반 사전 추출 (LLM 호출 전 단계)
+# - getPrdInfoByJson 으로 정규화된 구조화 데이터에서 바로 알 수 있는 필드를 채움
+# - 규칙은 아래 테이블(데이터)로만 정의 → 규칙 추가/수정 시 코드 변경 불필요
+# ==========================================
+MIN_CONFIDENCE = 0.8 # 이 값 이상인 필드만 '확정'으로 보고 LLM 요청에서 제외
+
+def parse_prompt_table(table_text, title=None):
+    """
+    프롬프트 분류표 "- 라벨 : 키워드1, 키워드2" → [(라벨, [키워드...])]
+    (title 지정 시 해당 [제목] 블록만, 괄호 주석은 제거, '싱글/더블' 같은 키워드는 나눠서 사용)
+    """
+    if title is not None:
+        table_text = table_text.split(f"[{title}]", 1)[1].split("\n[", 1)[0]
+    table = []
+    for line in table_text.splitlines():
+        label, sep, words = line.strip().lstrip("-").partition(":")
+        if not sep or not label.strip():
+            continue
+        words = [w.strip() for part in re.sub(r"\(.*?\)", "", words).split(",") for w in part.split("/")]
+        table.append((label.strip(), [w for w in words if w]))
+    return table
+
+# 키워드 매핑은 위에서부터 순서대로 검사 (먼저 매칭된 값 우선)
+GENDER_KEYWORDS = [
+    ("남녀공용", ["남녀공용", "공용", "유니섹스", "UNISEX"]),
+    ("키즈", ["키즈", "아동", "주니어", "유아", "베이비", "KIDS", "JUNIOR"]),
+    ("여성", ["여성", "우먼", "레이디스", "WOMEN", "WOMAN", "LADIES"]),
+    ("남성", ["남성", "맨즈", "MEN'S", "MENS"]),
+]
+
+SEASON_KEYWORDS = [
+    ("사계절", ["사계절", "간절기", "ALL SEASON"]),
+    ("봄", ["봄시즌", "봄신상", "봄여름", "봄가을", "S/S", "SS시즌", "SPRING"]), # '봄버(자켓)' 오탐 방지
+    ("여름", ["여름", "썸머", "서머", "S/S", "SS시즌", "SUMMER"]),
+    ("가을", ["가을", "F/W", "FW시즌", "FALL", "AUTUMN"]),
+    ("겨울", ["겨울", "윈터", "F/W", "FW시즌", "WINTER"]),
+]
+
+PATTERN_KEYWORDS = [
+    ("스트라이프", ["스트라이프", "줄무늬", "STRIPE"]),
+    ("체크", ["체크", "CHECK"]),
+    ("플로럴", ["플로럴", "플로랄", "꽃무늬", "잔꽃", "FLORAL"]),
+    ("도트", ["도트", "물방울", "DOT"]),
+    ("레터링", ["레터링", "LETTERING"]),
+]
+
+# 스타일/기장: 프롬프트 분류표를 그대로 사용 (분류 기준이 바뀌면 규칙도 함께 바뀜)
+STYLE_KEYWORDS = parse_prompt_table(PROMPT_STYLE_PATTERN, "스타일")
+LENGTH_KEYWORDS = {name: parse_prompt_table(section[2]) for name, section in LENGTH_PROMPT_SECTIONS.items()}
+# 기장 키워드가 아닌데 기장 키워드를 포함하는 단어 (검사 전에 지움)
+LENGTH_IGNORE_WORDS = ["롱슬리브", "숏슬리브", "레귤러핏", "롱패딩", "미니백", "숏패딩"]
+
+# 전시카테고리 대분류(dispCtgrNm1) → AI 대분류 (프롬프트 분류 체계: 여성/남성/유니섹스/언더웨어/골프/스포츠/아웃도어)
+# 전문관(골프/스포츠/아웃도어/언더웨어)을 성별 카테고리보다 먼저 검사
+DISP_CATEGORY_L_KEYWORDS = [
+    ("언더웨어", ["언더웨어", "속옷", "란제리", "이너웨어"]),
+    ("골프", ["골프", "GOLF"]),
+    ("스포츠", ["스포츠", "SPORTS"]),
+    ("아웃도어", ["아웃도어", "OUTDOOR"]),
+    ("유니섹스", ["유니섹스", "남녀공용", "UNISEX"]),
+    ("여성", ["여성의류", "여성"]),
+    ("남성", ["남성의류", "남성"]),
+]
+# 전시카테고리 중/소분류명 중 AI 분류명과 다른 것 (나머지는 전시카테고리명 그대로 사용)
+DISP_CATEGORY_NAME_MAP = {
+    "바지": "팬츠",
+    "치마": "스커트",
+    "티셔츠/탑": "티셔츠",
+    "셔츠/블라우스": "셔츠",
+    "재킷": "자켓",
+    "운동화": "스니커즈",
+}
+
+FIT_KEYWORDS = [
+    ("오버핏", ["오버핏", "오버사이즈", "OVERFIT", "OVERSIZED"]),
+    ("슬림핏", ["슬림핏", "스키니", "SLIM FIT", "SKINNY"]),
+    ("루즈핏", ["루즈핏", "LOOSE FIT"]),
+    ("레귤러핏", ["레귤러핏", "REGULAR FIT"]),
+]
+
+PRE_EXTRACTION_RULES = [
+    # 기본 정보: 원본 컬럼을 그대로 사용
+    {"field": "prdNo", "type": "copy", "source": "prdNo", "confidence": 1.0},
+    {"field": "prdNm", "type": "copy", "source": "prdNm", "confidence": 1.0},
+    {"field": "brandNm", "type": "copy", "source": "brandNm", "confidence": 1.0},
+
+    # 전시카테고리(dispCtgr) → AI 카테고리
+    # 대분류는 매핑표로 변환, 중/소분류는 대분류가 매핑된 경우에만 (이름 보정 후) 그대로 사용
+    {"field": "ai_category_L", "type": "keyword", "keywords": DISP_CATEGORY_L_KEYWORDS, "sources": [("category_L", 0.9)]},
+    {"field": "ai_category_M", "type": "copy", "source": "category_M", "mapping": DISP_CATEGORY_NAME_MAP,
+     "requires": "ai_category_L", "confidence": 0.9},
+    {"field": "ai_category_S", "type": "copy", "source": "category_S", "mapping": DISP_CATEGORY_NAME_MAP,
+     "requires": "ai_category_L", "confidence": 0.9},
+
+    # 성별/계절: 카테고리, 상품명, 정보고시에서 키워드 검색
+    # (카테고리 > 상품명 순으로 먼저 매칭된 근거 사용, 근거별 신뢰도 다름)
+    # (정보고시의 성별 표기는 '남녀공용' 기본값이 많아 근거로 쓰지 않음)
+    {"field": "ai_gender", "type": "keyword", "keywords": GENDER_KEYWORDS,
+     "sources": [("category_L", 0.9), ("prdNm", 0.85)]},
+    {"field": "ai_season", "type": "keyword_multi", "keywords": SEASON_KEYWORDS, "exclusive": "사계절",
+     "sources": [("notices", 0.85), ("prdNm", 0.8)]},
+
+    # 스타일: 상품명에 분류표 키워드가 있는 경우만 (복수 선택)
+    {"field": "ai_style", "type": "keyword_multi", "keywords": STYLE_KEYWORDS, "sources": [("prdNm", 0.8)]},
+
+    # 기장: 카테고리 라우트상 해당 없는 항목은 null, 해당 항목은 소분류/상품명의 분류표 키워드
+    # (어느 라우트에도 맞지 않는 상품은 '롱/미니' 같은 짧은 키워드 오탐이 많아 검사하지 않음)
+    *[rule for name in LENGTH_PROMPT_SECTIONS for rule in (
+        {"field": name, "type": "not_applicable", "confidence": 1.0},
+        {"field": name, "type": "keyword", "keywords": LENGTH_KEYWORDS[name], "ignore": LENGTH_IGNORE_WORDS,
+         "routed": True, "sources": [("category_S", 0.9), ("prdNm", 0.85)]},
+    )],
+
+    # 패턴/핏: 상품명에 명시된 경우만
+    {"field": "ai_pattern", "type": "keyword", "keywords": PATTERN_KEYWORDS, "sources": [("prdNm", 0.8)]},
+    {"field": "ai_fit", "type": "keyword", "keywords": FIT_KEYWORDS, "sources": [("prdNm", 0.8)]},
+
+    # 사이즈: 구매 가능 옵션 중 사이즈 항목
+    {"field": "ai_size", "type": "option", "option_names": ["사이즈", "SIZE", "Size", "size"], "confidence": 0.9},
+]
+
+
+def _text_of(row, source):
+    value = row.get(source)
+    if isinstance(value, dict):
+        return " ".join(f"{k} {v}" for k, v in value.items())
+    if value is None or (not isinstance(value, (list, str)) and pd.isna(value)):
+        return ""
+    return str(value)
+
+def _match_keywords(text, keywords, ignore=()):
+    upper = text.upper()
+    for word in ignore:
+        upper = upper.replace(word.upper(), " ")
+    return [label for label, words in keywords if any(w.upper() in upper for w in words)]
+
+def _parse_option_string(options):
+    """ "색상: BLACK, SAND / 사이즈: 95, 100" → {"색상": "BLACK, SAND", "사이즈": "95, 100"} """
+    parsed = {}
+    for part in str(options or "").split(" / "):
+        name, sep, values = part.partition(":")
+        if sep:
+            parsed[name.strip()] = values.strip()
+    return parsed
+
+def _apply_rule(row, rule):
+    """Return: (값, 신뢰도, 근거) 또는 None"""
+    rule_type = rule["type"]
+
+    if rule_type == "copy":
+        text = _text_of(row, rule["source"]).strip()
+        if text:
+            return rule.get("mapping", {}).get(text, text), rule["confidence"], rule["source"]
+
+    elif rule_type == "not_applicable":
+        # 카테고리 라우트상 해당 없는 기장 항목 → null 로 확정
+        route = get_route(match_route_name(row))
+        if rule["field"] in route.not_applicable:
+            return None, rule["confidence"], f"category_route:{route.name}"
+
+    elif rule_type in ("keyword", "keyword_multi"):
+        if rule.get("routed"):
+            route = get_route(match_route_name(row))
+            if route.name == DEFAULT_ROUTE or rule["field"] not in route.length_fields:
+                return None
+        for source, confidence in rule["sources"]:
+            labels = _match_keywords(_text_of(row, source), rule["keywords"], rule.get("ignore", ()))
+            if not labels:
+                continue
+            if rule_type == "keyword":
+                return labels[0], confidence, source
+            # 단독 사용 라벨(예: '사계절')이 있으면 그 값만 사용
+            exclusive = rule.get("exclusive")
+            return ([exclusive] if exclusive in labels else labels), confidence, source
+
+    elif rule_type == "option":
+        options = _parse_option_string(row.get("options"))
+        for name in rule["option_names"]:
+            if options.get(name):
+                return options[name], rule["confidence"], f"options:{name}"
+
+    return None
+
+def apply_rules(product_df, rules=PRE_EXTRACTION_RULES, min_confidence=MIN_CONFIDENCE):
+    """
+    규칙 테이블을 적용해 확정 가능한 필드를 채웁니다.
+    Return: (known_values: {필드: 값}, provenance: {필드: {"source", "confidence"}})
+    """
+    row = product_df.iloc[0] if isinstance(product_df, pd.DataFrame) else product_df
+    known_values, provenance = {}, {}
+
+    for rule in rules:
+        field = rule["field"]
+        if field in known_values or (rule.get("requires") and rule["requires"] not in known_values):
+            continue
+        matched = _apply_rule(row, rule)
+        if matched is None:
+            continue
+        value, confidence, source = matched
+        if confidence < min_confidence:
+            continue
+        known_values[field] = value
+        provenance[field] = {"source": f"rule:{source}", "confidence": confidence}
+
+    return known_values, provenance
+
+def format_known_values(known_values):
+    """LLM 에게 참고용으로 전달할 확정 속성 텍스트"""
+    lines = [
+        f"- {field}: {', '.join(v) if isinstance(v, list) else v}" for field, v in known_values.items() if v is not None
+    ]
+    if not lines:
+        return ""
+    return "[확정된 속성] (아래 값은 이미 확정되었으므로 이와 모순되지 않게 나머지 항목을 분석하라)\n" + "\n".join(lines) + "\n"
@@ -0,0 +1,179 @@
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from util import metrics
+
+# ==========================================
+# 우선순위 스케줄러 (프로세스 공용)
+# - 같은 프로세스 안의 UI 클릭(interactive), 서비스 요청(near_real_time), 백필(bulk)이
+#   제공사 동시 호출 한도와 이미지/HTTP 단계를 나눠 씀
+# - 자원(resource)별 동시 실행 한도: "llm:<제공사>", "http:<호스트>", "image"
+# - interactive 대기가 있으면 대기 중인 다른 작업보다 먼저 슬롯 배정 (대기 중인 bulk 는 뒤로 밀림)
+# - 그 외에는 가중치(PRIORITY_WEIGHTS) 비율로 슬롯을 공정 분배 (stride scheduling)
+# - bulk 는 한도의 일부(BULK_RESERVE_RATIO)를 쓰지 못함 → 백필이 한도를 채워도 클릭은 바로 실행
+# - 우선순위는 스레드 로컬 컨텍스트(priority())로 전달, 다른 스레드 풀로 넘길 때는 bind() 로 감쌈
+# ==========================================
+PRIORITIES = ("interactive", "near_real_time", "bulk")
+PRIORITY_WEIGHTS = {"interactive": 8, "near_real_time": 3, "bulk": 1}
+PREEMPTING_PRIORITIES = ("interactive",)
+DEFAULT_PRIORITY = os.environ.get("SCHEDULER_DEFAULT_PRIORITY", "near_real_time")
+BULK_RESERVE_RATIO = 0.25 # bulk 가 사용할 수 없는 슬롯 비율 (한도가 2 이상이면 최소 1슬롯)
+
+DEFAULT_LIMIT = 16
+RESOURCE_LIMITS = {
+    "llm:gemini": 32,
+    "llm:openai": 32,
+    "llm:qwen": 8,
+    "image": 16, # 상품 단위 이미지 변환 (다운로드는 http:<호스트> 로 별도 제한)
+}
+# 환경변수로 덮어쓰기: SCHEDULER_LIMITS="llm:gemini=64,image=8"
+RESOURCE_LIMITS.update({
+    name.strip(): int(value)
+    for name, value in (item.split("=", 1) for item in os.environ.get("SCHEDULER_LIMITS", "").split(",") if "=" in item)
+})
+
+
+class _Ticket:
+    __slots__ = ("priority", "granted")
+
+    def __init__(self, priority):
+        self.priority = priority
+        self.granted = False
+
+
+class PriorityLimiter:
+    """자원 1개의 동시 실행 한도를 우선순위별로 배분"""
+    def __init__(self, name, limit, weights=PRIORITY_WEIGHTS, bulk_reserve_ratio=BULK_RESERVE_RATIO):
+        self.name = name
+        self.limit = max(1, int(limit))
+        reserve = max(1, round(self.limit * bulk_reserve_ratio)) if self.limit > 1 else 0
+        self.bulk_limit = self.limit - reserve
+        self.weights = weights
+        self._cond = threading.Condition()
+        self._waiting = {p: deque() for p in PRIORITIES}
+        self._running = {p: 0 for p in PRIORITIES}
+        self._pass = {p: 0.0 for p in PRIORITIES}
+
+    def acquire(self, priority, timeout=None):
+        """슬롯을 받을 때까지 대기, timeout 초과 시 False"""
+        ticket = _Ticket(priority)
+        start = time.perf_counter()
+        with self._cond:
+            if not self._waiting[priority] and not self._running[priority]:
+                # 쉬고 있던 클래스가 밀린 몫을 한꺼번에 가져가지 않도록 현재 활성 클래스 수준으로 맞춤
+                active = [self._pass[p] for p in PRIORITIES if p != priority and (self._waiting[p] or self._running[p])]
+                if active:
+                    self._pass[priority] = max(self._pass[priority], min(active))
+            self._waiting[priority].append(ticket)
+            self._dispatch()
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while not ticket.granted:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    self._waiting[priority].remove(ticket)
+                    metrics.incr("scheduler_timeouts", resource=self.name, priority=priority)
+                    return False
+                self._cond.wait(remaining)
+        metrics.observe("scheduler_wait", time.perf_counter() - start, resource=self.name, priority=priority)
+        return True
+
+    def release(self, priority):
+        with self._cond:
+            self._running[priority] -= 1
+            self._dispatch()
+
+    def _pick(self):
+        candidates = [
+            p for p in PRIORITIES
+            if self._waiting[p] and (p != "bulk" or self._running["bulk"] < self.bulk_limit)
+        ]
+        if not candidates:
+            return None
+        for p in PREEMPTING_PRIORITIES:
+            if p in candidates:
+                if self._waiting["bulk"]:
+                    metrics.incr("scheduler_preempted", resource=self.name)
+                return p
+        return min(candidates, key=lambda p: self._pass[p])
+
+    def _dispatch(self):
+        # (잠금 보유 상태에서 호출) 빈 슬롯만큼 대기자에게 배정
+        granted = False
+        while sum(self._running.values()) < self.limit:
+            priority = self._pick()
+            if priority is None:
+                break
+            self._waiting[priority].popleft().granted = True
+            self._running[priority] += 1
+            self._pass[priority] += 1.0 / self.weights[priority]
+            granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "limit": self.limit,
+                "bulk_limit": self.bulk_limit,
+                "running": dict(self._running),
+                "waiting": {p: len(q) for p, q in self._waiting.items()},
+            }
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def get_limiter(resource, limit=None):
+    """자원별 limiter (처음 요청 시 RESOURCE_LIMITS > limit > DEFAULT_LIMIT 순으로 한도 결정)"""
+    with _limiters_lock:
+        limiter = _limiters.get(resource)
+        if limiter is None:
+            limiter = _limiters[resource] = PriorityLimiter(resource, RESOURCE_LIMITS.get(resource, limit or DEFAULT_LIMIT))
+        return limiter
+
+def get_scheduler_stats():
+    """대시보드용: {resource: {"limit", "bulk_limit", "running", "waiting"}}"""
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return {limiter.name: limiter.stats() for limiter in limiters}
+
+
+# ---------- 우선순위 컨텍스트 ----------
+_context = threading.local()
+
+def current_priority():
+    return getattr(_context, "priority", None) or DEFAULT_PRIORITY
+
+@contextmanager
+def priority(name):
+    """이 블록에서(현재 스레드) 실행되는 호출의 우선순위 지정"""
+    if name not in PRIORITIES:
+        raise ValueError(f"unknown priority: {name} (choose from {', '.join(PRIORITIES)})")
+    previous = getattr(_context, "priority", None)
+    _context.priority = name
+    try:
+        yield
+    finally:
+        _context.priority = previous
+
+def bind(fn):
+    """현재 우선순위를 고정한 함수 (스레드 풀에 제출할 때 우선순위 전달용)"""
+    captured = current_priority()
+
+    def _run(*args, **kwargs):
+        with priority(captured):
+            return fn(*args, **kwargs)
+    return _run
+
+@contextmanager
+def slot(resource, limit=None):
+    """자원 슬롯 1개를 현재 우선순위로 점유"""
+    name = current_priority()
+    limiter = get_limiter(resource, limit)
+    limiter.acquire(name)
+    try:
+        yield
+    finally:
+        limiter.release(name)
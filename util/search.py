@@ -1,6 +1,36 @@
-import requests
+import os
+from util.transport import http_get
 from requests.exceptions import HTTPError
 
+# ==========================================
+# ES 검색 결과 fast path (상품 상세 API 왕복 생략)
+# - 검색 hit 의 _source(raw_data) 에 분석에 필요한 필드가 모두 있으면 ES 데이터로 바로 정규화
+# - ES_FAST_PATH_MODE
+#   · "description" (기본): 필수 필드는 ES 에서, ES 에 없는 상세설명/정보고시만 상세 API 에서 보충
+#     (보충이 필요하면 상세 API 를 그대로 1회 호출 → 왕복 절감 없음, partial 로 집계하고 '생략'으로 세지 않음)
+#   · "skip": 필수 필드가 있으면 상세 API 를 호출하지 않음 (상세설명 없이 분석)
+#   · "off": 항상 상세 API 사용 (기존 동작)
+# - 필수 필드가 하나라도 없으면 모드와 관계없이 상세 API 로 대체
+#   (단, "description" 모드에서 이미지 객체만 없으면 상세설명과 함께 이미지도 보충)
+# ==========================================
+ES_FAST_PATH_MODES = ("description", "skip", "off")
+ES_FAST_PATH_MODE = os.environ.get("ES_FAST_PATH_MODE", "description")
+
+# 상품 상세 API 키 → ES _source 후보 키 (앞에서부터 먼저 있는 값 사용)
+ES_FIELD_ALIASES = {
+    "prdNm": ["prdNm", "appPrdNm"],
+    "brandMainNmKr": ["brandMainNmKr", "brandNm"],
+    "productImage": ["productImage"],
+    "optionItem": ["optionItem"],
+    "notiItemMap": ["notiItemMap"],
+    "dispCtgr": ["dispCtgr"],
+    "productDesc": ["productDesc"],
+}
+# 이 필드가 모두 있어야 ES 데이터만으로 분석 (상품명, 브랜드, 이미지, 카테고리, 옵션)
+ES_REQUIRED_FIELDS = ["prdNm", "brandMainNmKr", "productImage", "dispCtgr", "optionItem"]
+# ES 에 없으면 상세 API 에서 보충하는 필드 ("description" 모드)
+ES_SUPPLEMENT_FIELDS = ["productDesc", "notiItemMap"]
+
 
 # 상품api 에서 상품정보 추출
 def getPrdListByKeyword(siteCd, keyword):
@@ -21,7 +51,7 @@ def getPrdListByKeyword(siteCd, keyword):
     }
 
     try:
-        response = requests.get(url, params=payload, timeout=5)
+        response = http_get(url, params=payload, timeout=5)
         response.raise_for_status()
         data = response.json()
 
@@ -62,17 +92,29 @@ def process_es_hit_to_display(hit_item):
         "raw_data": source # 상세 분석을 위해 source 통째로 저장
     }
 
+def _first_value(es_source, keys):
+    for key in keys:
+        value = es_source.get(key)
+        if value not in (None, "", [], {}):
+            return value
+    return None
+
 def map_es_to_internal_schema(es_source):
     """
-    [신규] ES 데이터를 분석 함수(process_product_data_final)가 이해할 수 있는 
-    기존 API 포맷으로 변환해주는 어댑터 함수
+    ES 데이터를 상품 상세 API(products/withoutPrice) 의 data 포맷으로 변환하는 어댑터
+    → util.product.getPrdInfoByJson 으로 그대로 정규화 가능
+    ES 에 없는 필드는 None (es_missing_fields 로 확인)
+    (이미지 객체가 없으면 리스트용 썸네일(appPrdImgUrl)이 있어도 None: 썸네일 1장으로는 추가이미지를 포함한 분석 불가)
     """
-    # 기존 로직이 기대하는 키 이름으로 매핑
-    return {
-        'prdNo': es_source.get('prdNo'),
-        'prdNm': es_source.get('prdNm'),
-        'brandNm': es_source.get('brandNm'),
-        
-        # 이미지는 객체 형태로 변환
-        'appPrdImgUrl': {'basicExtNm': es_source.get('appPrdImgUrl')},
-    }
\ No newline at end of file
+    mapped = {'prdNo': es_source.get('prdNo')}
+    for field, keys in ES_FIELD_ALIASES.items():
+        mapped[field] = _first_value(es_source, keys)
+
+    # 카테고리: 평탄화된 필드(dispCtgrNm1~3)만 있는 경우 객체로 묶음
+    if mapped['dispCtgr'] is None and es_source.get('dispCtgrNm1'):
+        mapped['dispCtgr'] = {f'dispCtgrNm{i}': es_source.get(f'dispCtgrNm{i}') for i in range(1, 4)}
+    return mapped
+
+def es_missing_fields(mapped, fields=ES_REQUIRED_FIELDS):
+    """map_es_to_internal_schema 결과에서 비어 있는 필드 목록"""
+    return [field for field in fields if mapped.get(field) in (None, "", [], {})]
\ No newline at end of file
@@ -0,0 +1,399 @@
+import io
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+from PIL import Image
+from util import metrics
+from util.transport import set_host_override
+
+# ==========================================
+# 부하 테스트용 로컬 스텁 서버
+# - 하프클럽 상품/검색 API, CDN 이미지, OpenAI / Gemini 구조화 출력 엔드포인트 흉내
+# - 경로(route)별 지연시간 분포(로그정규) + 오류율(503) + 속도제한(429) 설정
+# - 실제 API 쿼터 없이 파이프라인 전체(HTTP → 이미지 → LLM 파싱)를 그대로 태움
+# ==========================================
+STUB_ROUTES = ("product", "search", "cdn", "openai", "gemini")
+
+# 검증(ai.validate)을 통과하는 값으로 채워 캐스케이드 승격이 일어나지 않도록 함
+STUB_FIELD_VALUES = {
+    "ai_category_L": "여성",
+    "ai_category_M": "니트",
+    "ai_category_S": "가디건",
+    "ai_gender": "여성",
+    "ai_season": ["봄", "가을"],
+    "ai_style": ["캐주얼", "미니멀"],
+    "ai_pattern": "무지",
+    "ai_fit": "레귤러핏",
+    "ai_size": "FREE",
+}
+STUB_DESCRIPTION = "부드러운 촉감의 소재로 완성한 데일리 아이템입니다. " * 12
+
+STUB_CATEGORIES = [
+    ("여성의류", "니트", "가디건"),
+    ("남성의류", "아우터", "바람막이"),
+    ("스포츠", "신발", "러닝화"),
+    ("여성의류", "원피스", "롱원피스"),
+]
+
+
+class LatencyProfile:
+    """
+    로그정규 지연시간 분포 (중앙값 / p99 로 지정, ms)
+    - error_rate: 503 응답 비율, rate_limit_rate: 429 응답 비율
+    """
+    def __init__(self, median_ms=50, p99_ms=None, error_rate=0.0, rate_limit_rate=0.0):
+        self.median_ms = median_ms
+        self.p99_ms = p99_ms or median_ms * 3
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        # p99 = median * exp(2.326 * sigma)
+        self.sigma = math.log(max(self.p99_ms, median_ms) / median_ms) / 2.326 if median_ms > 0 else 0.0
+
+    def sample_seconds(self, rng):
+        if self.median_ms <= 0:
+            return 0.0
+        return self.median_ms * math.exp(rng.gauss(0, self.sigma)) / 1000
+
+    def sample_status(self, rng):
+        roll = rng.random()
+        if roll < self.error_rate:
+            return 503
+        if roll < self.error_rate + self.rate_limit_rate:
+            return 429
+        return 200
+
+def default_profiles():
+    """경로별 기본 지연시간 (실측치와 비슷한 수준)"""
+    return {
+        "product": LatencyProfile(median_ms=80, p99_ms=400),
+        "search": LatencyProfile(median_ms=60, p99_ms=300),
+        "cdn": LatencyProfile(median_ms=30, p99_ms=200),
+        "openai": LatencyProfile(median_ms=3000, p99_ms=12000),
+        "gemini": LatencyProfile(median_ms=2000, p99_ms=9000),
+    }
+
+
+# ==========================================
+# 응답 본문 생성
+# ==========================================
+def build_stub_product(prd_no):
+    """상품번호별로 항상 같은 내용의 상품 상세 JSON (getPrdInfoByJson 입력 형식)"""
+    rng = random.Random(str(prd_no))
+    ctgr_l, ctgr_m, ctgr_s = rng.choice(STUB_CATEGORIES)
+    paragraphs = "".join(f"<p>{ctgr_s} 상세 설명 {i}: 소재와 핏, 세탁 방법 안내</p>" for i in range(rng.randint(5, 30)))
+    # 상세설명 이미지: 사전 검사(util.image_probe)로 걸러질 이미지(추적 픽셀/아이콘/띠 배너/초대형/중복) + 정보성 이미지
+    paragraphs += "".join(
+        f'<img src="https://cdn2.halfclub.com/detail/{prd_no}/{name}">' for name in STUB_DETAIL_IMAGES
+    )
+    images = {"basicExtNm": f"stub/{prd_no}/0.jpg"}
+    for i in range(1, rng.randint(2, 8)):
+        images[f"add{i}ExtNm"] = f"stub/{prd_no}/{i}.jpg"
+    return {
+        "data": {
+            "prdNo": str(prd_no),
+            "prdNm": f"스텁 {ctgr_s} {prd_no}",
+            "brandMainNmKr": rng.choice(["네파", "나이키", "지오다노", "에잇세컨즈"]),
+            "productDesc": {"prdDescContClob": f"<div>{paragraphs}</div>"},
+            "productImage": images,
+            "optionItem": [
+                {"optItemNm": "색상", "optValueList": [{"optValueNm": c} for c in ("BLACK", "IVORY")]},
+                {"optItemNm": "사이즈", "optValueList": [{"optValueNm": s} for s in ("S", "M", "L")]},
+            ],
+            "notiItemMap": [
+                {"notiItemTitle": "소재", "notiItemValue": "면 100%"},
+                {"notiItemTitle": "제조국", "notiItemValue": "대한민국"},
+            ],
+            "dispCtgr": {"dispCtgrNm1": ctgr_l, "dispCtgrNm2": ctgr_m, "dispCtgrNm3": ctgr_s},
+        }
+    }
+
+def build_stub_search(keyword, count=10):
+    """ES 검색 응답 (hit _source 에는 상세설명을 제외한 상품 상세 필드 포함)"""
+    hits = []
+    for i in range(count):
+        detail = build_stub_product(str(100000000 + i))["data"]
+        source = {k: v for k, v in detail.items() if k not in ("productDesc", "notiItemMap", "brandMainNmKr")}
+        source["brandNm"] = detail["brandMainNmKr"]
+        source["appPrdImgUrl"] = f"https://cdn2.halfclub.com/rimg/330x440/contain/{detail['productImage']['basicExtNm']}?format=webp"
+        hits.append({"_id": source["prdNo"], "_source": source})
+    return {"data": {"keyword": keyword, "result": {"hits": {"total": {"value": count}, "hits": hits}}}}
+
+STUB_DETAIL_IMAGES = [
+    "spacer-1x1.gif", "mark-40x40.png", "strip-1200x150.jpg", "huge-3000x4000.jpg",
+    "look-860x1800.jpg", "size-860x1200.webp", "look2-860x1800.jpg", "fabric-600x600.png",
+]
+STUB_HUGE_PAD_BYTES = 12 * 1024 * 1024 # 'huge-' 이미지는 EOI 뒤를 채워 초대형 파일로 만듦
+_STUB_IMAGE_NAME = re.compile(r"-(?P<w>\d+)x(?P<h>\d+)\.(?P<ext>jpg|png|gif|webp)$")
+_STUB_IMAGE_FORMATS = {"jpg": ("JPEG", "image/jpeg"), "png": ("PNG", "image/png"), "gif": ("GIF", "image/gif"),
+                       "webp": ("WEBP", "image/webp")}
+
+_image_cache = {}
+_image_lock = threading.Lock()
+
+def build_stub_image(width=330, height=440, image_format="JPEG", pad_bytes=0):
+    """단색 그라데이션 이미지 (크기/포맷별 1회 생성 후 재사용)"""
+    key = (width, height, image_format, pad_bytes)
+    with _image_lock:
+        data = _image_cache.get(key)
+        if data is None:
+            img = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+            buffer = io.BytesIO()
+            img.save(buffer, format=image_format, **({"quality": 85} if image_format in ("JPEG", "WEBP") else {}))
+            data = _image_cache[key] = buffer.getvalue() + b"\0" * pad_bytes
+        return data
+
+def _stub_image_for_path(path):
+    """CDN 경로 → (이미지 bytes, content type), 파일명에 -가로x세로.확장자 가 있으면 그 크기/포맷"""
+    match = _STUB_IMAGE_NAME.search(path)
+    if match is None:
+        return build_stub_image(), "image/jpeg"
+    image_format, content_type = _STUB_IMAGE_FORMATS[match.group("ext")]
+    pad_bytes = STUB_HUGE_PAD_BYTES if "/huge-" in path else 0
+    return build_stub_image(int(match.group("w")), int(match.group("h")), image_format, pad_bytes), content_type
+
+def _sample_from_schema(schema, defs, field_name=None):
+    """JSON 스키마(OpenAI/Gemini 공통)를 따라 검증을 통과하는 예시 값 생성"""
+    if "$ref" in schema:
+        schema = defs.get(schema["$ref"].rsplit("/", 1)[-1], {})
+    for key in ("anyOf", "any_of"):
+        if key in schema:
+            options = [s for s in schema[key] if str(s.get("type", "")).lower() != "null"]
+            return _sample_from_schema(options[0], defs, field_name) if options else None
+
+    has_enum = bool(schema.get("enum") or (schema.get("items") or {}).get("enum"))
+    if field_name in STUB_FIELD_VALUES and not has_enum: # enum(압축 코드) 필드는 스키마 값 사용
+        return STUB_FIELD_VALUES[field_name]
+    if field_name == "description":
+        return STUB_DESCRIPTION
+
+    schema_type = schema.get("type")
+    if isinstance(schema_type, list):
+        schema_type = next((t for t in schema_type if str(t).lower() != "null"), "string")
+    schema_type = str(schema_type or "object").lower()
+
+    if schema_type == "object":
+        return {
+            name: _sample_from_schema(sub, defs, name)
+            for name, sub in (schema.get("properties") or {}).items()
+        }
+    if schema_type == "array":
+        return [_sample_from_schema(schema.get("items") or {}, defs, None)]
+    if schema_type in ("integer", "number"):
+        return 0
+    if schema_type == "boolean":
+        return False
+    if schema.get("enum"):
+        return schema["enum"][0]
+    return "스텁"
+
+_PACKED_PRD_NO = re.compile(r"상품번호\(prdNo\): ([\w-]+)")
+
+def _fill_packed_items(content, request_body):
+    """packed 요청이면 입력 상품번호마다 결과 1개씩 (util.product._match_packed_items 통과용)"""
+    if not isinstance(content, dict) or not isinstance(content.get("items"), list) or not content["items"]:
+        return content
+    prd_nos = _PACKED_PRD_NO.findall(json.dumps(request_body, ensure_ascii=False))
+    if prd_nos:
+        content["items"] = [dict(content["items"][0], prdNo=prd_no) for prd_no in prd_nos]
+    return content
+
+def _estimate_tokens(text):
+    # 대략치: 한글 1자 ≈ 1토큰, 영문/기호 4자 ≈ 1토큰 (스키마별 출력 토큰 비교용)
+    non_ascii = sum(1 for ch in text if ord(ch) > 127)
+    return non_ascii + (len(text) - non_ascii) // 4 + 1
+
+_IMAGE_KEYS = ("inlineData", "inline_data", "image_url")
+
+def _estimate_prompt_tokens(request_body):
+    # 요청 본문(프롬프트 + 스키마) 기준 대략치, 이미지 데이터는 제외 (프롬프트/스키마 축소 전후 비교용)
+    def _strip_images(value):
+        if isinstance(value, dict):
+            return {k: _strip_images(v) for k, v in value.items() if k not in _IMAGE_KEYS}
+        if isinstance(value, list):
+            return [_strip_images(v) for v in value]
+        return value
+    return _estimate_tokens(json.dumps(_strip_images(request_body), ensure_ascii=False))
+
+def build_openai_completion(request_body):
+    response_format = request_body.get("response_format") or {}
+    schema = (response_format.get("json_schema") or {}).get("schema") or {}
+    content = _sample_from_schema(schema, schema.get("$defs") or schema.get("definitions") or {})
+    content = _fill_packed_items(content, request_body)
+    text = json.dumps(content, ensure_ascii=False)
+    prompt_tokens = _estimate_prompt_tokens(request_body)
+    return {
+        "id": f"chatcmpl-stub-{random.getrandbits(32):08x}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": request_body.get("model", "stub"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": text, "refusal": None},
+            "finish_reason": "stop",
+        }],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": _estimate_tokens(text), "total_tokens": prompt_tokens + _estimate_tokens(text)},
+    }
+
+def build_gemini_response(request_body):
+    config = request_body.get("generationConfig") or {}
+    schema = config.get("responseJsonSchema") or config.get("responseSchema") or {}
+    content = _sample_from_schema(schema, schema.get("$defs") or schema.get("defs") or {})
+    content = _fill_packed_items(content, request_body)
+    text = json.dumps(content, ensure_ascii=False)
+    prompt_tokens = _estimate_prompt_tokens(request_body)
+    return {
+        "candidates": [{
+            "content": {"role": "model", "parts": [{"text": text}]},
+            "finishReason": "STOP",
+        }],
+        "usageMetadata": {"promptTokenCount": prompt_tokens, "candidatesTokenCount": _estimate_tokens(text), "totalTokenCount": prompt_tokens + _estimate_tokens(text)},
+    }
+
+
+# ==========================================
+# HTTP 서버
+# ==========================================
+_PRODUCT_PATH = re.compile(r"^/product/products/withoutPrice/(?P<prd_no>[^/?]+)")
+
+def _route_of(method, path):
+    if method == "POST" and path.rstrip("/").endswith("/chat/completions"):
+        return "openai"
+    if method == "POST" and ":generateContent" in path:
+        return "gemini"
+    if path.startswith("/product/"):
+        return "product"
+    if path.startswith("/searches/"):
+        return "search"
+    return "cdn"
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # keep-alive (클라이언트 커넥션 풀 재사용)
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def _handle(self, method):
+        stub = self.server.stub
+        path = urlsplit(self.path).path
+        route = _route_of(method, path)
+        profile = stub.profiles[route]
+
+        body = b""
+        if method == "POST":
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+        with stub.rng_lock:
+            delay = profile.sample_seconds(stub.rng)
+            status = profile.sample_status(stub.rng)
+        time.sleep(delay)
+
+        metrics.incr("stub_requests", route=route, status=status)
+        if status != 200:
+            self._send(status, b'{"error": {"message": "stub injected error"}}', "application/json")
+            return
+
+        if route == "cdn":
+            etag = '"stub-image"'
+            data, content_type = _stub_image_for_path(path)
+            range_match = re.match(r"bytes=(\d+)-(\d*)$", self.headers.get("Range") or "")
+            if range_match:
+                # 부분 요청 (이미지 사전 검사)
+                start = int(range_match.group(1))
+                end = min(int(range_match.group(2) or len(data) - 1), len(data) - 1)
+                self._send(206, data[start:end + 1], content_type, {"Content-Range": f"bytes {start}-{end}/{len(data)}"})
+            elif self.headers.get("If-None-Match") == etag:
+                self._send(304, b"", None, {"ETag": etag})
+            else:
+                self._send(200, data, content_type, {"ETag": etag})
+            return
+
+        if route == "product":
+            match = _PRODUCT_PATH.match(path)
+            payload = build_stub_product(match.group("prd_no") if match else "0")
+        elif route == "search":
+            payload = build_stub_search("stub")
+        elif route == "openai":
+            payload = build_openai_completion(json.loads(body or b"{}"))
+        else:
+            payload = build_gemini_response(json.loads(body or b"{}"))
+        self._send(200, json.dumps(payload, ensure_ascii=False).encode("utf-8"), "application/json")
+
+    def _send(self, status, data, content_type, headers=None):
+        self.send_response(status)
+        if content_type:
+            self.send_header("Content-Type", content_type)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if data:
+            self.wfile.write(data)
+
+
+class StubServer:
+    """
+    모든 경로를 하나의 포트에서 처리하는 스텁 서버 (백그라운드 스레드)
+    사용 예)
+        with StubServer(profiles={"openai": LatencyProfile(median_ms=500)}) as stub:
+            stub.install()  # 하프클럽/CDN/OpenAI/Gemini 요청을 스텁으로 보냄
+    """
+    def __init__(self, host="127.0.0.1", port=0, profiles=None, seed=None):
+        self.profiles = default_profiles()
+        self.profiles.update(profiles or {})
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), _StubHandler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stub-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def install(self):
+        install_stub_endpoints(self.base_url)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+
+def install_stub_endpoints(base_url):
+    """
+    현재 프로세스의 모든 외부 호출을 base_url 로 전환
+    - 하프클럽/보리보리/CDN: util.transport 호스트 대체
+    - OpenAI/Gemini: base URL 환경변수 + 더미 API 키 (ai.model.get_secret 이 환경변수로 대체)
+    """
+    for host in ("hapix.halfclub.com", "apix.boribori.co.kr", "cdn2.halfclub.com"):
+        set_host_override(host, base_url)
+    os.environ["OPENAI_BASE_URL"] = f"{base_url}/v1"
+    os.environ["GEMINI_BASE_URL"] = base_url
+    os.environ.setdefault("OPENAI_API_KEY", "stub-key")
+    os.environ.setdefault("GOOGLE_API_KEY_LSS", "stub-key")
@@ -0,0 +1,276 @@
+import hashlib
+import json
+import os
+import threading
+from urllib.parse import urlencode, urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from util import cassette, metrics, scheduler
+
+# ==========================================
+# 공용 HTTP 전송 계층
+# - 호스트별 Session(커넥션 풀) 재사용 → 매 호출마다 새 TCP/TLS 연결을 맺지 않음
+# - ETag / Last-Modified 기반 조건부 재검증 → 변경이 없으면 304 응답으로 본문 전송 생략
+# - 호스트별 요청 수 / 수신 바이트 / 304 횟수 / 절약 바이트 지표 기록 (util.metrics)
+# - 재검증용 디스크 캐시는 HTTP_CACHE_MAX_BYTES 상한, 초과 시 오래 안 쓴 항목부터 삭제 (LRU, 파일 수정 시각 기준)
+# ==========================================
+HOST_POOL_SIZES = {
+    "hapix.halfclub.com": 20,
+    "apix.boribori.co.kr": 10,
+    "cdn2.halfclub.com": 50, # 이미지: 상품당 여러 장을 병렬 다운로드
+}
+DEFAULT_POOL_SIZE = 10
+
+HTTP_CACHE_DIR = os.environ.get("HTTP_CACHE_DIR", ".cache/http")
+HTTP_CACHE_MAX_BYTES = int(os.environ.get("HTTP_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+HTTP_CACHE_EVICT_RATIO = 0.8 # 상한을 넘으면 이 비율까지 줄임 (쓸 때마다 디렉터리를 훑지 않도록)
+
+# 호스트 → 대체 base URL (부하 테스트/로컬 스텁 서버용)
+# 예) HTTP_HOST_OVERRIDES="hapix.halfclub.com=http://127.0.0.1:18080,cdn2.halfclub.com=http://127.0.0.1:18080"
+HOST_OVERRIDES = dict(
+    item.split("=", 1) for item in os.environ.get("HTTP_HOST_OVERRIDES", "").split(",") if "=" in item
+)
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(host):
+    """호스트별 커넥션 풀 Session (프로세스 공용)"""
+    with _sessions_lock:
+        session = _sessions.get(host)
+        if session is None:
+            pool_size = HOST_POOL_SIZES.get(host, DEFAULT_POOL_SIZE)
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[host] = session
+        return session
+
+def set_pool_size(host, pool_size):
+    """호스트별 풀 크기 조정 (다음 Session 생성부터 적용)"""
+    with _sessions_lock:
+        HOST_POOL_SIZES[host] = pool_size
+        session = _sessions.pop(host, None)
+    if session is not None:
+        session.close()
+
+
+def set_host_override(host, base_url):
+    """host 로 가는 요청을 base_url(scheme://host:port) 로 보냄, None 이면 해제"""
+    if base_url is None:
+        HOST_OVERRIDES.pop(host, None)
+    else:
+        HOST_OVERRIDES[host] = base_url.rstrip("/")
+
+def _apply_override(url, host):
+    base_url = HOST_OVERRIDES.get(host)
+    if not base_url:
+        return url
+    parts = urlsplit(url)
+    target = urlsplit(base_url)
+    return parts._replace(scheme=target.scheme, netloc=target.netloc).geturl()
+
+
+def _cache_paths(url, params):
+    full_url = f"{url}?{urlencode(sorted((params or {}).items()))}" if params else url
+    key = hashlib.sha256(full_url.encode("utf-8")).hexdigest()
+    base = os.path.join(HTTP_CACHE_DIR, key[:2], key)
+    return f"{base}.json", f"{base}.body"
+
+def _read_cache(url, params):
+    meta_path, body_path = _cache_paths(url, params)
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(body_path, "rb") as f:
+            body = f.read()
+        os.utime(body_path) # 최근 사용 표시 (LRU)
+        return meta, body
+    except (OSError, ValueError):
+        return None, None
+
+def _write_cache(url, params, response):
+    validators = {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+    }
+    if not any(validators.values()):
+        return
+    meta_path, body_path = _cache_paths(url, params)
+    os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+    meta = dict(validators, content_type=response.headers.get("Content-Type"))
+    # 다른 스레드/프로세스가 반쯤 쓴 파일을 읽지 않도록 임시 파일 → rename
+    for path, mode, data in ((body_path, "wb", response.content), (meta_path, "w", json.dumps(meta))):
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, mode, **({} if "b" in mode else {"encoding": "utf-8"})) as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    _track_cache_size(len(response.content))
+
+
+_cache_bytes = None # 이 프로세스가 추정한 캐시 크기 (처음 쓸 때 1회 스캔, 다른 프로세스 몫은 정리할 때 다시 스캔)
+_cache_size_lock = threading.Lock()
+
+def _scan_cache():
+    """Return: [(마지막 사용 시각, 바이트, body 경로), ...]"""
+    entries = []
+    for root, _, files in os.walk(HTTP_CACHE_DIR):
+        for name in files:
+            if not name.endswith(".body"):
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+    return entries
+
+def _track_cache_size(added_bytes):
+    """캐시 크기가 HTTP_CACHE_MAX_BYTES 를 넘으면 오래 안 쓴 항목부터 삭제"""
+    global _cache_bytes
+    with _cache_size_lock:
+        if _cache_bytes is None:
+            _cache_bytes = sum(size for _, size, _ in _scan_cache())
+        else:
+            _cache_bytes += added_bytes
+        if _cache_bytes <= HTTP_CACHE_MAX_BYTES:
+            return
+        entries = sorted(_scan_cache())
+        total = sum(size for _, size, _ in entries)
+        target = HTTP_CACHE_MAX_BYTES * HTTP_CACHE_EVICT_RATIO
+        evicted = 0
+        for _, size, body_path in entries:
+            if total <= target:
+                break
+            for path in (body_path, body_path[:-len(".body")] + ".json"):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
+            evicted += 1
+        _cache_bytes = total
+    if evicted:
+        metrics.incr("http_cache_evictions", evicted)
+
+
+def http_get(url, params=None, headers=None, timeout=5, revalidate=True):
+    """
+    requests.get 대체 함수 (호스트별 커넥션 풀 + 조건부 재검증)
+    - revalidate=True 이면 로컬 캐시의 검증자(ETag/Last-Modified)로 조건부 요청
+    - 304 응답이면 캐시된 본문을 채워 200 응답처럼 반환 (response.from_cache = True)
+    - HOST_OVERRIDES 에 등록된 호스트는 대체 주소로 전송 (지표는 원래 호스트 기준, 캐시는 실제 전송 URL 기준)
+    - CASSETTE_MODE=record|replay 이면 응답을 기록/재생 (util.cassette, 키는 원래 URL + 파라미터 기준)
+    """
+    return cassette.through(
+        "http", (url, sorted((params or {}).items())),
+        lambda: _http_get(url, params, headers, timeout, revalidate),
+        _encode_response, _decode_response
+    )
+
+def _encode_response(response):
+    meta = {"status": response.status_code, "reason": response.reason, "url": response.url,
+            "content_type": response.headers.get("Content-Type")}
+    return meta, response.content
+
+def _decode_response(meta, body):
+    response = requests.Response()
+    response.status_code = meta["status"]
+    response.reason = meta.get("reason")
+    response.url = meta.get("url")
+    response.headers = CaseInsensitiveDict({"Content-Type": meta["content_type"]} if meta.get("content_type") else {})
+    response._content = body
+    response.from_cache = False
+    return response
+
+def _http_get(url, params, headers, timeout, revalidate):
+    host = urlsplit(url).hostname or ""
+    target_url = _apply_override(url, host)
+    request_headers = dict(headers or {})
+
+    cached_meta, cached_body = (None, None)
+    if revalidate:
+        cached_meta, cached_body = _read_cache(target_url, params)
+        if cached_meta:
+            if cached_meta.get("etag"):
+                request_headers["If-None-Match"] = cached_meta["etag"]
+            if cached_meta.get("last_modified"):
+                request_headers["If-Modified-Since"] = cached_meta["last_modified"]
+
+    # 호스트별 동시 요청은 커넥션 풀 크기만큼, 우선순위 순서로 배정 (util.scheduler)
+    with scheduler.slot(f"http:{host}", limit=HOST_POOL_SIZES.get(host, DEFAULT_POOL_SIZE)):
+        with metrics.timed("http_latency", host=host):
+            response = get_session(host).get(target_url, params=params, headers=request_headers, timeout=timeout)
+
+    metrics.incr("http_requests", host=host, status=response.status_code)
+    metrics.incr("http_bytes", len(response.content), host=host)
+    response.from_cache = False
+
+    if response.status_code == 304 and cached_body is not None:
+        # 변경 없음 → 캐시 본문 사용
+        metrics.incr("http_not_modified", host=host)
+        metrics.incr("http_bytes_saved", len(cached_body), host=host)
+        response.status_code = 200
+        response._content = cached_body
+        if cached_meta.get("content_type"):
+            response.headers["Content-Type"] = cached_meta["content_type"]
+        response.from_cache = True
+    elif response.status_code == 200 and revalidate:
+        _write_cache(target_url, params, response)
+
+    return response
+
+def http_probe(url, headers=None, timeout=5, max_bytes=32 * 1024):
+    """
+    본문 앞부분만 받아 전체 크기와 헤더 바이트 확인 (이미지 사전 검사용, HEAD + 헤더 요청을 1회 왕복으로)
+    - Range(bytes=0-N) 요청 → 206 이면 Content-Range 의 전체 크기
+    - 서버가 Range 를 무시하고 200 을 주면 앞 N 바이트만 읽고 연결을 끊음 (전체 크기는 Content-Length)
+    Return: (status, 전체 바이트 수 또는 None, content_type, 앞부분 bytes)
+    """
+    return cassette.through(
+        "http_probe", (url, max_bytes),
+        lambda: _http_probe(url, headers, timeout, max_bytes),
+        lambda result: ({"status": result[0], "total": result[1], "content_type": result[2]}, result[3]),
+        lambda meta, body: (meta["status"], meta["total"], meta["content_type"], body)
+    )
+
+def _http_probe(url, headers, timeout, max_bytes):
+    host = urlsplit(url).hostname or ""
+    target_url = _apply_override(url, host)
+    request_headers = dict(headers or {}, Range=f"bytes=0-{max_bytes - 1}")
+
+    head = b""
+    with scheduler.slot(f"http:{host}", limit=HOST_POOL_SIZES.get(host, DEFAULT_POOL_SIZE)):
+        with metrics.timed("http_probe_latency", host=host):
+            with get_session(host).get(target_url, headers=request_headers, timeout=timeout, stream=True) as response:
+                if response.status_code in (200, 206):
+                    for chunk in response.iter_content(chunk_size=8192):
+                        head += chunk
+                        if len(head) >= max_bytes:
+                            break
+                total = _total_bytes(response)
+
+    metrics.incr("http_probe_requests", host=host, status=response.status_code)
+    metrics.incr("http_bytes", len(head), host=host)
+    return response.status_code, total, response.headers.get("Content-Type"), head[:max_bytes]
+
+def _total_bytes(response):
+    if response.status_code == 206:
+        # Content-Range: bytes 0-32767/1048576 (전체 크기를 모르면 '*')
+        total = (response.headers.get("Content-Range") or "").rpartition("/")[2]
+    else:
+        total = response.headers.get("Content-Length") or ""
+    return int(total) if total.isdigit() else None
+
+def get_host_stats():
+    """호스트별 요청/바이트 통계 (대시보드용)"""
+    stats = {}
+    for name in ("http_requests", "http_bytes", "http_not_modified", "http_bytes_saved"):
+        for labels, value in metrics.get_counters_by_name(name):
+            entry = stats.setdefault(labels.get("host", ""), {})
+            entry[name] = entry.get(name, 0) + value
+    return stats
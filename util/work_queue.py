@@ -0,0 +1,381 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from util import metrics
+
+# ==========================================
+# 내구성 작업 큐 (전체 카탈로그 백필용)
+# - prdNo 단위 작업: pending → leased → done | dead
+# - 리스(lease) + 하트비트: 워커가 죽으면 리스 만료 후 다른 워커가 회수
+# - 재시도 횟수 초과 시 dead-letter (원인 last_error 보관)
+# - 중단 후 다시 실행하면 done 이 아닌 작업만 이어서 처리
+# - 백엔드 교체 가능: open_work_queue("sqlite:///path.db"), register_backend("scheme", factory)
+#   (SQLite 는 단일 노드용, 여러 서버에서 공유하려면 공유 DB 백엔드를 등록해서 사용)
+# ==========================================
+DEFAULT_LEASE_SECONDS = 300
+DEFAULT_MAX_ATTEMPTS = 3
+
+STATUS_PENDING = "pending"
+STATUS_LEASED = "leased"
+STATUS_DONE = "done"
+STATUS_DEAD = "dead"
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class WorkQueue(ABC):
+    """
+    작업 큐 백엔드 인터페이스
+    - 작업(task)은 {"prdNo": str, "attempts": int} dict
+    """
+    @abstractmethod
+    def enqueue(self, prd_nos):
+        """작업 추가 (이미 있는 prdNo 는 무시), 추가된 개수 반환"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def lease(self, worker_id, limit, lease_seconds=DEFAULT_LEASE_SECONDS, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        """
+        대기 중이거나 리스가 만료된 작업을 최대 limit 개 점유
+        (리스 만료 = 워커 비정상 종료, 이미 max_attempts 번 시도한 작업은 dead 처리)
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def heartbeat(self, worker_id, prd_nos, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """점유 중인 작업의 리스 연장, 여전히 점유 중인 개수 반환"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def complete(self, prd_no, result):
+        raise NotImplementedError
+
+    @abstractmethod
+    def fail(self, worker_id, prd_no, error, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        """
+        실패 기록, 재시도 한도 초과 시 dead 처리. 새 상태 반환
+        worker_id 가 더 이상 점유하고 있지 않으면(리스 만료 후 다른 워커가 회수) 아무것도 바꾸지 않고 None
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def requeue(self, status):
+        """status(leased/dead) 작업을 다시 pending 으로 (dead 는 시도 횟수 초기화)"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def counts(self):
+        """{status: 개수}"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def iter_results(self):
+        """완료 작업 (prdNo, result dict) 순회"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def iter_dead(self):
+        """dead-letter 작업 (prdNo, attempts, last_error) 순회"""
+        raise NotImplementedError
+
+
+class SQLiteWorkQueue(WorkQueue):
+    """
+    SQLite(WAL) 기반 작업 큐 - 같은 서버의 여러 프로세스가 동시에 사용 가능
+    (네트워크 파일시스템 위의 SQLite 는 잠금이 보장되지 않으므로 사용하지 않음)
+    """
+    def __init__(self, path):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS tasks (
+                    prd_no TEXT PRIMARY KEY,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    lease_owner TEXT,
+                    lease_expires REAL,
+                    last_error TEXT,
+                    result TEXT,
+                    enqueued_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks (status, lease_expires)")
+
+    def _connect(self):
+        # 호출마다 새 연결 (스레드/프로세스 간 공유하지 않음), 잠금 대기는 busy timeout 으로 처리
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA busy_timeout=30000")
+        return _ClosingConnection(conn)
+
+    def enqueue(self, prd_nos):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO tasks (prd_no, enqueued_at, updated_at) VALUES (?, ?, ?)",
+                [(str(p), now, now) for p in prd_nos]
+            )
+            added = conn.total_changes - before
+            conn.execute("COMMIT")
+        return added
+
+    def lease(self, worker_id, limit, lease_seconds=DEFAULT_LEASE_SECONDS, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        now = time.time()
+        with self._connect() as conn:
+            # 쓰기 잠금을 먼저 잡아 두 워커가 같은 작업을 가져가지 않도록 함
+            conn.execute("BEGIN IMMEDIATE")
+            # 처리 도중 워커를 반복해서 죽이는 작업(메모리 초과 등)은 무한 재시도하지 않음
+            expired_dead = conn.execute(
+                """
+                UPDATE tasks SET status = 'dead', last_error = 'lease_expired', lease_owner = NULL,
+                                 lease_expires = NULL, updated_at = ?
+                WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?
+                """,
+                (now, now, max_attempts)
+            ).rowcount
+            rows = conn.execute(
+                """
+                SELECT prd_no, attempts, status FROM tasks
+                WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ?)
+                ORDER BY enqueued_at, prd_no LIMIT ?
+                """,
+                (now, limit)
+            ).fetchall()
+            conn.executemany(
+                """
+                UPDATE tasks SET status = 'leased', lease_owner = ?, lease_expires = ?,
+                                 attempts = attempts + 1, updated_at = ?
+                WHERE prd_no = ?
+                """,
+                [(worker_id, now + lease_seconds, now, prd_no) for prd_no, _, _ in rows]
+            )
+            conn.execute("COMMIT")
+
+        reclaimed = sum(1 for _, _, status in rows if status == STATUS_LEASED)
+        if reclaimed:
+            metrics.incr("work_queue_reclaimed", reclaimed)
+        if expired_dead:
+            metrics.incr("work_queue_tasks", expired_dead, status=STATUS_DEAD)
+        return [{"prdNo": prd_no, "attempts": attempts + 1} for prd_no, attempts, _ in rows]
+
+    def heartbeat(self, worker_id, prd_nos, lease_seconds=DEFAULT_LEASE_SECONDS):
+        if not prd_nos:
+            return 0
+        now = time.time()
+        with self._connect() as conn:
+            placeholders = ",".join("?" * len(prd_nos))
+            cursor = conn.execute(
+                f"""
+                UPDATE tasks SET lease_expires = ?, updated_at = ?
+                WHERE status = 'leased' AND lease_owner = ? AND prd_no IN ({placeholders})
+                """,
+                [now + lease_seconds, now, worker_id, *prd_nos]
+            )
+            return cursor.rowcount
+
+    def complete(self, prd_no, result):
+        with self._connect() as conn:
+            # 리스가 만료되어 다른 워커와 중복 처리된 경우에도 먼저 끝난 결과 하나만 남김
+            conn.execute(
+                """
+                UPDATE tasks SET status = 'done', result = ?, lease_owner = NULL, lease_expires = NULL,
+                                 last_error = NULL, updated_at = ?
+                WHERE prd_no = ? AND status != 'done'
+                """,
+                (json.dumps(result, ensure_ascii=False), time.time(), str(prd_no))
+            )
+
+    def fail(self, worker_id, prd_no, error, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT attempts FROM tasks WHERE prd_no = ? AND status = 'leased' AND lease_owner = ?",
+                (str(prd_no), worker_id)
+            ).fetchone()
+            if row is None:
+                # 리스를 잃은 워커의 늦은 실패 보고 → 지금 점유 중인 워커의 작업을 되돌리지 않음
+                conn.execute("COMMIT")
+                return None
+            status = STATUS_DEAD if row[0] >= max_attempts else STATUS_PENDING
+            conn.execute(
+                """
+                UPDATE tasks SET status = ?, last_error = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ?
+                WHERE prd_no = ? AND status = 'leased' AND lease_owner = ?
+                """,
+                (status, str(error)[:1000], time.time(), str(prd_no), worker_id)
+            )
+            conn.execute("COMMIT")
+        return status
+
+    def requeue(self, status):
+        reset_attempts = ", attempts = 0" if status == STATUS_DEAD else ""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                f"""
+                UPDATE tasks SET status = 'pending', lease_owner = NULL, lease_expires = NULL{reset_attempts},
+                                 updated_at = ?
+                WHERE status = ?
+                """,
+                (time.time(), status)
+            )
+            return cursor.rowcount
+
+    def counts(self):
+        with self._connect() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def iter_results(self):
+        with self._connect() as conn:
+            for prd_no, result in conn.execute("SELECT prd_no, result FROM tasks WHERE status = 'done' ORDER BY enqueued_at, prd_no"):
+                yield prd_no, json.loads(result) if result else None
+
+    def iter_dead(self):
+        with self._connect() as conn:
+            yield from conn.execute("SELECT prd_no, attempts, last_error FROM tasks WHERE status = 'dead' ORDER BY prd_no")
+
+
+class _ClosingConnection:
+    """with 블록이 끝나면 연결을 닫는 sqlite3 연결 래퍼 (sqlite3 의 with 는 commit 만 하고 닫지 않음)"""
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self._conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None and self._conn.in_transaction:
+            self._conn.execute("ROLLBACK")
+        self._conn.close()
+        return False
+
+
+# ==========================================
+# 백엔드 선택
+# ==========================================
+_BACKENDS = {
+    # sqlite:///relative.db, sqlite:////absolute/path.db (SQLAlchemy 와 같은 규칙)
+    "sqlite": lambda location: SQLiteWorkQueue(location[1:] if location.startswith("/") else location),
+}
+
+def register_backend(scheme, factory):
+    """
+    공유 저장소 백엔드 등록
+    factory 는 "scheme://" 뒤의 문자열을 받아 WorkQueue 를 반환
+    예) register_backend("postgres", lambda location: PostgresWorkQueue(f"postgres://{location}"))
+        → open_work_queue("postgres://host/db")
+    """
+    _BACKENDS[scheme] = factory
+
+def open_work_queue(url):
+    """'sqlite:///path/to/queue.db' 또는 파일 경로 → WorkQueue"""
+    scheme, sep, location = url.partition("://")
+    if not sep:
+        return SQLiteWorkQueue(url)
+    if scheme not in _BACKENDS:
+        raise ValueError(f"지원하지 않는 작업 큐 백엔드: {scheme} (등록됨: {', '.join(sorted(_BACKENDS))})")
+    return _BACKENDS[scheme](location)
+
+
+# ==========================================
+# 워커 루프
+# ==========================================
+class _LeaseKeeper:
+    """점유 중인 작업의 리스를 주기적으로 연장하는 백그라운드 스레드"""
+    def __init__(self, work_queue, worker_id, lease_seconds):
+        self.work_queue = work_queue
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.held = set()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="lease-heartbeat", daemon=True)
+        self._thread.start()
+
+    def hold(self, prd_nos):
+        with self._lock:
+            self.held.update(prd_nos)
+
+    def release(self, prd_nos):
+        with self._lock:
+            self.held.difference_update(prd_nos)
+
+    def _run(self):
+        while not self._stopped.wait(self.lease_seconds / 3):
+            with self._lock:
+                held = list(self.held)
+            try:
+                self.work_queue.heartbeat(self.worker_id, held, self.lease_seconds)
+            except Exception as e:
+                print(f"⚠️ 리스 연장 실패: {e}")
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join(timeout=5)
+
+
+def run_worker(work_queue, process_fn, worker_id=None, batch_size=20, lease_seconds=DEFAULT_LEASE_SECONDS,
+               max_attempts=DEFAULT_MAX_ATTEMPTS, idle_wait=5.0):
+    """
+    큐가 빌 때까지 작업을 점유 → 처리 → 완료/실패 기록
+    - process_fn(prd_nos) -> {prdNo: result dict 또는 None}
+    - 다른 워커가 점유 중인 작업만 남으면 리스 만료(회수)를 기다리며 대기
+    Return: {"done": n, "failed": n}
+    """
+    worker_id = worker_id or default_worker_id()
+    keeper = _LeaseKeeper(work_queue, worker_id, lease_seconds)
+    summary = {"done": 0, "failed": 0}
+    try:
+        while True:
+            tasks = work_queue.lease(worker_id, batch_size, lease_seconds, max_attempts)
+            if not tasks:
+                counts = work_queue.counts()
+                if not counts.get(STATUS_LEASED):
+                    break
+                time.sleep(idle_wait)
+                continue
+
+            prd_nos = [task["prdNo"] for task in tasks]
+            keeper.hold(prd_nos)
+            try:
+                results = process_fn(prd_nos)
+            except Exception as e:
+                print(f"❌ 작업 묶음 처리 실패 ({len(prd_nos)}건): {e}")
+                results, batch_error = {}, str(e)
+            else:
+                batch_error = "analysis_failed"
+
+            for prd_no in prd_nos:
+                result = results.get(prd_no)
+                if result is not None:
+                    work_queue.complete(prd_no, result)
+                    summary["done"] += 1
+                    metrics.incr("work_queue_tasks", status=STATUS_DONE)
+                else:
+                    status = work_queue.fail(worker_id, prd_no, batch_error, max_attempts)
+                    summary["failed"] += 1
+                    if status is None:
+                        print(f"⚠️ 리스가 만료되어 다른 워커가 처리 중 (실패 기록 생략): {prd_no}")
+                        metrics.incr("work_queue_stale_fail")
+                        continue
+                    metrics.incr("work_queue_tasks", status=status)
+                    if status == STATUS_DEAD:
+                        print(f"☠️ 재시도 한도 초과 (dead-letter): {prd_no}")
+            keeper.release(prd_nos)
+    finally:
+        keeper.stop()
+    return summary